@@ -0,0 +1,183 @@
+"""
+Measures parsing, compilation and evaluation of commands of different kinds over data of different sizes.
+Results are printed as JSON, they can be saved and compared with results of previous release.
+
+    python -m benchmarks                                   # all cases
+    python -m benchmarks --quick                           # without 10M rows
+    python -m benchmarks --filter columns --output new.json
+    python -m benchmarks --compare old.json                # exit code 1 if some case became slower
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from typing import Callable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.tokenizer import generate
+from safe_evaluation import Evaluator
+
+SHORT = 'np.log(${a} + 1) * w if ${b} > 0 else ${a} - ${b}.mean()'
+ARITHMETIC = '${a} * 2 + ${b} / 3 - ${a} * ${b}'
+ROWS = {'1K': 1_000, '1M': 1_000_000, '10M': 10_000_000}
+
+
+class Case:
+    """
+    Function measured by the suite, setup is called once before measurements and returns argument of function
+    """
+
+    def __init__(self, name: str, setup: Callable, function: Callable, rows: Optional[int] = None):
+        self.name = name
+        self.setup = setup
+        self.function = function
+        self.rows = rows
+
+
+def frame(rows: int) -> pd.DataFrame:
+    generator = np.random.default_rng(0)
+    return pd.DataFrame({
+        'a': generator.random(rows),
+        'b': generator.random(rows) - 0.5,
+        's': generator.choice(['ab', 'cd', 'ef'], rows),
+    })
+
+
+def command_of_size(size: int) -> str:
+    terms = 1
+    while len(generate(terms)) < size:
+        terms *= 2
+    return generate(terms)[:size].rsplit(' + ', 1)[0]
+
+
+def cases(evaluator: Evaluator, quick: bool = False) -> List[Case]:
+    long = command_of_size(50 * 1024)
+    compile_command = lambda command: evaluator.calculator.compile(evaluator.preprocessor.prepare(command, None, None))
+    result = [
+        Case('tokenize/short', lambda: SHORT, lambda command: evaluator.preprocessor.prepare(command, None, None)),
+        Case('tokenize/50KB', lambda: long, lambda command: evaluator.preprocessor.prepare(command, None, None)),
+        Case('compile/short', lambda: SHORT, compile_command),
+        Case('compile/50KB', lambda: long, compile_command),
+        Case('solve/cached', lambda: {'x': 3, 'y': 4},
+             lambda local: evaluator.solve('(x + 2) * y - x / 3', local=local)),
+        Case('scalar/arithmetic', lambda: evaluator.compile('(x + 2) * y - x / 3 + x ** 2'),
+             lambda compiled: compiled.evaluate(None, {'x': 3, 'y': 4})),
+    ]
+    fused = Evaluator()
+    fused.enable_fusion()
+    for label, rows in ROWS.items():
+        if quick and rows > 1_000_000:
+            continue
+        result.append(Case(f'columns/{label}', lambda rows=rows: frame(rows),
+                           lambda df: evaluator.solve(ARITHMETIC, df), rows))
+        result.append(Case(f'fused/{label}', lambda rows=rows: frame(rows),
+                           lambda df: fused.solve(ARITHMETIC, df), rows))
+    result += [
+        Case('apply/vectorized', lambda: frame(100_000),
+             lambda df: evaluator.solve('${a}.apply(lambda v: v * 2 + 1 if v > 0.5 else v)', df), 100_000),
+        Case('apply/row_by_row', lambda: frame(10_000),
+             lambda df: evaluator.solve("${s}.apply(lambda v: v + 'x' if v > 'b' else v)", df), 10_000),
+        Case('if_else/scalar', lambda: {'x': 3, 'y': 4},
+             lambda local: evaluator.solve('x * 2 if x > y else y - x', local=local)),
+        Case('if_else/columns', lambda: frame(1_000_000),
+             lambda df: evaluator.solve('${a} if ${a} > ${b} else ${b} * 2', df), 1_000_000),
+        Case('functions/numpy', lambda: frame(1_000_000),
+             lambda df: evaluator.solve('np.sqrt(np.abs(${b})) + np.log1p(${a})', df), 1_000_000),
+        Case('functions/pandas', lambda: frame(1_000_000),
+             lambda df: evaluator.solve('pd.to_numeric(${a}) + pd.isna(${b})', df), 1_000_000),
+    ]
+    return result
+
+
+def measure(function: Callable, argument, repeat: int = 5, min_time: float = 0.2) -> dict:
+    """
+    Returns best and median time of one call, amount of calls is chosen to take at least min_time per repeat
+    """
+    function(argument)
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            function(argument)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 10 ** 6:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+    times = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            function(argument)
+        times.append((time.perf_counter() - start) / number)
+    return {'best': min(times), 'median': statistics.median(times), 'number': number, 'repeat': repeat}
+
+
+def run(names: Optional[str] = None, quick: bool = False, repeat: int = 5, min_time: float = 0.2) -> dict:
+    """
+    Returns environment and results of cases whose names contain names
+    """
+    evaluator = Evaluator()
+    results = []
+    for case in cases(evaluator, quick):
+        if names and names not in case.name:
+            continue
+        argument = case.setup()
+        result = {'name': case.name, 'rows': case.rows}
+        result.update(measure(case.function, argument, repeat, min_time))
+        results.append(result)
+        del argument
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+
+
+def compare(new: dict, old: dict, tolerance: float) -> List[str]:
+    """
+    Returns descriptions of cases which are slower than in old results by more than tolerance
+    """
+    previous = {result['name']: result for result in old['results']}
+    regressions = []
+    for result in new['results']:
+        if result['name'] in previous:
+            ratio = result['best'] / previous[result['name']]['best']
+            if ratio > 1 + tolerance:
+                regressions.append(f'{result["name"]}: {ratio:.2f}x slower')
+    return regressions
+
+
+def main(arguments: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--filter', help='run only cases whose names contain this string')
+    parser.add_argument('--quick', action='store_true', help='skip cases with 10M rows')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.2, help='minimal time of one repeat in seconds')
+    parser.add_argument('--output', help='file for JSON results, stdout by default')
+    parser.add_argument('--compare', help='JSON results of previous run')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown comparing to previous run')
+    options = parser.parse_args(arguments)
+
+    results = run(options.filter, options.quick, options.repeat, options.min_time)
+    text = json.dumps(results, indent=2)
+    if options.output:
+        with open(options.output, 'w') as file:
+            file.write(text + '\n')
+    else:
+        print(text)
+
+    if options.compare:
+        with open(options.compare) as file:
+            regressions = compare(results, json.load(file), options.tolerance)
+        for regression in regressions:
+            print(regression, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
@@ -0,0 +1,39 @@
+"""
+Measures throughput of one Evaluator shared by many threads.
+numpy releases GIL for big arrays, so calls per second should grow with amount of threads
+up to amount of cores.
+
+    python -m benchmarks.threads
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from safe_evaluation import Evaluator
+
+COMMAND = 'np.sqrt(${a} ** 2 + ${b} ** 2) * np.exp(0 - ${a}) + np.log1p(${b})'
+
+
+def measure(evaluator: Evaluator, df: pd.DataFrame, threads: int, calls: int) -> float:
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        start = time.perf_counter()
+        list(executor.map(lambda i: evaluator.solve(COMMAND, df, local={'i': i}), range(calls)))
+        return time.perf_counter() - start
+
+
+def main(rows: int = 200_000, calls: int = 64):
+    evaluator = Evaluator()
+    df = pd.DataFrame({'a': np.random.rand(rows), 'b': np.random.rand(rows)})
+    evaluator.solve(COMMAND, df)
+    print(f'{"threads":>10} {"time, s":>10} {"calls/s":>10} {"speedup":>10}')
+    base = None
+    for threads in (1, 2, 4, 8):
+        elapsed = measure(evaluator, df, threads, calls)
+        base = base or elapsed
+        print(f'{threads:>10} {elapsed:>10.3f} {calls / elapsed:>10.1f} {base / elapsed:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
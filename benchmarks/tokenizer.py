@@ -0,0 +1,36 @@
+"""
+Measures tokenization time of generated formulas of growing length.
+Time per KB has to stay the same for linear tokenizer.
+
+    python -m benchmarks.tokenizer
+"""
+import time
+
+from safe_evaluation import Evaluator
+
+
+def generate(terms: int) -> str:
+    return ' + '.join(f'np.log(${{col_{k}}}).abs() * w_{k}' for k in range(terms))
+
+
+def measure(evaluator: Evaluator, command: str, repeat: int = 5) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        evaluator.preprocessor.prepare(command, None, None)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    evaluator = Evaluator()
+    print(f'{"size, KB":>10} {"time, ms":>10} {"ms per KB":>10}')
+    for terms in (250, 500, 1000, 2000, 4000):
+        command = generate(terms)
+        elapsed = measure(evaluator, command)
+        size = len(command) / 1024
+        print(f'{size:>10.1f} {elapsed * 1000:>10.2f} {elapsed * 1000 / size:>10.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,31 @@
 from safe_evaluation.evaluation import Evaluator
+from safe_evaluation.backends import BaseBackend, PolarsBackend, Unsupported
+from safe_evaluation.asynchronous import AsyncEvaluator
 from safe_evaluation.calculation import BaseCalculator, Calculator
+from safe_evaluation.limits import Limits, LimitExceeded
+from safe_evaluation.compilation import CompiledBatch, CompiledExpression
 from safe_evaluation.preprocessing import BasePreprocessor, Preprocessor
+from safe_evaluation.profiling import Hook, ProfileNode
+from safe_evaluation.session import Session
+from safe_evaluation.sources import ColumnSource
 
 
 __all__ = [
     "Evaluator",
+    "AsyncEvaluator",
     "BasePreprocessor",
     "Preprocessor",
     "BaseCalculator",
     "Calculator",
+    "CompiledExpression",
+    "CompiledBatch",
+    "Limits",
+    "LimitExceeded",
+    "Hook",
+    "ProfileNode",
+    "ColumnSource",
+    "BaseBackend",
+    "PolarsBackend",
+    "Unsupported",
+    "Session",
 ]
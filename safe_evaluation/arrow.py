@@ -0,0 +1,305 @@
+import numpy as np
+import pandas as pd
+
+from safe_evaluation.constants import ARROW_METHODS, ARROW_OPERATORS, OPERATORS
+
+try:
+    import pyarrow
+    import pyarrow.compute
+except ImportError:
+    pyarrow = None
+
+
+def _is_arrow(value) -> bool:
+    return pyarrow is not None and isinstance(value, (pyarrow.Array, pyarrow.ChunkedArray))
+
+
+class ArrowColumn:
+    """
+    Arrow array or chunked array during calculation.
+    Operators and simple methods are calculated by Arrow compute kernels, numpy functions get numpy view
+    of buffers without copying where dtype allows it, other methods are called on pandas Series.
+    Nulls are propagated and & | use Kleene logic as in Arrow.
+    """
+
+    __slots__ = ('data',)
+    # numpy universal functions which are operators
+    ufunc_operators = {
+        np.add: '+', np.subtract: '-', np.multiply: '*', np.true_divide: '/', np.floor_divide: '//',
+        np.remainder: '%', np.power: '**', np.less: '<', np.less_equal: '<=', np.greater: '>',
+        np.greater_equal: '>=', np.equal: '==', np.not_equal: '!=',
+    }
+
+    def __init__(self, data):
+        self.data = data
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return f'ArrowColumn({self.data!r})'
+
+    def __bool__(self):
+        raise ValueError('The truth value of ArrowColumn is ambiguous')
+
+    def __contains__(self, value):
+        # as in pandas Series, value is searched in the index
+        return value in self.to_pandas()
+
+    def __iter__(self):
+        return iter(self.to_pandas())
+
+    def to_numpy(self) -> np.ndarray:
+        """
+        Returns numpy array, it is view of Arrow buffer for numeric arrays without nulls
+        """
+        data = self.data
+        if isinstance(data, pyarrow.ChunkedArray):
+            data = data.chunk(0) if data.num_chunks == 1 else data.combine_chunks()
+        return data.to_numpy(zero_copy_only=False)
+
+    def to_pandas(self) -> pd.Series:
+        return self.data.to_pandas()
+
+    def __array__(self, dtype=None, copy=None):
+        values = self.to_numpy()
+        return values if dtype is None else values.astype(dtype, copy=False)
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        if method != '__call__' or 'out' in kwargs:
+            return NotImplemented
+        if ufunc in self.ufunc_operators and len(inputs) == 2 and not kwargs:
+            return self.operate(self.ufunc_operators[ufunc], *inputs)
+        inputs = [value.to_numpy() if isinstance(value, ArrowColumn) else value for value in inputs]
+        return self.wrap(ufunc(*inputs, **kwargs))
+
+    @staticmethod
+    def is_array(value) -> bool:
+        return _is_arrow(value)
+
+    @staticmethod
+    def wrap(value):
+        """
+        Returns ArrowColumn for array-like values, python object for Arrow scalars
+        """
+        if _is_arrow(value):
+            return ArrowColumn(value)
+        if pyarrow is not None and isinstance(value, pyarrow.Scalar):
+            return value.as_py()
+        if isinstance(value, pd.Series):
+            return ArrowColumn(pyarrow.Array.from_pandas(value))
+        if isinstance(value, np.ndarray) and value.ndim == 1:
+            return ArrowColumn(pyarrow.array(value))
+        return value
+
+    @staticmethod
+    def _operand(value):
+        if isinstance(value, ArrowColumn):
+            return value.data
+        if isinstance(value, pd.Series):
+            return pyarrow.Array.from_pandas(value)
+        if isinstance(value, np.ndarray) and value.ndim == 1:
+            return pyarrow.array(value)
+        return value
+
+    @staticmethod
+    def _is_integer(value) -> bool:
+        kind = getattr(value, 'type', None)
+        if kind is not None:
+            return pyarrow.types.is_integer(kind)
+        return isinstance(value, (int, np.integer)) and not isinstance(value, (bool, np.bool_))
+
+    def _float(self, value):
+        if _is_arrow(value) and self._is_integer(value):
+            return pyarrow.compute.cast(value, pyarrow.float64())
+        return float(value) if self._is_integer(value) else value
+
+    def _has_zero(self, value) -> bool:
+        if _is_arrow(value):
+            return bool(pyarrow.compute.any(pyarrow.compute.equal(value, 0)).as_py())
+        return value == 0
+
+    def _numpy(self, value):
+        return value.to_numpy() if isinstance(value, ArrowColumn) else value
+
+    def operate(self, op: str, *operands):
+        """
+        Returns result of operator of constants.OPERATORS, operands are ArrowColumn or other values
+        """
+        values = [self._operand(operand) for operand in operands]
+        name = ARROW_OPERATORS.get(op)
+        if op in ('&', '|', '^', '~') and all(self._is_integer(value) for value in values):
+            name = {'&': 'bit_wise_and', '|': 'bit_wise_or', '^': 'bit_wise_xor', '~': 'bit_wise_not'}[op]
+        elif op == '/' or op in ('//', '%') and self._is_integer(values[-1]) and self._has_zero(values[-1]):
+            # pandas divides integers to floats, so division by zero gives inf or nan
+            values = [self._float(value) for value in values]
+        if name is not None:
+            try:
+                return self.wrap(getattr(pyarrow.compute, name)(*values))
+            except (pyarrow.ArrowNotImplementedError, pyarrow.ArrowTypeError):
+                pass
+        # operators without kernels for these types are calculated by numpy, without warnings as in pandas
+        arrays = [self._numpy(ArrowColumn(value) if _is_arrow(value) else value) for value in values]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.wrap(OPERATORS[op](*arrays))
+
+    def __add__(self, other):
+        return self.operate('+', self, other)
+
+    def __radd__(self, other):
+        return self.operate('+', other, self)
+
+    def __sub__(self, other):
+        return self.operate('-', self, other)
+
+    def __rsub__(self, other):
+        return self.operate('-', other, self)
+
+    def __mul__(self, other):
+        return self.operate('*', self, other)
+
+    def __rmul__(self, other):
+        return self.operate('*', other, self)
+
+    def __truediv__(self, other):
+        return self.operate('/', self, other)
+
+    def __rtruediv__(self, other):
+        return self.operate('/', other, self)
+
+    def __floordiv__(self, other):
+        return self.operate('//', self, other)
+
+    def __rfloordiv__(self, other):
+        return self.operate('//', other, self)
+
+    def __mod__(self, other):
+        return self.operate('%', self, other)
+
+    def __rmod__(self, other):
+        return self.operate('%', other, self)
+
+    def __pow__(self, other):
+        return self.operate('**', self, other)
+
+    def __rpow__(self, other):
+        return self.operate('**', other, self)
+
+    def __lt__(self, other):
+        return self.operate('<', self, other)
+
+    def __le__(self, other):
+        return self.operate('<=', self, other)
+
+    def __gt__(self, other):
+        return self.operate('>', self, other)
+
+    def __ge__(self, other):
+        return self.operate('>=', self, other)
+
+    def __eq__(self, other):
+        return self.operate('==', self, other)
+
+    def __ne__(self, other):
+        return self.operate('!=', self, other)
+
+    def __and__(self, other):
+        return self.operate('&', self, other)
+
+    def __rand__(self, other):
+        return self.operate('&', other, self)
+
+    def __or__(self, other):
+        return self.operate('|', self, other)
+
+    def __ror__(self, other):
+        return self.operate('|', other, self)
+
+    def __xor__(self, other):
+        return self.operate('^', self, other)
+
+    def __rxor__(self, other):
+        return self.operate('^', other, self)
+
+    def __invert__(self):
+        return self.operate('~', self)
+
+    def __neg__(self):
+        return self.operate('*', self, -1)
+
+    __hash__ = None
+
+    def call_method(self, method: str, args: list, kwargs: dict, fallback):
+        """
+        Returns result of method, fallback(series, method, args, kwargs) calculates methods without Arrow kernels
+        """
+        name = ARROW_METHODS.get(method)
+        if name is not None and not args and not kwargs:
+            if method in ('isna', 'isnull'):
+                return self.wrap(pyarrow.compute.is_null(self.data, nan_is_null=True))
+            if method in ('notna', 'notnull'):
+                return self.wrap(pyarrow.compute.invert(pyarrow.compute.is_null(self.data, nan_is_null=True)))
+            return self.wrap(getattr(pyarrow.compute, name)(self.data))
+        return self.wrap(fallback(self.to_pandas(), method, args, kwargs))
+
+    def __getattr__(self, name):
+        # properties (e.g. .str, .dt) are taken from pandas Series
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.to_pandas(), name)
+
+    def choose(self, value, other):
+        """
+        Returns value where the column is true, otherwise other
+        """
+        return self.wrap(pyarrow.compute.if_else(self.data, self._operand(value), self._operand(other)))
+
+
+class ArrowFrame:
+    """
+    pyarrow Table or RecordBatch used as DataFrame, ${column} is ArrowColumn without copying of data
+    """
+
+    __slots__ = ('table',)
+
+    def __init__(self, table):
+        self.table = table
+
+    def __getitem__(self, name):
+        if name not in self.table.column_names:
+            raise KeyError(name)
+        return ArrowColumn(self.table.column(name))
+
+    def __len__(self):
+        return self.table.num_rows
+
+    def __getattr__(self, name):
+        # ${__df} is converted to pandas DataFrame
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.table.to_pandas(), name)
+
+
+def to_arrow(value, chunked: bool = False):
+    """
+    Returns Arrow array of array-like result (ChunkedArray if chunked), other values are returned as is
+    """
+    if isinstance(value, pd.DataFrame):
+        return pyarrow.Table.from_pandas(value, preserve_index=False)
+    value = ArrowColumn.wrap(value)
+    if not isinstance(value, ArrowColumn):
+        return value
+    data = value.data
+    if chunked and isinstance(data, pyarrow.Array):
+        return pyarrow.chunked_array([data])
+    if not chunked and isinstance(data, pyarrow.ChunkedArray):
+        return data.combine_chunks()
+    return data
+
+
+def is_arrow_table(value) -> bool:
+    return pyarrow is not None and isinstance(value, (pyarrow.Table, pyarrow.RecordBatch))
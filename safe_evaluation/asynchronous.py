@@ -0,0 +1,140 @@
+import asyncio
+import functools
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Iterable, Optional, Union
+
+import pandas as pd
+
+from safe_evaluation.evaluation import Evaluator
+from safe_evaluation.limits import LimitExceeded, Limits
+from safe_evaluation.parallel import _get_evaluator
+
+
+def _solve_in_process(evaluator_key, method, *args):
+    """
+    Calls method of evaluator of the worker process, it keeps compiled commands between calls
+    """
+    return getattr(_get_evaluator(*evaluator_key), method)(*args)
+
+
+class AsyncEvaluator:
+    """
+    Asyncio interface of Evaluator.
+    Commands are calculated in thread or process pool, so event loop is not blocked.
+    Commands are compiled by the wrapped evaluator, so its cache is shared with the sync calls.
+    """
+
+    def __init__(self, evaluator: Optional[Evaluator] = None, executor: Union[str, Executor] = 'thread',
+                 max_workers: Optional[int] = None, concurrency: Optional[int] = None,
+                 timeout: Optional[float] = None):
+        """
+        executor is 'thread', 'process' or instance of concurrent.futures.Executor.
+        concurrency limits amount of commands calculated at once, timeout is default timeout of a call in seconds.
+        """
+        self.evaluator = evaluator or Evaluator()
+        self._own_executor = isinstance(executor, str)
+        if executor == 'thread':
+            executor = ThreadPoolExecutor(max_workers=max_workers)
+        elif executor == 'process':
+            executor = ProcessPoolExecutor(max_workers=max_workers)
+        elif not isinstance(executor, Executor):
+            raise ValueError(('Unknown executor "{executor}", expected "thread", "process" or Executor')
+                             .format(executor=executor))
+        self.executor = executor
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(concurrency) if concurrency else None
+
+    def close(self):
+        if self._own_executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    def _call(self, method: str, *args):
+        """
+        Returns function calculating method of evaluator in the executor with settings of the current moment
+        """
+        evaluator = self.evaluator
+        settings = evaluator.current_settings()
+        if isinstance(self.executor, ProcessPoolExecutor):
+            evaluator_key = (type(evaluator), type(evaluator.preprocessor), type(evaluator.calculator),
+                             settings.key())
+            return functools.partial(_solve_in_process, evaluator_key, method, *args)
+
+        def call():
+            with evaluator.snapshot(settings):
+                return getattr(evaluator, method)(*args)
+        return call
+
+    def _limits(self, limits: Optional[Limits], time: Optional[float]) -> Optional[Limits]:
+        """
+        Returns limits with time not longer than time left for the call
+        """
+        if time is None:
+            return limits
+        if limits is None:
+            return Limits(time=time)
+        return Limits(time=time if limits.time is None else min(limits.time, time), operations=limits.operations,
+                      lambda_calls=limits.lambda_calls, result_size=limits.result_size)
+
+    def _release(self, loop):
+        try:
+            loop.call_soon_threadsafe(self._semaphore.release)
+        except RuntimeError:
+            # event loop is closed
+            pass
+
+    async def _run(self, method: str, args: tuple, limits: Optional[Limits], timeout: Optional[float]):
+        """
+        Calculates method of evaluator with args and limits in the executor.
+        Slot of concurrency is kept until the calculation finishes, even if the call has timed out or was cancelled.
+        """
+        loop = asyncio.get_running_loop()
+        timeout = self.timeout if timeout is None else timeout
+        deadline = None if timeout is None else loop.time() + timeout
+        semaphore = self._semaphore
+        if semaphore is not None:
+            # time in the queue is a part of the timeout
+            await asyncio.wait_for(semaphore.acquire(), timeout)
+        remaining = None if deadline is None else max(deadline - loop.time(), 0.0)
+        try:
+            future = self.executor.submit(self._call(method, *args, self._limits(limits, remaining)))
+        except BaseException:
+            if semaphore is not None:
+                semaphore.release()
+            raise
+        if semaphore is not None:
+            future.add_done_callback(lambda _: self._release(loop))
+        try:
+            # calculation which hasn't started is cancelled on timeout, started one stops by limit of time
+            return await asyncio.wait_for(asyncio.wrap_future(future), remaining)
+        except LimitExceeded as error:
+            if deadline is not None and loop.time() >= deadline:
+                raise asyncio.TimeoutError() from error
+            raise
+
+    async def solve(self, command: str, df: Optional[pd.DataFrame] = None, local: dict = None,
+                    timeout: Optional[float] = None, limits: Optional[Limits] = None):
+        """
+        Returns result of command.
+        Raises TimeoutError after timeout seconds, calculation which has already started
+        stops at the next checked element (see Limits.time), its result is dropped.
+        """
+        # syntax errors are raised without waiting for the executor
+        self.evaluator.compile(command)
+        return await self._run('solve', (command, df, local), limits, timeout)
+
+    async def solve_many(self, commands: Union[Iterable[str], dict], df: Optional[pd.DataFrame] = None,
+                         local: dict = None, as_frame: bool = False, timeout: Optional[float] = None,
+                         limits: Optional[Limits] = None):
+        """
+        Returns results of commands, see Evaluator.solve_many
+        """
+        if not isinstance(commands, dict):
+            commands = list(commands)
+        self.evaluator.compile_many(commands.values() if isinstance(commands, dict) else commands)
+        return await self._run('solve_many', (commands, df, local, as_frame), limits, timeout)
@@ -0,0 +1,447 @@
+import weakref
+from abc import ABCMeta, abstractmethod
+from numbers import Number
+from typing import Callable, Optional
+
+import pandas as pd
+
+from safe_evaluation.constants import TypeOfCommand
+
+try:
+    import polars
+except ImportError:
+    polars = None
+
+
+class Unsupported(Exception):
+    """
+    Part of command which can't be calculated by backend, calculation falls back to Calculator
+    """
+
+    def __init__(self, reason: str, program: tuple = (), position: int = 0, parameters: tuple = ()):
+        super().__init__(reason)
+        self.reason = reason
+        self.program = program
+        self.position = position
+        self.parameters = parameters
+        self.node = None
+
+    def __str__(self):
+        return f'{self.reason}: {self.node}' if self.node else self.reason
+
+
+class BaseBackend(metaclass=ABCMeta):
+    """
+    Calculates compiled expressions by other dataframe library.
+    translate returns plan of expression or raises Unsupported for the first part it can't calculate,
+    then the expression is calculated by Calculator of evaluator and on_fallback(compiled, error) is called.
+    """
+
+    def __init__(self, evaluator, min_rows: int = 100_000, on_fallback: Optional[Callable] = None):
+        self.evaluator = evaluator
+        self.min_rows = min_rows
+        self.on_fallback = on_fallback
+        # compiled expression -> Unsupported of its last fallback
+        self.fallbacks = weakref.WeakKeyDictionary()
+
+    @abstractmethod
+    def translate(self, compiled, local: dict = None):
+        pass
+
+    @abstractmethod
+    def run(self, plan, compiled, df):
+        pass
+
+    def is_native(self, df) -> bool:
+        """
+        Returns whether df is frame of the backend library
+        """
+        return False
+
+    def accepts(self, df) -> bool:
+        """
+        Returns whether backend calculates commands for df
+        """
+        return self.is_native(df) or isinstance(df, pd.DataFrame) and len(df) >= self.min_rows
+
+    def to_pandas(self, df):
+        return df
+
+    def explain(self, compiled, local: dict = None) -> Optional[Unsupported]:
+        """
+        Returns reason and part of command which make calculation fall back to Calculator or None
+        """
+        try:
+            self.translate(compiled, local)
+        except Unsupported as error:
+            return self._describe(error)
+        return None
+
+    def _describe(self, error: Unsupported) -> Unsupported:
+        if error.node is None and error.program:
+            names = {}
+            self.evaluator.calculator._source(error.program, error.parameters, names=names)
+            error.node = names.get(error.position)
+        return error
+
+    def solve(self, compiled, df, local: dict = None):
+        try:
+            plan = self.translate(compiled, local)
+        except Unsupported as error:
+            self._describe(error)
+            self.fallbacks[compiled] = error
+            if self.on_fallback is not None:
+                self.on_fallback(compiled, error)
+            return self.evaluator.calculator.execute(compiled.program, self.to_pandas(df), local)
+        return self.run(plan, compiled, df)
+
+
+class PolarsPlan:
+    """
+    Polars expression of command, scalar is whether it gives one value (e.g. sum)
+    """
+
+    __slots__ = ('expression', 'scalar', 'name')
+
+    def __init__(self, expression, scalar: bool, name: Optional[str]):
+        self.expression = expression
+        self.scalar = scalar
+        self.name = name
+
+
+class Constant:
+    """
+    Python value during translation, it becomes literal when it is used with expression
+    """
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+
+class Namespace:
+    """
+    .str or .dt accessor of expression
+    """
+
+    __slots__ = ('expression', 'name', 'scalar')
+
+    def __init__(self, expression, name: str, scalar: bool):
+        self.expression = expression
+        self.name = name
+        self.scalar = scalar
+
+
+class PolarsBackend(BaseBackend):
+    """
+    Translates command into Polars lazy query: columns, operators, if/else, common methods,
+    numpy functions and .str/.dt accessors. Queries are multi-threaded and LazyFrame input is
+    optimized by Polars (projection and predicate pushdown, streaming).
+    NaN of pandas columns are nulls in Polars, comparisons of nulls give False as in pandas.
+    """
+
+    comparisons = {
+        '<': lambda l, r: l < r,
+        '<=': lambda l, r: l <= r,
+        '>': lambda l, r: l > r,
+        '>=': lambda l, r: l >= r,
+        '==': lambda l, r: l == r,
+        '!=': lambda l, r: l != r,
+    }
+    operators = {
+        '+': lambda l, r: l + r,
+        '-': lambda l, r: l - r,
+        '*': lambda l, r: l * r,
+        '/': lambda l, r: l / r,
+        '//': lambda l, r: l // r,
+        '%': lambda l, r: l % r,
+        '**': lambda l, r: l ** r,
+        '&': lambda l, r: l & r,
+        '|': lambda l, r: l | r,
+        '^': lambda l, r: l ^ r,
+    }
+    # method -> function of expression and args
+    methods = {
+        'abs': lambda e: e.abs(),
+        'round': lambda e, decimals=0: e.round(decimals),
+        'clip': lambda e, lower=None, upper=None: e.clip(lower, upper),
+        'fillna': lambda e, value: e.fill_null(value),
+        'isna': lambda e: e.is_null(),
+        'isnull': lambda e: e.is_null(),
+        'notna': lambda e: e.is_not_null(),
+        'notnull': lambda e: e.is_not_null(),
+        'between': lambda e, left, right: e.is_between(left, right),
+        'isin': lambda e, values: e.is_in(list(values)),
+        'cumsum': lambda e: e.cum_sum(),
+        'cummax': lambda e: e.cum_max(),
+        'cummin': lambda e: e.cum_min(),
+        'shift': lambda e, periods=1: e.shift(periods),
+        'diff': lambda e, periods=1: e.diff(periods),
+        'sum': lambda e: e.sum(),
+        'mean': lambda e: e.mean(),
+        'median': lambda e: e.median(),
+        'min': lambda e: e.min(),
+        'max': lambda e: e.max(),
+        'count': lambda e: e.count(),
+        'std': lambda e: e.std(),
+        'var': lambda e: e.var(),
+        'nunique': lambda e: e.drop_nulls().n_unique(),
+        'any': lambda e: e.any(),
+        'all': lambda e: e.all(),
+    }
+    reductions = {'sum', 'mean', 'median', 'min', 'max', 'count', 'std', 'var', 'nunique', 'any', 'all'}
+    str_methods = {
+        'lower': lambda e: e.str.to_lowercase(),
+        'upper': lambda e: e.str.to_uppercase(),
+        'strip': lambda e: e.str.strip_chars(),
+        'lstrip': lambda e: e.str.strip_chars_start(),
+        'rstrip': lambda e: e.str.strip_chars_end(),
+        'len': lambda e: e.str.len_chars().cast(polars.Int64),
+        # missing strings give False as in pandas string columns
+        'contains': lambda e, pattern: e.str.contains(pattern).fill_null(False),
+        'startswith': lambda e, prefix: e.str.starts_with(prefix).fill_null(False),
+        'endswith': lambda e, suffix: e.str.ends_with(suffix).fill_null(False),
+        'replace': lambda e, old, new: e.str.replace_all(old, new, literal=True),
+    }
+    dt_methods = {
+        'strftime': lambda e, format: e.dt.strftime(format),
+        'normalize': lambda e: e.dt.truncate('1d'),
+    }
+    # pandas gives int32 for properties of dates
+    dt_properties = {
+        'year': lambda e: e.dt.year().cast(polars.Int32),
+        'month': lambda e: e.dt.month().cast(polars.Int32),
+        'day': lambda e: e.dt.day().cast(polars.Int32),
+        'hour': lambda e: e.dt.hour().cast(polars.Int32),
+        'minute': lambda e: e.dt.minute().cast(polars.Int32),
+        'second': lambda e: e.dt.second().cast(polars.Int32),
+        'quarter': lambda e: e.dt.quarter().cast(polars.Int32),
+        # Monday is 0 in pandas and 1 in Polars
+        'weekday': lambda e: e.dt.weekday().cast(polars.Int32) - 1,
+        'dayofweek': lambda e: e.dt.weekday().cast(polars.Int32) - 1,
+    }
+    functions = {
+        'np.abs': lambda e: e.abs(),
+        'np.sqrt': lambda e: e.sqrt(),
+        'np.exp': lambda e: e.exp(),
+        'np.log': lambda e: e.log(),
+        'np.log10': lambda e: e.log10(),
+        'np.log1p': lambda e: e.log1p(),
+        'np.sin': lambda e: e.sin(),
+        'np.cos': lambda e: e.cos(),
+        'np.tan': lambda e: e.tan(),
+        'np.floor': lambda e: e.floor(),
+        'np.ceil': lambda e: e.ceil(),
+        'np.round': lambda e, decimals=0: e.round(decimals),
+        # missing values of pandas are null in Polars, is_nan gives null for them
+        'np.isnan': lambda e: e.is_null() | e.is_nan(),
+        'np.sum': lambda e: e.sum(),
+        'np.mean': lambda e: e.mean(),
+        'np.min': lambda e: e.min(),
+        'np.max': lambda e: e.max(),
+        'pd.isna': lambda e: e.is_null(),
+        'pd.notna': lambda e: e.is_not_null(),
+    }
+    reducing_functions = {'np.sum', 'np.mean', 'np.min', 'np.max'}
+
+    def __init__(self, evaluator, min_rows: int = 100_000, on_fallback: Optional[Callable] = None):
+        if polars is None:
+            raise Exception('polars is required by PolarsBackend')
+        super().__init__(evaluator, min_rows, on_fallback)
+
+    def is_native(self, df) -> bool:
+        return isinstance(df, (polars.DataFrame, polars.LazyFrame))
+
+    def to_pandas(self, df):
+        if isinstance(df, polars.LazyFrame):
+            df = df.collect()
+        if isinstance(df, polars.DataFrame):
+            return df.to_pandas()
+        return df
+
+    def _expression(self, value):
+        if isinstance(value, Constant):
+            return polars.lit(value.value)
+        return value
+
+    def _is_constant(self, value, *types) -> bool:
+        return isinstance(value, Constant) and isinstance(value.value, types or (Number, str, bool, type(None)))
+
+    def _operator(self, operation, l, r):
+        if isinstance(l, Constant) and isinstance(r, Constant):
+            return Constant(self.evaluator.operators[operation](l.value, r.value))
+        if operation in self.comparisons:
+            # nulls (NaN of pandas) are not equal to anything
+            result = self.comparisons[operation](self._expression(l), self._expression(r))
+            return result.fill_null(operation == '!=')
+        if operation in ('//', '%') and not (self._is_constant(r, Number) and r.value != 0):
+            raise Unsupported(f'Operator "{operation}" is calculated by Polars only for non-zero constant divisor')
+        if operation == '**' and not (self._is_constant(r, Number) and r.value >= 0):
+            raise Unsupported('Operator "**" is calculated by Polars only for non-negative constant exponent')
+        if operation not in self.operators:
+            raise Unsupported(f'Operator "{operation}" is not supported')
+        return self.operators[operation](self._expression(l), self._expression(r))
+
+    def _arguments(self, args, kwargs, local, arguments, parameters):
+        """
+        Returns python values of constant args and kwargs
+        """
+        values = []
+        for arg in list(args) + [value for _, value in kwargs]:
+            value, _ = self._translate(arg, local, arguments, parameters)
+            if not isinstance(value, Constant):
+                raise Unsupported('Args of methods and functions must be constants')
+            values.append(value.value)
+        return values[:len(args)], dict(zip((key for key, _ in kwargs), values[len(args):]))
+
+    def _call(self, table, name, target, args, kwargs):
+        if name not in table:
+            raise Unsupported(f'"{name}" is not supported')
+        try:
+            return table[name](target, *args, **kwargs)
+        except TypeError:
+            raise Unsupported(f'Args of "{name}" are not supported')
+
+    def _translate(self, program, local, arguments=(), parameters=()):
+        """
+        Returns (value, scalar) of program: Polars expression or Constant
+        """
+        stack = []
+        registers = {}
+        for position, element in enumerate(program):
+            try:
+                value, scalar = self._element(element, stack, registers, local, arguments, parameters)
+            except Unsupported as error:
+                if not error.program:
+                    error.program, error.position, error.parameters = program, position, parameters
+                raise
+            if value is not None:
+                stack.append((value, scalar))
+        return stack.pop()
+
+    def _element(self, element, stack, registers, local, arguments, parameters):
+        if isinstance(element, str):
+            if element == '~':
+                value, scalar = stack.pop()
+                if isinstance(value, Constant):
+                    return Constant(~value.value), scalar
+                return ~value, scalar
+            (r, right), (l, left) = stack.pop(), stack.pop()
+            return self._operator(element, l, r), left and right
+        kind = element[0]
+        if kind == TypeOfCommand.COLUMN:
+            return polars.col(element[1]), False
+        if kind == TypeOfCommand.VALUE:
+            return Constant(element[1]), True
+        if kind == TypeOfCommand.VARIABLE:
+            if not local or element[1] not in local:
+                raise Exception(('Variable "{var}" doesn\'t exist').format(var=f'{element[1]}'))
+            value = local[element[1]]
+            if isinstance(value, polars.Expr):
+                return value, False
+            if not isinstance(value, (Number, str, bool, type(None), list, tuple)):
+                raise Unsupported(f'Variable of type {type(value).__name__} is not supported')
+            return Constant(value), True
+        if kind == TypeOfCommand.ARGUMENT:
+            return arguments[element[1]]
+        if kind == TypeOfCommand.STORE:
+            registers[element[1]] = stack[-1]
+            return None, None
+        if kind == TypeOfCommand.LOAD:
+            return registers[element[1]]
+        if kind == TypeOfCommand.KERNEL:
+            operands = tuple(stack[len(stack) - element[1].arity:])
+            del stack[len(stack) - element[1].arity:]
+            return self._translate(element[1].program, local, operands, element[1].parameters)
+        if kind == TypeOfCommand.CONDITION:
+            test, scalar = stack.pop()
+            if isinstance(test, Constant):
+                if test.value:
+                    return self._translate(element[1], local, arguments, parameters)
+                if not element[2]:
+                    return Constant(None), True
+                return self._translate(element[2], local, arguments, parameters)
+            body, body_scalar = self._translate(element[1], local, arguments, parameters)
+            if element[2]:
+                orelse, orelse_scalar = self._translate(element[2], local, arguments, parameters)
+            else:
+                orelse, orelse_scalar = Constant(None), True
+            if isinstance(body, Constant) and isinstance(orelse, Constant):
+                # pandas chooses constants by np.where, which gives int64 for python ints
+                body, orelse = (polars.lit(value.value, dtype=polars.Int64) if self._is_constant(value, int)
+                                and not isinstance(value.value, bool) else value for value in (body, orelse))
+            expression = polars.when(test).then(self._expression(body)).otherwise(self._expression(orelse))
+            return expression, scalar and body_scalar and orelse_scalar
+        if kind == TypeOfCommand.PROPERTY:
+            value, scalar = stack.pop()
+            if isinstance(value, Namespace) and value.name == 'dt':
+                return self._call(self.dt_properties, element[1], value.expression, (), {}), scalar
+            if element[1] in ('str', 'dt') and not isinstance(value, (Constant, Namespace)):
+                return Namespace(value, element[1], scalar), scalar
+            raise Unsupported(f'Property "{element[1]}" is not supported')
+        if kind == TypeOfCommand.METHOD:
+            target, scalar = stack.pop()
+            args, kwargs = self._arguments(element[2], element[3], local, arguments, parameters)
+            if isinstance(target, Namespace):
+                table = self.str_methods if target.name == 'str' else self.dt_methods
+                return self._call(table, element[1], target.expression, args, kwargs), scalar
+            if isinstance(target, Constant):
+                raise Unsupported('Methods of constants are not supported')
+            value = self._call(self.methods, element[1], target, args, kwargs)
+            return value, scalar or element[1] in self.reductions
+        if kind == TypeOfCommand.FUNCTION_EXECUTABLE:
+            name = element[1]
+            if name not in self.functions or not element[2]:
+                raise Unsupported(f'Function "{name}" is not supported')
+            # forbidden functions raise errors as in Calculator
+            self.evaluator.handle_function(name)
+            target, scalar = self._translate(element[2][0], local, arguments, parameters)
+            if isinstance(target, Constant):
+                raise Unsupported('Functions of constants are not supported')
+            args, kwargs = self._arguments(element[2][1:], element[3], local, arguments, parameters)
+            return self._call(self.functions, name, target, args, kwargs), scalar or name in self.reducing_functions
+        if kind == TypeOfCommand.DATAFRAME:
+            raise Unsupported('${__df} is not supported')
+        raise Unsupported('Lambda functions are not supported')
+
+    def translate(self, compiled, local: dict = None) -> PolarsPlan:
+        if compiled.parameters:
+            raise Unsupported('Expressions with parameters are not supported')
+        value, scalar = self._translate(compiled.program, local)
+        if isinstance(value, (Constant, Namespace)):
+            raise Unsupported('Result must be column or its reduction')
+        return PolarsPlan(value, scalar, self._name(compiled.program))
+
+    def _name(self, program) -> Optional[str]:
+        """
+        Returns name of the result as in pandas: name of the column if only one column is used,
+        if/else takes name of its body or of orelse if the body is constant
+        """
+        calculator = self.evaluator.calculator
+        if program and isinstance(program[-1], tuple) and program[-1][0] == TypeOfCommand.CONDITION:
+            for branch in program[-1][1:]:
+                if calculator.references(branch)[0]:
+                    return self._name(branch)
+            return None
+        columns = calculator.references(program)[0]
+        return columns[0] if len(columns) == 1 else None
+
+    def expression(self, compiled, local: dict = None):
+        """
+        Returns Polars expression of command to be used in queries, e.g. LazyFrame.filter
+        """
+        return self.translate(compiled, local).expression
+
+    def run(self, plan: PolarsPlan, compiled, df):
+        native = self.is_native(df)
+        if native:
+            frame = df.lazy()
+        else:
+            frame = polars.from_pandas(df[list(compiled.columns)]).lazy()
+        result = frame.select(plan.expression.alias('result')).collect()['result']
+        if plan.scalar:
+            return result[0]
+        if native:
+            return result.alias(plan.name or '')
+        return result.to_pandas().set_axis(df.index).rename(plan.name)
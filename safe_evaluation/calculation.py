@@ -1,10 +1,18 @@
+import copy
 import re
+import warnings
 from abc import ABCMeta, abstractmethod
 from typing import List, Union, Optional
 
+import numpy as np
 import pandas as pd
 
-from safe_evaluation.constants import TypeOfCommand, OPERATORS_PRIORITIES
+from safe_evaluation.arrow import ArrowColumn
+from safe_evaluation.constants import TypeOfCommand, OPERATORS_PRIORITIES, FOLDABLE_FUNCS, IMPURE_METHODS
+from safe_evaluation.limits import Budget, Limits
+from safe_evaluation.preprocessing import Lambda
+from safe_evaluation.streaming import Streamer
+from safe_evaluation.vectorization import Vectorizer
 
 
 class BaseCalculator(metaclass=ABCMeta):
@@ -12,92 +20,152 @@ class BaseCalculator(metaclass=ABCMeta):
     def calculate(self, stack, df, local):
         pass
 
+    def compile(self, stack, parameters=()):
+        """
+        Returns program that can be executed many times with different data.
+        By default the program is the stack itself.
+        """
+        return tuple(stack)
 
-class Calculator(BaseCalculator):
-    operators_priorities = OPERATORS_PRIORITIES
+    def shared_nodes(self, program, parameters=()):
+        """
+        Returns parts of the program which are calculated once and used several times
+        """
+        return []
 
-    def __init__(self, evaluator):
-        self.evaluator = evaluator
+    def references(self, program):
+        """
+        Returns names of columns used by the program and whether the whole DataFrame is used.
+        By default columns are unknown, so the whole DataFrame is used.
+        """
+        return (), True
 
-    def _analyse(self, string, df=None, local=None):
+    def execute(self, program, df, local, arguments=(), parameters=()):
+        if arguments:
+            local = (local or {}) | dict(zip(parameters, arguments))
+        return self.calculate(list(program), df, local)
+
+    def compile_many(self, programs):
         """
-        Analyses args of the method
-        Returns arg in correct format(string, float, bool or lambda)
+        Returns one program calculating results of all programs.
+        By default it is the tuple of programs.
         """
-        if local and string in local:
-            return local[string]
+        return tuple(programs)
+
+    def execute_many(self, program, df, local):
+        return [self.execute(part, df, local) for part in program]
 
-        return self.evaluator.solve(string, df, local)
+    def stream(self, compiled, chunks, local):
+        raise Exception(('Calculation by chunks is not supported by {calculator}')
+                        .format(calculator=type(self).__name__))
+
+    def reduce_stream(self, compiled, chunks, local):
+        raise Exception(('Calculation by chunks is not supported by {calculator}')
+                        .format(calculator=type(self).__name__))
+
+
+class Calculator(BaseCalculator):
+    operators_priorities = OPERATORS_PRIORITIES
+    foldable_funcs = FOLDABLE_FUNCS
+    # folded values are kept in the program, bigger ones are calculated on evaluation
+    folded_size = 4096
+    impure_methods = IMPURE_METHODS
+    # results of these operands are cheaper to get again than to store
+    unshared_operands = (TypeOfCommand.VALUE, TypeOfCommand.VARIABLE, TypeOfCommand.ARGUMENT, TypeOfCommand.FUNCTION)
+    # constants of these types are copied on every evaluation, so results can't change the compiled program
+    mutable_values = (list, dict, set, tuple, np.ndarray)
+    keyword_pattern = re.compile(r'\s*\w+\s*=(?!=)')
+    lambda_pattern = re.compile(r'\s*(\w+\s*=\s*)?lambda\s')
+    params_pattern = re.compile(r'''[()\[\]{},:'"]''')
+
+    def __init__(self, evaluator):
+        self.evaluator = evaluator
+        self.vectorizer = Vectorizer(evaluator)
+        self.streamer = Streamer(evaluator)
 
     def _is_arg(self, string):
         """
         Checks if argument is arg or kwarg
         """
 
-        if re.match(r' *[\w]* *=', string):
+        if self.keyword_pattern.match(string):
             return False
         return True
 
     def _split_params(self, s: str):
         """
-        Splits params of method by comma
+        Splits params of method by comma.
+        Commas inside brackets, strings and parameters of lambda function are skipped.
         """
 
         # todo: handle "(", ")" as name of column
         stack = []
         brackets = {'(': ')', '{': '}', '[': ']'}
-        brackets_possible = {'(', ')', '{', '}', '[', ']'}
-        pos = amount = prev = 0
+        prev = 0
+        quote = None
         answer = []
+        lambda_params = bool(self.lambda_pattern.match(s))
 
-        for element in s:
-            if element in brackets_possible:
-                if element in brackets:
-                    stack.append((element, pos))
-                    amount += 1
-                else:
-                    amount -= 1
-                    if not stack or brackets[stack.pop()[0]] != element:
-                        self.evaluator.raise_excess_parentheses(s, pos)
-            lambda_start = re.match(r' *lambda .*', s[prev: pos])
-            whole_lambda = re.match(r' *lambda [^:]*:', s[prev: pos])
-            if amount == 0 and element == ',' and (not lambda_start or (lambda_start and whole_lambda)):
+        for match in self.params_pattern.finditer(s):
+            element, pos = match.group(0), match.start()
+            if quote:
+                if element == quote:
+                    quote = None
+            elif element in {'\'', '"'}:
+                quote = element
+            elif element in brackets:
+                stack.append((element, pos))
+            elif element in {')', '}', ']'}:
+                if not stack or brackets[stack.pop()[0]] != element:
+                    self.evaluator.raise_excess_parentheses(s, pos)
+            elif stack:
+                continue
+            elif element == ':':
+                lambda_params = False
+            elif not lambda_params:
                 answer.append(s[prev:pos].strip())
                 prev = pos + 1
-            pos += 1
+                lambda_params = bool(self.lambda_pattern.match(s, prev))
 
         if stack:
             self.evaluator.raise_excess_parentheses(s, stack[-1][1])
         answer.append(s[prev:].strip())
         return answer
 
-    def _solve_inside_method(self, command, df, local):
+    def _compile_params(self, command: str, parameters: tuple):
         """
-        Gets args as command inside the method
-        Returns args and kwargs
+        Compiles args of the method once
+        Returns programs of args and kwargs
         example:
             command = "lambda t: t ** 2 > 34, q = 0.5"
-            returns: [Lambda], {q: 0.5}
+            returns: (program of lambda,), (('q', program of 0.5),)
         """
 
-        if not command:
-            return [], {}
+        if not command.strip():
+            return (), ()
 
         params = self._split_params(command)
+        if len(params) > 1 and not params[-1]:
+            # trailing comma
+            params.pop()
         args = []
-        kwargs = {}
-        are_args = True
+        kwargs = []
         for param in params:
             if self._is_arg(param):
-                if not are_args:
+                if kwargs:
                     raise SyntaxError("Positional argument follows keyword argument")
-                arg = self._analyse(param, df, local)
-                args.append(arg)
+                args.append(self.evaluator.compile(param, parameters).program)
             else:
-                are_args = False
-                keyword = param.split('=')[0].replace(' ', '')
-                arg = self._analyse(param.split('=', maxsplit=1)[1], df, local)
-                kwargs[keyword] = arg
+                keyword, value = param.split('=', maxsplit=1)
+                kwargs.append((keyword.strip(), self.evaluator.compile(value, parameters).program))
+        return tuple(args), tuple(kwargs)
+
+    def _solve_params(self, args, kwargs, df, local, arguments, parameters):
+        """
+        Returns values of compiled args and kwargs
+        """
+        args = [self._execute(arg, df, local, arguments, parameters) for arg in args]
+        kwargs = {keyword: self._execute(value, df, local, arguments, parameters) for keyword, value in kwargs}
         return args, kwargs
 
     def _get_variable(self, var, df, local) -> pd.Series:
@@ -107,7 +175,7 @@ class Calculator(BaseCalculator):
         variable = None
         if isinstance(var, tuple):
             if var[0] == TypeOfCommand.VALUE:
-                variable = var[1]
+                variable = copy.deepcopy(var[1]) if isinstance(var[1], self.mutable_values) else var[1]
             elif var[0] == TypeOfCommand.COLUMN:
                 try:
                     variable = df[var[1]]
@@ -127,97 +195,646 @@ class Calculator(BaseCalculator):
             variable = var
         return var if variable is None else variable
 
-    def _raise_operation_cant_be_applied(self, stack, op):
-        if not stack:
-            raise Exception(('Operation "{operation}" can\'t be applied to Nothing').format(operation=op))
-
-    def _operate(self, stack, op, df, local):
+    def _call_method(self, var1, method, args, kwargs):
         """
-        Calculates result of operations.
+        Returns result of var1.method(*args, **kwargs)
         """
+        if isinstance(var1, ArrowColumn):
+            return var1.call_method(method, args, kwargs, self._call_method)
+        if not hasattr(var1, method):
+            raise Exception(('Method "{method}" doesn\'t exist').format(method=method))
+        if method in {'apply', 'quantile'} and not isinstance(var1, (pd.Series, pd.DataFrame)):
+            raise Exception(('Method "{method}" can only be applied to Series or Dataframe, not {type}')
+                            .format(method=method, type=type(var1)))
+        args = [list(arg) if isinstance(arg, tuple) else arg for arg in args]
+        kwargs = {k: list(v) if isinstance(v, tuple) else v for k, v in kwargs.items()}
+        value = self.vectorizer.apply(var1, method, args, kwargs)
+        if value is None:
+            value = getattr(var1, method)(*args, **kwargs)
+        return value
 
-        if op == '~':
-            self._raise_operation_cant_be_applied(stack, op)
-            l = stack.pop()
+    def _get_property(self, var1, name):
+        if not hasattr(var1, name):
+            raise Exception(('Method "{method}" doesn\'t exist').format(method=name))
+        return getattr(var1, name)
 
-            var1 = self._get_variable(l, df, local)
-            stack.append(self.evaluator.operators[op](var1))
-        else:
-            self._raise_operation_cant_be_applied(stack, op)
-            r = stack.pop()
-            self._raise_operation_cant_be_applied(stack, op)
-            l = stack.pop()
-            var1 = self._get_variable(l, df, local)
-
-            if isinstance(r, tuple) and r[0] == TypeOfCommand.METHOD:
-                if hasattr(var1, r[2]):
-                    if r[2] in {'apply', 'quantile'} and not isinstance(var1, (pd.Series, pd.DataFrame)):
-                        raise Exception(('Method "{method}" can only be applied to Series or Dataframe, not {type}')
-                                        .format(method=r[2], type=type(var1)))
-                    args, kwargs = self._solve_inside_method(r[1], df, local)
-                    args = [list(arg) if isinstance(arg, tuple) else arg for arg in args]
-                    kwargs = {k: list(v) if isinstance(v, tuple) else v for k, v in kwargs.items()}
-                    stack.append(getattr(var1, r[2])(*args, **kwargs))
-                else:
-                    raise Exception(('Method "{method}" doesn\'t exist').format(method=r[2]))
-            elif isinstance(r, tuple) and r[0] == TypeOfCommand.PROPERTY:
-                if hasattr(var1, r[1]):
-                    var1 = self._get_variable(l, df, local)
-                    stack.append(getattr(var1, r[1]))
-                else:
-                    raise Exception(('Method "{method}" doesn\'t exist').format(method=r[1]))
-            else:
-                var1 = self._get_variable(l, df, local)
-                var2 = self._get_variable(r, df, local)
-                stack.append(self.evaluator.operators[op](var1, var2))
+    def _check_operands(self, depth, arity, op):
+        if depth < arity:
+            raise Exception(('Operation "{operation}" can\'t be applied to Nothing').format(operation=op))
 
-    def _polish_notation(self, s: List[Union[str, tuple]], df: Optional[pd.DataFrame] = None, local: dict = None):
+    def _to_postfix(self, s: List[Union[str, tuple]]) -> List[Union[str, tuple]]:
         """
-        Returns result of command.
+        Returns command in postfix notation.
         https://e-maxx.ru/algo/expressions_parsing
+        "body if condition else orelse" becomes condition followed by
+        (TypeOfCommand.CONDITION, body, orelse), branches are separate programs.
         """
 
-        stack = []
+        output = []
         op = []
+        # output positions where current parentheses start
+        groups = [0]
+        # amount of operands which will be on the stack during execution
+        depth = 0
+
+        def emit(operation):
+            if isinstance(operation, tuple):
+                # ('if', body_start, condition_start[, orelse_start])
+                body_start, condition_start = operation[1:3]
+                orelse_start = operation[3] if len(operation) == 4 else len(output)
+                body, condition, orelse = (output[body_start:condition_start], output[condition_start:orelse_start],
+                                           output[orelse_start:])
+                if not body or not condition or (len(operation) == 4 and not orelse):
+                    raise Exception('Wrong conditional expression, expected "body if condition else orelse"')
+                output[body_start:] = condition + [(TypeOfCommand.CONDITION, tuple(body), tuple(orelse))]
+                return depth - len(operation) + 2
+            arity = 1 if operation == '~' else 2
+            self._check_operands(depth, arity, operation)
+            output.append(operation)
+            return depth - arity + 1
 
         for element in s:
             if element == '(':
                 op.append(element)
+                groups.append(len(output))
             elif element == ')':
                 while op[-1] != '(':
-                    self._operate(stack, op.pop(), df, local)
+                    depth = emit(op.pop())
                 op.pop()
-            elif element in self.evaluator.operators.keys():
+                groups.pop()
+            elif element == 'if':
+                while op and op[-1] != '(' and not isinstance(op[-1], tuple):
+                    depth = emit(op.pop())
+                if op and isinstance(op[-1], tuple) and len(op[-1]) == 3:
+                    raise Exception('Conditional expression inside of condition should be in parentheses')
+                # body of nested conditional expression starts after else
+                body_start = op[-1][3] if op and isinstance(op[-1], tuple) else groups[-1]
+                op.append(('if', body_start, len(output)))
+            elif element == 'else':
+                while op and op[-1] != '(' and not isinstance(op[-1], tuple):
+                    depth = emit(op.pop())
+                if not op or not isinstance(op[-1], tuple) or len(op[-1]) == 4:
+                    raise Exception('"else" without "if"')
+                op.append(op.pop() + (len(output),))
+            elif isinstance(element, str) and element in self.evaluator.operators.keys():
                 curop = element
                 # {'~', '**'} are right associated
                 while op and ((curop not in {'~', '**'} and
                                self.operators_priorities.get(op[-1], -1) >= self.operators_priorities.get(curop, -1)) or
                               (curop in {'~', '**'} and
                                self.operators_priorities.get(op[-1], -1) > self.operators_priorities.get(curop, -1))):
-                    self._operate(stack, op.pop(), df, local)
+                    depth = emit(op.pop())
                 op.append(curop)
+            elif element[0] in (TypeOfCommand.METHOD, TypeOfCommand.PROPERTY):
+                self._check_operands(depth, 1, '')
+                output.append(element)
+            elif element[0] == TypeOfCommand.FUNCTION and depth and len(element) > 2:
+                # name of function with operands is a local variable
+                output.append((TypeOfCommand.VARIABLE, element[2]))
+                depth += 1
+            elif element[0] == TypeOfCommand.FUNCTION:
+                if depth:
+                    raise Exception("There can't be function and something else")
+                return [element]
             else:
-                stack.append(element)
-                if element[0] in (TypeOfCommand.METHOD, TypeOfCommand.PROPERTY):
-                    self._operate(stack, '', df, local)
-                if element[0] == TypeOfCommand.FUNCTION_EXECUTABLE:
-                    r = stack.pop()
-                    args, kwargs = self._solve_inside_method(r[1], df, local)
-                    stack.append(self.evaluator.handle_function(r[2])(*args, **kwargs))
-                if element[0] == TypeOfCommand.FUNCTION:
-                    r = stack.pop()
-                    if stack:
-                        raise Exception("There can't be function and something else")
-                    return r[1]
+                output.append(element)
+                depth += 1
 
         while op:
-            self._operate(stack, op.pop(), df, local)
-        if len(stack) > 1:
+            depth = emit(op.pop())
+        if depth > 1:
             raise Exception("2 or more elements left without operations")
-        value = stack.pop()
-        return self._get_variable(value, df, local)
+        return output
+
+    def _condition(self, test, body, orelse, df, local, arguments, parameters):
+        """
+        Returns result of conditional expression.
+        Only the taken branch is calculated for scalar condition,
+        array-like condition chooses values element-wise.
+        """
+        if isinstance(test, ArrowColumn):
+            value = self._execute(body, df, local, arguments, parameters)
+            other = self._execute(orelse, df, local, arguments, parameters) if orelse else None
+            return test.choose(value, other)
+        if not isinstance(test, (pd.Series, pd.DataFrame, np.ndarray)):
+            if test:
+                return self._execute(body, df, local, arguments, parameters)
+            return self._execute(orelse, df, local, arguments, parameters) if orelse else None
+
+        value = self._execute(body, df, local, arguments, parameters)
+        other = self._execute(orelse, df, local, arguments, parameters) if orelse else None
+        if isinstance(test, np.ndarray):
+            return np.where(test, value, other)
+        test = test.astype(bool)
+        if isinstance(value, (pd.Series, pd.DataFrame)):
+            return value.where(test, other)
+        if isinstance(other, (pd.Series, pd.DataFrame)):
+            return other.mask(test, value)
+        if isinstance(test, pd.Series):
+            return pd.Series(np.where(test, value, other), index=test.index)
+        return pd.DataFrame(np.where(test, value, other), index=test.index, columns=test.columns)
+
+    def _kernel(self, kernel, stack, df, local):
+        """
+        Returns result of fused operators applied to operands from the top of the stack
+        """
+        operands = stack[len(stack) - kernel.arity:]
+        del stack[len(stack) - kernel.arity:]
+        fusion = self.evaluator.fusion
+        value = None if fusion is None else fusion.execute(kernel, operands)
+        if value is None:
+            value = self._execute(kernel.program, df, local, tuple(operands), kernel.parameters)
+        return value
+
+    def _with_arguments(self, local, arguments, parameters):
+        """
+        Returns local variables together with lambda arguments
+        """
+        if not arguments:
+            return local
+        return (local or {}) | dict(zip(parameters, arguments))
+
+    def _execute(self, program, df: Optional[pd.DataFrame] = None, local: dict = None,
+                 arguments: tuple = (), parameters: tuple = (), many: bool = False):
+        """
+        Returns result of command in postfix notation, or all results left on the stack if many.
+        Operands are resolved when they are put on the stack.
+        Lambda arguments are taken from slots, variables dict is built only
+        for nested lambda functions.
+        Limits of the call are checked after every element.
+        Hooks of the call are called around every element.
+        """
+
+        stack = []
+        registers = {}
+        budget = self.evaluator.current_budget()
+        hooks = self.evaluator.current_hooks()
+
+        try:
+            for position, element in enumerate(program):
+                if hooks:
+                    for hook in hooks:
+                        hook.before(program, position, parameters)
+                if isinstance(element, str):
+                    operation = self.evaluator.operators[element]
+                    if element == '~':
+                        stack.append(operation(stack.pop()))
+                    else:
+                        r = stack.pop()
+                        l = stack.pop()
+                        if budget is not None:
+                            budget.check_operation(element, l, r)
+                        stack.append(operation(l, r))
+                elif element[0] == TypeOfCommand.ARGUMENT:
+                    stack.append(arguments[element[1]])
+                elif element[0] == TypeOfCommand.STORE:
+                    registers[element[1]] = stack[-1]
+                elif element[0] == TypeOfCommand.LOAD:
+                    # the last use releases the value
+                    stack.append(registers.pop(element[1]) if element[2] else registers[element[1]])
+                elif element[0] == TypeOfCommand.PROPERTY:
+                    stack.append(self._get_property(stack.pop(), element[1]))
+                elif element[0] == TypeOfCommand.METHOD:
+                    args, kwargs = self._solve_params(*element[2:], df, local, arguments, parameters)
+                    stack.append(self._call_method(stack.pop(), element[1], args, kwargs))
+                elif element[0] == TypeOfCommand.FUNCTION_EXECUTABLE:
+                    args, kwargs = self._solve_params(*element[2:], df, local, arguments, parameters)
+                    function = self.evaluator.handle_function(element[1])
+                    if budget is not None:
+                        budget.check_call(function, args, kwargs)
+                    stack.append(function(*args, **kwargs))
+                elif element[0] == TypeOfCommand.CONDITION:
+                    stack.append(self._condition(stack.pop(), *element[1:], df, local, arguments, parameters))
+                elif element[0] == TypeOfCommand.KERNEL:
+                    stack.append(self._kernel(element[1], stack, df, local))
+                elif element[0] == TypeOfCommand.FUNCTION:
+                    function = element[1]
+                    if len(element) > 2 and local and element[2] in local:
+                        function = local[element[2]]
+                    elif isinstance(function, Lambda):
+                        function = function.bind(df, self._with_arguments(local, arguments, parameters))
+                    stack.append(function)
+                else:
+                    stack.append(self._get_variable(element, df, local))
+                if budget is not None:
+                    budget.step(stack[-1] if stack else None)
+                if hooks:
+                    for hook in hooks:
+                        hook.after(program, position, parameters, stack[-1] if stack else None)
+        except Exception as error:
+            if hooks:
+                for hook in hooks:
+                    hook.failed(program, position, parameters, error)
+            raise
+
+        return stack if many else stack.pop()
+
+    def _polish_notation(self, s: List[Union[str, tuple]], df: Optional[pd.DataFrame] = None, local: dict = None):
+        """
+        Returns result of command.
+        """
+        return self._execute(self.compile(s), df, local)
+
+    def _link(self, program, parameters):
+        """
+        Replaces variables which are lambda parameters with slots of arguments,
+        compiles args of methods and functions.
+            (TypeOfCommand.METHOD, command_inner, name) -> (TypeOfCommand.METHOD, name, args, kwargs)
+        """
+        output = []
+        for element in program:
+            if isinstance(element, tuple) and element[0] == TypeOfCommand.VARIABLE and element[1] in parameters:
+                element = (TypeOfCommand.ARGUMENT, parameters.index(element[1]))
+            elif (isinstance(element, tuple) and element[0] == TypeOfCommand.FUNCTION and len(element) > 2
+                  and element[2] in parameters):
+                element = (TypeOfCommand.ARGUMENT, parameters.index(element[2]))
+            elif isinstance(element, tuple) and element[0] == TypeOfCommand.CONDITION:
+                element = (TypeOfCommand.CONDITION, self._link(element[1], parameters),
+                           self._link(element[2], parameters))
+            elif isinstance(element, tuple) and element[0] in (TypeOfCommand.METHOD,
+                                                               TypeOfCommand.FUNCTION_EXECUTABLE):
+                element = (element[0], element[2], *self._compile_params(element[1], parameters))
+            output.append(element)
+        return tuple(output)
+
+    def _calculate_constant(self, function, args, kwargs, operation=None):
+        """
+        Returns (True, value) if function can be calculated during compilation
+        Errors, warnings, big and mutable values are left for evaluation
+        """
+        budget = Budget(Limits(result_size=self.folded_size))
+        try:
+            if operation is None:
+                budget.check_call(function, args, kwargs)
+            elif len(args) == 2:
+                budget.check_operation(operation, *args)
+            with warnings.catch_warnings(), np.errstate(all='raise'):
+                warnings.simplefilter('error')
+                value = function(*args, **kwargs)
+            budget.step(value)
+            if isinstance(value, (np.ndarray, list, dict, set)):
+                return False, None
+            return True, value
+        except Exception:
+            return False, None
+
+    def _constant_function(self, name, args, kwargs):
+        """
+        Returns (True, value) for call of pure function with constant args
+        """
+        programs = list(args) + [value for _, value in kwargs]
+        if not all(len(program) == 1 and program[0][0] == TypeOfCommand.VALUE for program in programs):
+            return False, None
+        try:
+            # forbidden functions are never executed
+            function = self.evaluator.handle_function(name)
+        except Exception:
+            return False, None
+        if name not in self.foldable_funcs and not isinstance(function, np.ufunc):
+            return False, None
+        return self._calculate_constant(function, [arg[0][1] for arg in args],
+                                        {keyword: value[0][1] for keyword, value in kwargs})
+
+    def _fold(self, program):
+        """
+        Replaces operations and pure functions with constant operands by their values
+            [(VALUE, 1), (VALUE, 0.2), '+'] -> [(VALUE, 1.2)]
+        """
+        output = []
+        # position in output where each operand starts and whether it is a constant
+        operands = []
+
+        for element in program:
+            if isinstance(element, str):
+                arity = 1 if element == '~' else 2
+                start = operands[-arity][0]
+                folded = False
+                if all(constant for _, constant in operands[-arity:]):
+                    folded, value = self._calculate_constant(self.evaluator.operators[element],
+                                                             [output[pos][1] for pos, _ in operands[-arity:]], {},
+                                                             element)
+                if folded:
+                    output[start:] = [(TypeOfCommand.VALUE, value)]
+                else:
+                    output.append(element)
+                operands[-arity:] = [(start, folded)]
+            elif element[0] in (TypeOfCommand.METHOD, TypeOfCommand.PROPERTY):
+                output.append(element)
+                operands[-1] = (operands[-1][0], False)
+            elif element[0] == TypeOfCommand.FUNCTION_EXECUTABLE:
+                folded, value = self._constant_function(*element[1:])
+                operands.append((len(output), folded))
+                output.append((TypeOfCommand.VALUE, value) if folded else element)
+            elif element[0] == TypeOfCommand.CONDITION:
+                body, orelse = self._fold(element[1]), self._fold(element[2])
+                start, constant = operands.pop()
+                if constant:
+                    # only the taken branch is left
+                    taken = (body if output[start][1] else orelse) or ((TypeOfCommand.VALUE, None),)
+                    output[start:] = taken
+                    operands.append((start, len(taken) == 1 and taken[0][0] == TypeOfCommand.VALUE))
+                else:
+                    output.append((TypeOfCommand.CONDITION, body, orelse))
+                    operands.append((start, False))
+            else:
+                operands.append((len(output), element[0] == TypeOfCommand.VALUE))
+                output.append(element)
+        return tuple(output)
+
+    def _arity(self, element):
+        if isinstance(element, str):
+            return 1 if element == '~' else 2
+        if element[0] in (TypeOfCommand.METHOD, TypeOfCommand.PROPERTY, TypeOfCommand.CONDITION):
+            return 1
+        if element[0] == TypeOfCommand.KERNEL:
+            return element[1].arity
+        return 0
+
+    def _is_pure(self, element):
+        if isinstance(element, tuple) and element[0] == TypeOfCommand.METHOD:
+            return element[1] not in self.impure_methods and all(key != 'inplace' for key, _ in element[3])
+        return True
+
+    def _key(self, value):
+        """
+        Returns key equal only for equal elements.
+        repr distinguishes values which are equal but have different types (1, 1.0, True),
+        arrays are compared by data since repr of long arrays is shortened.
+        """
+        if isinstance(value, (tuple, list)):
+            return type(value).__name__, tuple(self._key(item) for item in value)
+        if isinstance(value, np.ndarray):
+            return 'ndarray', value.dtype.str, value.shape, value.tobytes()
+        return repr(value)
+
+    def _share(self, program):
+        """
+        Returns program where equal parts are calculated once.
+        Program is turned into graph with one node for all equal subtrees,
+        the first calculation of the node used several times is followed by (STORE, slot),
+        the others are replaced with (LOAD, slot, is_last_use).
+            ${a} - ${b} + (${a} - ${b}) ** 2 ->
+            ${a} ${b} - (STORE, 0) (LOAD, 0, True) 2 ** +
+        """
+        program = [(TypeOfCommand.CONDITION, self._share(element[1]), self._share(element[2]))
+                   if isinstance(element, tuple) and element[0] == TypeOfCommand.CONDITION else element
+                   for element in program]
+        # node of every element and position where its subtree starts
+        nodes = []
+        starts = []
+        keys = {}
+        uses = []
+        stack = []
+        for pos, element in enumerate(program):
+            arity = self._arity(element)
+            children = tuple(node for node, _ in stack[len(stack) - arity:])
+            start = stack[-arity][1] if arity else pos
+            del stack[len(stack) - arity:]
+            key = (self._key(element), children) if self._is_pure(element) else (pos,)
+            node = keys.setdefault(key, len(uses))
+            if node == len(uses):
+                uses.append(0)
+                for child in children:
+                    uses[child] += 1
+            nodes.append(node)
+            starts.append(start)
+            stack.append((node, start))
+        for node, _ in stack:
+            uses[node] += 1
+
+        def is_shared(pos):
+            return uses[nodes[pos]] > 1 and (isinstance(program[pos], str) or
+                                             program[pos][0] not in self.unshared_operands)
+
+        # subtrees which are not inside of another repeated subtree are replaced with LOAD
+        first = {}
+        for pos in range(len(program)):
+            first.setdefault(nodes[pos], pos)
+        loads = {}
+        pos = len(program) - 1
+        while pos >= 0:
+            if is_shared(pos) and first[nodes[pos]] != pos:
+                loads[starts[pos]] = pos
+                pos = starts[pos]
+            pos -= 1
+
+        if not loads:
+            return tuple(program)
+        output = []
+        slots = {}
+        remaining = {}
+        pos = 0
+        while pos < len(program):
+            if pos in loads:
+                node = nodes[loads[pos]]
+                remaining[node] -= 1
+                output.append((TypeOfCommand.LOAD, slots[node], remaining[node] == 0))
+                pos = loads[pos] + 1
+                continue
+            output.append(program[pos])
+            node = nodes[pos]
+            if is_shared(pos) and first[node] == pos:
+                slots[node] = len(slots)
+                remaining[node] = uses[node] - 1
+                output.append((TypeOfCommand.STORE, slots[node]))
+            pos += 1
+        return tuple(output)
+
+    def _unshare(self, program):
+        """
+        Returns program where LOAD of shared node is replaced with its calculation
+        """
+        output = []
+        # positions where operands on the stack start
+        starts = []
+        slots = {}
+        for element in program:
+            if isinstance(element, tuple) and element[0] == TypeOfCommand.STORE:
+                slots[element[1]] = output[starts[-1]:]
+                continue
+            if isinstance(element, tuple) and element[0] == TypeOfCommand.LOAD:
+                starts.append(len(output))
+                output.extend(slots[element[1]])
+                continue
+            if isinstance(element, tuple) and element[0] == TypeOfCommand.CONDITION:
+                element = (TypeOfCommand.CONDITION, self._unshare(element[1]), self._unshare(element[2]))
+            arity = self._arity(element)
+            start = starts[-arity] if arity else len(output)
+            del starts[len(starts) - arity:]
+            starts.append(start)
+            output.append(element)
+        return tuple(output)
+
+    def _unfuse(self, program):
+        """
+        Returns program where kernels are replaced with their operators, arguments of kernel with its operands
+        """
+        output = []
+        # positions where operands on the stack start
+        starts = []
+        for element in program:
+            if isinstance(element, tuple) and element[0] == TypeOfCommand.KERNEL:
+                kernel = element[1]
+                bounds = starts[len(starts) - kernel.arity:] + [len(output)]
+                operands = [output[bounds[slot]:bounds[slot + 1]] for slot in range(kernel.arity)]
+                start = bounds[0]
+                del output[start:]
+                for part in kernel.program:
+                    if isinstance(part, tuple) and part[0] == TypeOfCommand.ARGUMENT:
+                        output.extend(operands[part[1]])
+                    else:
+                        output.append(part)
+                del starts[len(starts) - kernel.arity:]
+                starts.append(start)
+                continue
+            if isinstance(element, tuple) and element[0] == TypeOfCommand.CONDITION:
+                element = (TypeOfCommand.CONDITION, self._unfuse(element[1]), self._unfuse(element[2]))
+            arity = self._arity(element)
+            start = starts[-arity] if arity else len(output)
+            del starts[len(starts) - arity:]
+            starts.append(start)
+            output.append(element)
+        return tuple(output)
+
+    def _source(self, program, parameters, shared=None, names=None):
+        """
+        Returns readable command of compiled program.
+        names dict is filled with readable commands of results of elements by their positions.
+        """
+        stack = []
+        registers = {}
+        for position, element in enumerate(program):
+            if isinstance(element, str):
+                if element == '~':
+                    stack.append(f'~{stack.pop()}')
+                else:
+                    r = stack.pop()
+                    stack.append(f'({stack.pop()} {element} {r})')
+            elif element[0] == TypeOfCommand.VALUE:
+                stack.append(repr(element[1]))
+            elif element[0] == TypeOfCommand.COLUMN:
+                stack.append(f'${{{element[1]}}}')
+            elif element[0] == TypeOfCommand.DATAFRAME:
+                stack.append('${__df}' if len(element) == 1 else f'${{__df}}[{element[1]!r}]')
+            elif element[0] == TypeOfCommand.VARIABLE:
+                stack.append(element[1])
+            elif element[0] == TypeOfCommand.ARGUMENT:
+                stack.append(parameters[element[1]])
+            elif element[0] == TypeOfCommand.STORE:
+                registers[element[1]] = stack[-1]
+                if shared is not None:
+                    shared.append([stack[-1], 1])
+            elif element[0] == TypeOfCommand.LOAD:
+                stack.append(registers[element[1]])
+                if shared is not None:
+                    shared[element[1]][1] += 1
+            elif element[0] == TypeOfCommand.PROPERTY:
+                stack.append(f'{stack.pop()}.{element[1]}')
+            elif element[0] in (TypeOfCommand.METHOD, TypeOfCommand.FUNCTION_EXECUTABLE):
+                params = [self._source(arg, parameters) for arg in element[2]]
+                params += [f'{keyword}={self._source(value, parameters)}' for keyword, value in element[3]]
+                call = f'{element[1]}({", ".join(params)})'
+                stack.append(f'{stack.pop()}.{call}' if element[0] == TypeOfCommand.METHOD else call)
+            elif element[0] == TypeOfCommand.KERNEL:
+                operands = stack[len(stack) - element[1].arity:]
+                del stack[len(stack) - element[1].arity:]
+                stack.append(self._source(element[1].program, operands))
+            elif element[0] == TypeOfCommand.CONDITION:
+                test, body = stack.pop(), self._source(element[1], parameters)
+                orelse = f' else {self._source(element[2], parameters)}' if element[2] else ''
+                stack.append(f'({body} if {test}{orelse})')
+            elif isinstance(element[1], Lambda):
+                stack.append(f'lambda {", ".join(element[1].variables)}: {element[1].command}')
+            else:
+                stack.append(getattr(element[1], '__name__', repr(element[1])))
+            if names is not None and stack:
+                names[position] = stack[-1]
+        return stack.pop()
+
+    def references(self, program) -> tuple:
+        """
+        Returns names of columns used by the program and whether the whole DataFrame is used
+        """
+        columns = []
+        uses_df = False
+        programs = [program]
+        for program in programs:
+            for element in program:
+                if isinstance(element, str):
+                    continue
+                if element[0] == TypeOfCommand.COLUMN and element[1] not in columns:
+                    columns.append(element[1])
+                elif element[0] == TypeOfCommand.DATAFRAME:
+                    if len(element) == 1:
+                        uses_df = True
+                    elif element[1] not in columns:
+                        columns.append(element[1])
+                elif element[0] in (TypeOfCommand.METHOD, TypeOfCommand.FUNCTION_EXECUTABLE):
+                    programs.extend(element[2])
+                    programs.extend(value for _, value in element[3])
+                elif element[0] == TypeOfCommand.CONDITION:
+                    programs.extend(element[1:])
+                elif element[0] == TypeOfCommand.FUNCTION and isinstance(element[1], Lambda):
+                    programs.append(element[1].body.program)
+        return tuple(columns), uses_df
+
+    def variables(self, program) -> tuple:
+        """
+        Returns names of variables used by the program including arguments of lambda functions
+        """
+        names = []
+        programs = [program]
+        for program in programs:
+            for element in program:
+                if isinstance(element, str):
+                    continue
+                if element[0] == TypeOfCommand.VARIABLE and element[1] not in names:
+                    names.append(element[1])
+                elif element[0] == TypeOfCommand.FUNCTION and len(element) > 2 and element[2] not in names:
+                    names.append(element[2])
+                elif element[0] in (TypeOfCommand.METHOD, TypeOfCommand.FUNCTION_EXECUTABLE):
+                    programs.extend(element[2])
+                    programs.extend(value for _, value in element[3])
+                elif element[0] == TypeOfCommand.CONDITION:
+                    programs.extend(element[1:])
+                elif element[0] == TypeOfCommand.FUNCTION and isinstance(element[1], Lambda):
+                    programs.append(element[1].body.program)
+        return tuple(names)
+
+    def shared_nodes(self, program, parameters=()):
+        """
+        Returns list of (command, uses) for parts of the program which are calculated once
+        """
+        shared = []
+        self._source(program, parameters, shared)
+        return [tuple(node) for node in shared]
+
+    def compile_many(self, programs):
+        """
+        Returns one program leaving results of all programs on the stack,
+        equal parts (e.g. columns) of different programs are calculated once
+        """
+        return self._share(tuple(element for program in programs for element in self._unshare(program)))
+
+    def execute_many(self, program, df, local):
+        return self._execute(program, df, local, many=True)
+
+    def stream(self, compiled, chunks, local):
+        return self.streamer.stream(compiled, chunks, local)
+
+    def reduce_stream(self, compiled, chunks, local):
+        return self.streamer.reduce(compiled, chunks, local)
+
+    def compile(self, stack, parameters=()):
+        program = self._fold(self._link(self._to_postfix(stack), tuple(parameters)))
+        # lambda bodies are calculated for scalars
+        if self.evaluator.fusion is not None and not parameters:
+            program = self.evaluator.fusion.fuse(program)
+        return self._share(program)
+
+    def execute(self, program, df, local, arguments=(), parameters=()):
+        return self._execute(program, df, local, arguments, parameters)
 
     def calculate(self, stack, df, local):
         output = self._polish_notation(stack, df, local)
         return output
-
@@ -0,0 +1,77 @@
+from typing import Optional
+
+import pandas as pd
+
+from safe_evaluation.limits import Limits
+
+
+class CompiledExpression:
+    """
+    Parsed and validated command which can be evaluated many times with different data.
+    Holds only the immutable program, so one instance can be reused by any amount of calls and threads.
+    """
+
+    __slots__ = ('evaluator', 'command', 'program', 'parameters', '__weakref__')
+
+    def __init__(self, evaluator, command: str, program: tuple, parameters: tuple = ()):
+        object.__setattr__(self, 'evaluator', evaluator)
+        object.__setattr__(self, 'command', command)
+        object.__setattr__(self, 'program', program)
+        object.__setattr__(self, 'parameters', parameters)
+
+    def __setattr__(self, key, value):
+        raise AttributeError('CompiledExpression is immutable')
+
+    def __delattr__(self, key):
+        raise AttributeError('CompiledExpression is immutable')
+
+    def __repr__(self):
+        return f'CompiledExpression({self.command!r})'
+
+    @property
+    def columns(self) -> tuple:
+        """
+        Returns names of columns referenced by ${column} in the order of their first use
+        """
+        return self.evaluator.calculator.references(self.program)[0]
+
+    @property
+    def uses_df(self) -> bool:
+        """
+        Returns whether the whole DataFrame is used by ${__df}, then every column may be needed
+        """
+        return self.evaluator.calculator.references(self.program)[1]
+
+    def shared_nodes(self) -> list:
+        """
+        Returns list of (command, uses) for parts of expression which are calculated once per evaluation
+        """
+        return self.evaluator.calculator.shared_nodes(self.program, self.parameters)
+
+    def evaluate(self, df: Optional[pd.DataFrame] = None, local: dict = None, arguments: tuple = (),
+                 limits: Optional[Limits] = None):
+        """
+        Returns result of expression.
+        arguments are values of parameters in the same order, they are used by lambda functions.
+        """
+        with self.evaluator.snapshot(limits=limits):
+            return self.evaluator.calculator.execute(self.program, df, local, arguments, self.parameters)
+
+
+class CompiledBatch(CompiledExpression):
+    """
+    Several commands compiled into one program, parts used by different commands are calculated once.
+    """
+
+    __slots__ = ()
+
+    def __repr__(self):
+        return f'CompiledBatch({list(self.command)!r})'
+
+    def evaluate(self, df: Optional[pd.DataFrame] = None, local: dict = None, arguments: tuple = (),
+                 limits: Optional[Limits] = None) -> list:
+        """
+        Returns list of results in the order of commands
+        """
+        with self.evaluator.snapshot(limits=limits):
+            return self.evaluator.calculator.execute_many(self.program, df, local)
@@ -16,6 +16,11 @@ class TypeOfCommand(Enum):
     FUNCTION = 5
     PROPERTY = 6
     DATAFRAME = 7
+    CONDITION = 8
+    ARGUMENT = 9
+    STORE = 10
+    LOAD = 11
+    KERNEL = 12
 
 
 ALLOWED_FUNCS = {
@@ -30,6 +35,85 @@ ALLOWED_FUNCS = {
     'str': str,
 }
 
+# functions without side effects returning immutable values,
+# they are calculated during compilation if all args are constants.
+# numpy universal functions are foldable too
+FOLDABLE_FUNCS = {
+    'bool',
+    'int',
+    'float',
+    'complex',
+    'str',
+}
+
+# methods which change the object or give different results for the same input,
+# their calls are never shared between equal parts of command
+IMPURE_METHODS = {
+    'sample',
+    'append',
+    'extend',
+    'insert',
+    'pop',
+    'remove',
+    'clear',
+    'update',
+    'sort',
+    'reverse',
+    'setdefault',
+    'popitem',
+    'add',
+    'discard',
+}
+
+# methods and functions which calculate every row independently,
+# commands built of them can be calculated by chunks of DataFrame
+ROW_WISE_METHODS = {
+    'abs',
+    'round',
+    'clip',
+    'fillna',
+    'isna',
+    'isnull',
+    'notna',
+    'notnull',
+    'astype',
+    'between',
+    'isin',
+    'where',
+    'mask',
+    'replace',
+    'apply',
+    'map',
+    'lower',
+    'upper',
+    'strip',
+    'lstrip',
+    'rstrip',
+    'contains',
+    'startswith',
+    'endswith',
+    'len',
+    'slice',
+    'strftime',
+    'normalize',
+}
+
+ROW_WISE_FUNCS = {
+    'np.where',
+    'np.isin',
+    'np.clip',
+    'np.round',
+    'pd.isna',
+    'pd.notna',
+    'pd.to_numeric',
+    'pd.to_datetime',
+    'bool',
+    'int',
+    'float',
+    'complex',
+    'str',
+}
+
 NUMPY_ALLOWED_FUNCS = [
     'np',
     'numpy',
@@ -58,6 +142,41 @@ OPERATORS = {
     '*': operator.mul,
 }
 
+# Arrow compute functions of operators, others are calculated by numpy
+ARROW_OPERATORS = {
+    '<=': 'less_equal',
+    '<': 'less',
+    '>': 'greater',
+    '>=': 'greater_equal',
+    '!=': 'not_equal',
+    '==': 'equal',
+    '&': 'and_kleene',
+    '|': 'or_kleene',
+    '^': 'xor',
+    '~': 'invert',
+    '**': 'power',
+    '+': 'add',
+    '-': 'subtract',
+    '/': 'divide',
+    '*': 'multiply',
+}
+
+# methods without arguments calculated by Arrow compute functions, others are called on pandas Series
+ARROW_METHODS = {
+    'abs': 'abs',
+    'sum': 'sum',
+    'mean': 'mean',
+    'min': 'min',
+    'max': 'max',
+    'count': 'count',
+    'any': 'any',
+    'all': 'all',
+    'isna': 'is_null',
+    'isnull': 'is_null',
+    'notna': 'is_valid',
+    'notnull': 'is_valid',
+}
+
 OPERATORS_PRIORITIES = {
     'in': 1,
 
@@ -0,0 +1,299 @@
+import functools
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import weakref
+from contextlib import contextmanager
+from importlib import metadata
+from typing import List, Optional
+
+from safe_evaluation.serialization import FORMAT
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# magic, format, amount of entries
+HEADER = struct.Struct('<4sBI')
+# hash of command, offset and length of serialized expression
+RECORD = struct.Struct('<16sQI')
+MAGIC = b'SEVC'
+SUFFIX = '.sev'
+
+
+@functools.lru_cache(maxsize=None)
+def library_version() -> str:
+    """
+    Returns version of installed package together with hash of its sources,
+    so files written by other code of the library are not used
+    """
+    try:
+        version = metadata.version('safe-evaluation')
+    except metadata.PackageNotFoundError:
+        version = '0'
+    sources = hashlib.sha256(f'{version}:{FORMAT}'.encode())
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.py'):
+            with open(os.path.join(directory, name), 'rb') as file:
+                sources.update(file.read())
+    return sources.hexdigest()[:16]
+
+
+class MappedFile:
+    """
+    Read-only memory map of cache file, entries are found by binary search over sorted hashes
+    """
+
+    def __init__(self, path: str):
+        self.map = None
+        self.count = 0
+        self.identity = None
+        try:
+            with open(path, 'rb') as file:
+                stat = os.fstat(file.fileno())
+                self.identity = (stat.st_ino, stat.st_mtime_ns)
+                if stat.st_size >= HEADER.size:
+                    self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return
+        if self.map is not None:
+            magic, version, count = HEADER.unpack_from(self.map)
+            if magic == MAGIC and version == FORMAT:
+                self.count = count
+
+    def is_outdated(self, path: str) -> bool:
+        """
+        Returns whether the file was replaced after it was mapped
+        """
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return self.identity is not None
+        return self.identity != (stat.st_ino, stat.st_mtime_ns)
+
+    def get(self, key: bytes) -> Optional[bytes]:
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            start = HEADER.size + middle * RECORD.size
+            if self.map[start:start + len(key)] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == self.count:
+            return None
+        found, offset, length = RECORD.unpack_from(self.map, HEADER.size + low * RECORD.size)
+        return self.map[offset:offset + length] if found == key else None
+
+    def items(self):
+        for position in range(self.count):
+            key, offset, length = RECORD.unpack_from(self.map, HEADER.size + position * RECORD.size)
+            yield key, self.map[offset:offset + length]
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+            self.count = 0
+
+
+@contextmanager
+def _locked(path: str):
+    """
+    Holds exclusive lock of the directory shared by processes, without fcntl (Windows) it does nothing
+    """
+    if fcntl is None:
+        yield
+        return
+    descriptor = os.open(path, os.O_RDONLY)
+    try:
+        fcntl.flock(descriptor, fcntl.LOCK_EX)
+        yield
+    finally:
+        # closing releases the lock
+        os.close(descriptor)
+
+
+class PendingEntries:
+    """
+    New expressions of DiskCache which aren't written yet: {file name: {key: serialized expression}}.
+    They don't refer to the cache, so they are written by its finalizer when the cache is collected.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = {}
+        self.lock = threading.RLock()
+
+    def get(self, name: str, key: bytes) -> Optional[bytes]:
+        with self.lock:
+            return self.entries.get(name, {}).get(key)
+
+    def put(self, name: str, key: bytes, data: bytes) -> int:
+        """
+        Adds expression and returns amount of pending expressions
+        """
+        with self.lock:
+            self.entries.setdefault(name, {})[key] = data
+            return sum(map(len, self.entries.values()))
+
+    def clear(self):
+        with self.lock:
+            self.entries = {}
+
+    def _write(self, name: str, entries: dict):
+        keys = sorted(entries)
+        offset = HEADER.size + len(keys) * RECORD.size
+        descriptor, temporary = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                file.write(HEADER.pack(MAGIC, FORMAT, len(keys)))
+                for key in keys:
+                    file.write(RECORD.pack(key, offset, len(entries[key])))
+                    offset += len(entries[key])
+                for key in keys:
+                    file.write(entries[key])
+            os.replace(temporary, name)
+        except BaseException:
+            os.remove(temporary)
+            raise
+
+    def flush(self) -> List[str]:
+        """
+        Merges pending expressions with files and returns names of written files.
+        Processes merge files one by one, so entries written by others meanwhile are kept.
+        """
+        with self.lock:
+            pending, self.entries = self.entries, {}
+            if not pending:
+                return []
+            with _locked(self.path):
+                for name, entries in pending.items():
+                    current = MappedFile(name)
+                    try:
+                        entries = dict(current.items()) | entries
+                    finally:
+                        current.close()
+                    self._write(name, entries)
+            return list(pending)
+
+
+class DiskCache:
+    """
+    Compiled expressions stored in directory, one file for every version of library, settings and fusion.
+    Files are memory-mapped read-only, so processes share their pages and don't parse cached commands.
+    New expressions are kept in memory until flush (called on close, collection of the cache, exit of interpreter
+    or when flush_every expressions are pending), which merges them with the file under lock of the directory
+    and replaces it atomically: processes which mapped the old file keep reading it.
+    Files of other versions of library are never read, prune removes them.
+    """
+
+    def __init__(self, evaluator, path: str, flush_every: Optional[int] = None):
+        self.evaluator = evaluator
+        self.path = path
+        self.flush_every = flush_every
+        self._files = {}
+        self._names = {}
+        self._pending = PendingEntries(path)
+        self._lock = self._pending.lock
+        os.makedirs(path, exist_ok=True)
+        # expressions compiled before the cache is collected or exit of interpreter are written
+        self._finalizer = weakref.finalize(self, self._pending.flush)
+
+    def _file_name(self, settings) -> str:
+        """
+        Returns file of settings and fusion, fused programs have kernels which are calculated by numexpr if it is used
+        """
+        fusion = self.evaluator.fusion
+        variant = '' if fusion is None else '-fused-numexpr' if fusion.use_numexpr else '-fused'
+        key = (settings.digest(), variant)
+        if key not in self._names:
+            self._names[key] = os.path.join(self.path, f'{library_version()}-{key[0][:16]}{variant}{SUFFIX}')
+        return self._names[key]
+
+    def _key(self, command: str, parameters: tuple) -> bytes:
+        return hashlib.sha256(repr((command, tuple(parameters))).encode()).digest()[:16]
+
+    def _mapped(self, name: str) -> MappedFile:
+        if name not in self._files:
+            self._files[name] = MappedFile(name)
+        return self._files[name]
+
+    def get(self, command: str, parameters: tuple, settings):
+        """
+        Returns compiled expression from the cache or None
+        """
+        name, key = self._file_name(settings), self._key(command, parameters)
+        with self._lock:
+            data = self._pending.get(name, key)
+            if data is None:
+                data = self._mapped(name).get(key)
+            if data is None and self._files[name].is_outdated(name):
+                # the file was written by other process
+                self._files.pop(name).close()
+                data = self._mapped(name).get(key)
+        if data is None:
+            return None
+        compiled = self.evaluator.serializer.loads(data)
+        # hashes of different commands are equal with negligible probability
+        if compiled.command != command or compiled.parameters != tuple(parameters):
+            return None
+        return compiled
+
+    def put(self, compiled, settings):
+        try:
+            data = self.evaluator.serializer.dumps(compiled, binary=True)
+        except Exception:
+            # expressions with values which can't be serialized are compiled every time
+            return
+        name, key = self._file_name(settings), self._key(compiled.command, compiled.parameters)
+        pending = self._pending.put(name, key, data)
+        if self.flush_every is not None and pending >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes new expressions to files
+        """
+        with self._lock:
+            for name in self._pending.flush():
+                if name in self._files:
+                    self._files.pop(name).close()
+
+    def prune(self):
+        """
+        Removes files written by other versions of library
+        """
+        prefix = f'{library_version()}-'
+        for name in os.listdir(self.path):
+            if name.endswith(SUFFIX) and not name.startswith(prefix):
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except FileNotFoundError:
+                    pass
+
+    def clear(self):
+        """
+        Removes all expressions of the cache
+        """
+        with self._lock, _locked(self.path):
+            self._pending.clear()
+            for mapped in self._files.values():
+                mapped.close()
+            self._files = {}
+            for name in os.listdir(self.path):
+                if name.endswith(SUFFIX):
+                    os.remove(os.path.join(self.path, name))
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            for mapped in self._files.values():
+                mapped.close()
+            self._files = {}
+        self._finalizer.detach()
@@ -1,25 +1,222 @@
-from typing import Callable, Optional
+import threading
+from time import perf_counter
+from typing import Callable, Iterable, Optional, Union
 
 import numpy as np
 import pandas as pd
 
+from safe_evaluation.arrow import ArrowColumn, ArrowFrame, is_arrow_table, pyarrow, to_arrow
+from safe_evaluation.backends import BaseBackend, PolarsBackend
+from safe_evaluation.cache import CacheInfo, ExpressionCache
 from safe_evaluation.calculation import Calculator
+from safe_evaluation.compilation import CompiledBatch, CompiledExpression
 from safe_evaluation.constants import OPERATORS, ALLOWED_FUNCS
+from safe_evaluation.disk_cache import DiskCache
+from safe_evaluation.filtering import Filter
+from safe_evaluation.fusion import Fuser
+from safe_evaluation.limits import Budget, Limits
+from safe_evaluation.parallel import ParallelExecutor
 from safe_evaluation.preprocessing import Preprocessor
+from safe_evaluation.profiling import Hook, ProfileNode, Profiler
+from safe_evaluation.serialization import Serializer
+from safe_evaluation.session import Session
 from safe_evaluation.settings import Settings
+from safe_evaluation.sources import ColumnSource, open_source
+
+
+class CallState(threading.local):
+    """
+    Settings, budget and hooks of the call in the current thread, None outside of calls
+    """
+
+    settings = None
+    budget = None
+    hooks = None
+
+
+class CallContext:
+    """
+    Context of the call in the current thread: fixed settings of evaluator, budget of limits and hooks
+    """
+
+    __slots__ = ('evaluator', 'settings', 'limits', 'hooks', 'entered', 'previous_budget', 'previous_hooks')
+
+    def __init__(self, evaluator, settings: Optional[Settings] = None, limits: Optional[Limits] = None,
+                 hooks: tuple = ()):
+        self.evaluator = evaluator
+        self.settings = settings
+        self.limits = limits
+        self.hooks = hooks
+        self.entered = False
+        self.previous_budget = None
+        self.previous_hooks = None
+
+    def __enter__(self) -> Settings:
+        local = self.evaluator._local
+        settings = local.settings
+        limits = self.limits
+        if settings is None:
+            settings = local.settings = (self.settings or self.evaluator._settings_snapshot()).snapshot()
+            self.entered = True
+            limits = limits or self.evaluator.limits
+        self.previous_budget = local.budget
+        if limits is not None:
+            local.budget = Budget(limits)
+        self.previous_hooks = local.hooks
+        if self.hooks:
+            local.hooks = self.evaluator.current_hooks() + tuple(self.hooks)
+        return settings
+
+    def __exit__(self, *exc):
+        local = self.evaluator._local
+        local.budget = self.previous_budget
+        local.hooks = self.previous_hooks
+        if self.entered:
+            local.settings = None
+            self.entered = False
 
 
 class Evaluator:
+    """
+    One evaluator can be shared by many threads: every call uses immutable snapshot of settings
+    taken at its start, compiled expressions are immutable and can be evaluated concurrently.
+    limits are default limits of every call, see Limits.
+    """
+
     allowed_funcs = ALLOWED_FUNCS
     operators = OPERATORS
 
-    def __init__(self, preprocessor=Preprocessor, calculator=Calculator):
+    def __init__(self, preprocessor=Preprocessor, calculator=Calculator, cache_size: int = 1024,
+                 limits: Optional[Limits] = None):
         self.preprocessor = preprocessor(self)
         self.calculator = calculator(self)
         self.settings = Settings()
+        self.cache = ExpressionCache(cache_size)
+        self.parallel = None
+        self.fusion = None
+        self.backend = None
+        self.disk_cache = None
+        self.limits = limits
+        self.hooks = ()
+        self.serializer = Serializer(self)
+        self.filtering = Filter(self)
+        self._snapshot = self.settings.snapshot()
+        self._local = CallState()
 
     def change_settings(self, settings: Settings):
         self.settings = settings
+        self.cache.clear()
+
+    def _settings_snapshot(self) -> Settings:
+        snapshot, settings = self._snapshot, self.settings
+        if snapshot.key() != settings.key():
+            snapshot = self._snapshot = settings.snapshot()
+        return snapshot
+
+    def current_settings(self) -> Settings:
+        """
+        Returns immutable settings of the current call
+        """
+        settings = self._local.settings
+        if settings is None:
+            settings = self._settings_snapshot()
+        return settings
+
+    def current_budget(self) -> Optional[Budget]:
+        """
+        Returns resources left for the current call or None if it has no limits
+        """
+        return self._local.budget
+
+    def current_hooks(self) -> tuple:
+        """
+        Returns hooks of evaluator and hooks of the current call
+        """
+        hooks = self._local.hooks
+        return self.hooks if hooks is None else hooks
+
+    def add_hook(self, hook: Hook):
+        """
+        Hook is called around every element of every command calculated by evaluator, see Hook
+        """
+        self.hooks = self.hooks + (hook,)
+
+    def remove_hook(self, hook: Hook):
+        self.hooks = tuple(other for other in self.hooks if other is not hook)
+
+    def snapshot(self, settings: Optional[Settings] = None, limits: Optional[Limits] = None,
+                 hooks: tuple = ()) -> CallContext:
+        """
+        Settings are fixed for everything calculated inside of the context in the current thread,
+        change_settings called meanwhile affects only the next calls.
+        settings of the context can be passed, e.g. snapshot taken in other thread.
+        limits are shared by everything calculated inside of the context, default limits of evaluator are used
+        if they are not passed.
+        hooks are called only for elements calculated inside of the context in addition to hooks of evaluator.
+        """
+        return CallContext(self, settings, limits, hooks)
+
+    def enable_parallel(self, workers: Optional[int] = None, min_rows: int = 100_000):
+        """
+        Row-wise commands and reductions over DataFrames with at least min_rows rows
+        are calculated by row partitions in worker processes
+        """
+        self.disable_parallel()
+        self.parallel = ParallelExecutor(self, workers, min_rows)
+
+    def disable_parallel(self):
+        if self.parallel is not None:
+            self.parallel.close()
+            self.parallel = None
+
+    def enable_fusion(self, min_rows: int = 100_000, use_numexpr: bool = True):
+        """
+        Parts of commands consisting of arithmetic, comparisons and logical operators are calculated at once
+        over numpy arrays of columns by numexpr (or numpy by blocks of rows), see Fuser.
+        Columns with less than min_rows rows are calculated by pandas operators.
+        """
+        self.fusion = Fuser(self, min_rows, use_numexpr)
+        self.cache.clear()
+
+    def disable_fusion(self):
+        self.fusion = None
+        self.cache.clear()
+
+    def enable_backend(self, backend: Union[str, BaseBackend] = 'polars', min_rows: int = 100_000,
+                       on_fallback: Optional[Callable] = None):
+        """
+        Commands are calculated by other dataframe library for its frames and DataFrames with at least min_rows rows.
+        backend is 'polars' or instance of BaseBackend, parts of commands which backend can't calculate make
+        the whole command calculated by Calculator and on_fallback(compiled, error) is called.
+        """
+        if backend == 'polars':
+            backend = PolarsBackend(self, min_rows, on_fallback)
+        elif not isinstance(backend, BaseBackend):
+            raise Exception(('Unknown backend {backend}').format(backend=backend))
+        self.backend = backend
+
+    def disable_backend(self):
+        self.backend = None
+
+    def enable_disk_cache(self, path: str, flush_every: Optional[int] = None):
+        """
+        Compiled expressions are stored in directory path and shared by processes,
+        commands compiled by any process are not parsed by the others, see DiskCache.
+        New expressions are written on disable_disk_cache, exit of interpreter or when flush_every are pending.
+        """
+        self.disable_disk_cache()
+        self.disk_cache = DiskCache(self, path, flush_every)
+
+    def disable_disk_cache(self):
+        if self.disk_cache is not None:
+            self.disk_cache.close()
+            self.disk_cache = None
+
+    def cache_info(self) -> CacheInfo:
+        """
+        Returns statistics of compiled expressions cache
+        """
+        return self.cache.info()
 
     def _beautify(self, el):
         """
@@ -45,15 +242,217 @@ class Evaluator:
             expression=f'{prev_} --> {s[pos]} <-- {next_}'))
 
     def handle_function(self, func: str) -> Callable:
-        if func.startswith(('numpy', 'np', 'pandas', 'pd')) and self.settings.is_available(func) and '.' in func:
+        settings = self.current_settings()
+        if func.startswith(('numpy', 'np', 'pandas', 'pd')) and settings.is_available(func) and '.' in func:
             method = func.split('.')[1]
             package = np if func.startswith('n') else pd
             return getattr(package, method)
-        if self.settings.is_available(func):
+        if settings.is_available(func):
             return self.allowed_funcs[func]
         raise Exception(f"Unsupported function {func}")
 
-    def solve(self, command: str, df: Optional[pd.DataFrame] = None, local: dict = None):
-        stack = self.preprocessor.prepare(command, df, local)
-        output = self.calculator.calculate(stack, df, local)
+    def compile(self, command: str, parameters: tuple = ()) -> CompiledExpression:
+        """
+        Parses and validates command once.
+        Returned expression can be evaluated many times with different df and local.
+        parameters are names of lambda arguments which are passed to the expression by position.
+        """
+        with self.snapshot() as settings:
+            key = (command, parameters, settings.key())
+            compiled = self.cache.get(key)
+            if compiled is None and self.disk_cache is not None:
+                compiled = self.disk_cache.get(command, parameters, settings)
+            if compiled is None:
+                stack = self.preprocessor.prepare(command, None, None)
+                program = self.calculator.compile(stack, parameters)
+                compiled = CompiledExpression(self, command, program, parameters)
+                self.cache.put(key, compiled)
+                if self.disk_cache is not None:
+                    self.disk_cache.put(compiled, settings)
+            return compiled
+
+    def dumps(self, compiled: Union[CompiledExpression, Iterable[CompiledExpression]],
+              binary: bool = False) -> Union[str, bytes]:
+        """
+        Returns JSON (or compressed bytes if binary) of compiled expression or list of them,
+        they can be stored with commands and loaded without parsing
+        """
+        return self.serializer.dumps(compiled, binary)
+
+    def loads(self, data: Union[str, bytes]) -> Union[CompiledExpression, list]:
+        """
+        Returns compiled expressions from result of dumps and puts them to the cache
+        """
+        return self.serializer.loads(data)
+
+    def solve(self, command: str, df: Optional[pd.DataFrame] = None, local: dict = None,
+              limits: Optional[Limits] = None):
+        with self.snapshot(limits=limits):
+            compiled = self.compile(command)
+            if self.backend is not None and self.backend.accepts(df):
+                return self.backend.solve(compiled, df, local)
+            if self.parallel is not None:
+                return self.parallel.solve(compiled, df, local)
+            output = self.calculator.execute(compiled.program, df, local)
+            return output
+
+    def profile(self, command: str, df: Optional[pd.DataFrame] = None, local: dict = None) -> ProfileNode:
+        """
+        Calculates command in the current process and returns tree of its parts
+        with calls count, time, type and shape of results, see ProfileNode.
+        Children of the root are tokenization, compilation and evaluation of command.
+        """
+        profiler = Profiler(self.calculator)
+        with self.snapshot(hooks=(profiler,)):
+            start = perf_counter()
+            stack = self.preprocessor.prepare(command, None, None)
+            tokenized = perf_counter()
+            program = self.calculator.compile(stack)
+            compiled = perf_counter()
+            output = self.calculator.execute(program, df, local)
+            finished = perf_counter()
+
+        steps = [
+            ProfileNode('tokenize', 1, tokenized - start, tokenized - start, type(stack).__name__, (len(stack),)),
+            ProfileNode('compile', 1, compiled - tokenized, compiled - tokenized, type(program).__name__,
+                        (len(program),)),
+        ]
+        children = profiler.tree()
+        elapsed = finished - compiled
+        steps.append(ProfileNode(
+            'evaluate', 1, elapsed, max(elapsed - sum(child.time for child in children), 0.0),
+            type(output).__name__, getattr(output, 'shape', None), Budget.size(output), children,
+        ))
+        return ProfileNode(command, 1, finished - start, 0.0, steps[-1].output_type, steps[-1].shape,
+                           steps[-1].bytes, steps)
+
+    def compile_many(self, commands: Iterable[str]) -> CompiledBatch:
+        """
+        Compiles commands into one program, equal parts of different commands are calculated once
+        """
+        commands = tuple(commands)
+        with self.snapshot() as settings:
+            key = (commands, None, settings.key())
+            compiled = self.cache.get(key)
+            if compiled is None:
+                program = self.calculator.compile_many([self.compile(command).program for command in commands])
+                compiled = CompiledBatch(self, commands, program)
+                self.cache.put(key, compiled)
+            return compiled
+
+    def solve_many(self, commands: Union[Iterable[str], dict], df: Optional[pd.DataFrame] = None, local: dict = None,
+                   as_frame: bool = False, limits: Optional[Limits] = None) -> Union[dict, pd.DataFrame]:
+        """
+        Returns dict {command: result} or {name: result} if commands is dict {name: command}.
+        If as_frame results are returned as columns of new DataFrame.
+        """
+        if isinstance(commands, dict):
+            names, commands = list(commands.keys()), list(commands.values())
+        else:
+            names = commands = list(commands)
+        with self.snapshot(limits=limits):
+            output = dict(zip(names, self.compile_many(commands).evaluate(df, local)))
+        if as_frame:
+            return pd.DataFrame(output, index=None if df is None else df.index)
         return output
+
+    def solve_stream(self, command: Union[str, CompiledExpression], chunks: Iterable[pd.DataFrame],
+                     local: dict = None):
+        """
+        Calculates row-wise command over chunks of DataFrame, e.g. pd.read_csv(path, chunksize=...).
+        Returns generator of results for every chunk.
+        Variables which are arrays (Series, ndarray) have value for every row of all chunks.
+        """
+        with self.snapshot():
+            compiled = self.compile(command) if isinstance(command, str) else command
+            return self.calculator.stream(compiled, chunks, local)
+
+    def reduce_stream(self, command: Union[str, CompiledExpression], chunks: Iterable[pd.DataFrame],
+                      local: dict = None):
+        """
+        Calculates command using sum, mean, min, max, count of row-wise values over chunks of DataFrame.
+        Returns the result combined from every chunk.
+        """
+        with self.snapshot():
+            compiled = self.compile(command) if isinstance(command, str) else command
+            return self.calculator.reduce_stream(compiled, chunks, local)
+
+    def filter(self, command: Union[str, CompiledExpression], df: pd.DataFrame, local: dict = None,
+               as_index: bool = False, masks: Optional[dict] = None, limits: Optional[Limits] = None):
+        """
+        Returns rows of df satisfying boolean command (their index if as_index), same as df[solve(command, df)].
+        Operands of & and | are calculated only for rows which are not decided by previous ones,
+        cheap and selective operands are calculated first, see Filter.
+        masks is dict shared by filters of the same df and local, predicates used by several filters are
+        calculated once.
+        """
+        with self.snapshot(limits=limits):
+            compiled = self.compile(command) if isinstance(command, str) else command
+            positions = self.filtering.positions(compiled, df, local, masks)
+        return df.index[positions] if as_index else df.take(positions)
+
+    def filter_many(self, commands: Union[Iterable[str], dict], df: pd.DataFrame, local: dict = None,
+                    as_index: bool = False, limits: Optional[Limits] = None) -> dict:
+        """
+        Returns dict {command: rows} or {name: rows} if commands is dict {name: command},
+        masks of predicates are shared by all commands
+        """
+        if isinstance(commands, dict):
+            names, commands = list(commands.keys()), list(commands.values())
+        else:
+            names = commands = list(commands)
+        masks = {}
+        return {name: self.filter(command, df, local, as_index, masks, limits) for name, command in zip(names, commands)}
+
+    def session(self, df: pd.DataFrame, commands: Union[Iterable[str], dict] = (), local: dict = None) -> Session:
+        """
+        Returns Session keeping results of commands for df.
+        After rows are appended or columns are changed only results depending on them are calculated again.
+        """
+        return Session(self, df, commands, local)
+
+    def read(self, source, commands: Union[str, CompiledExpression, Iterable[Union[str, CompiledExpression]]]
+             ) -> pd.DataFrame:
+        """
+        Returns DataFrame of columns used by commands.
+        source is path of Parquet or Feather/Arrow file, pyarrow Table, DataFrame or ColumnSource,
+        only referenced columns are read, all of them if some command uses ${__df}.
+        """
+        if isinstance(commands, (str, CompiledExpression)):
+            commands = [commands]
+        columns = {}
+        for command in commands:
+            compiled = self.compile(command) if isinstance(command, str) else command
+            if compiled.uses_df:
+                return open_source(source).read()
+            columns.update(dict.fromkeys(compiled.columns))
+        return open_source(source).read(list(columns))
+
+    def solve_source(self, command: Union[str, CompiledExpression], source: Union[str, ColumnSource],
+                     local: dict = None, limits: Optional[Limits] = None):
+        """
+        Reads only columns used by command from source (see read) and returns its result
+        """
+        with self.snapshot(limits=limits):
+            compiled = self.compile(command) if isinstance(command, str) else command
+            df = self.read(source, compiled)
+            if self.parallel is not None and not isinstance(compiled, CompiledBatch):
+                return self.parallel.solve(compiled, df, local)
+            return compiled.evaluate(df, local)
+
+    def solve_arrow(self, command: Union[str, CompiledExpression], table, local: dict = None,
+                    limits: Optional[Limits] = None):
+        """
+        Returns result of command for pyarrow Table or RecordBatch, columns are not converted to pandas.
+        Array-like results are Arrow arrays (ChunkedArray for Table), scalars are python objects.
+        Operators and simple methods are calculated by Arrow compute kernels, see ArrowColumn.
+        """
+        if not is_arrow_table(table):
+            raise Exception(('Expected pyarrow Table or RecordBatch, got {type}').format(type=type(table).__name__))
+        if local:
+            local = {name: ArrowColumn.wrap(value) if ArrowColumn.is_array(value) else value
+                     for name, value in local.items()}
+        with self.snapshot(limits=limits):
+            compiled = self.compile(command) if isinstance(command, str) else command
+            output = self.calculator.execute(compiled.program, ArrowFrame(table), local)
+            return to_arrow(output, chunked=isinstance(table, pyarrow.Table))
@@ -0,0 +1,248 @@
+from time import perf_counter
+from typing import Optional
+from weakref import WeakKeyDictionary
+
+import numpy as np
+import pandas as pd
+
+from safe_evaluation.compilation import CompiledExpression
+from safe_evaluation.constants import TypeOfCommand
+from safe_evaluation.streaming import ROWS, SCALAR
+
+
+class Predicate:
+    """
+    Part of filter which isn't combined by & | ~, e.g. ${age} > 30.
+    Row-wise predicates are calculated only for rows which can still change the result.
+    """
+
+    __slots__ = ('compiled', 'key', 'row_wise', 'columns', 'uses_df', 'selectivity', 'cost')
+
+    def __init__(self, compiled: CompiledExpression, key: str, row_wise: bool, selectivity: float, cost: float):
+        self.compiled = compiled
+        self.key = key
+        self.row_wise = row_wise
+        self.columns = compiled.columns
+        self.uses_df = compiled.uses_df
+        self.selectivity = selectivity
+        self.cost = cost
+
+
+class Junction:
+    """
+    Predicates combined by & or | (operation), or negated predicate if operation is ~
+    """
+
+    __slots__ = ('operation', 'children', 'key')
+
+    def __init__(self, operation: str, children: list, key: str):
+        self.operation = operation
+        self.children = children
+        self.key = key
+
+
+class Filter:
+    """
+    Selects rows of DataFrame satisfying boolean command.
+    Operands of & and | are calculated one by one, each only for rows which are not decided yet:
+    operands which are cheap and reject (for &) or accept (for |) most rows go first.
+    Order is estimated by operators of predicates and then by measured share of passed rows and time per row.
+    Masks of predicates can be kept in dict shared by filters of the same DataFrame.
+    """
+
+    # share of rows passing predicate with the operator at its root
+    selectivities = {'==': 0.1, 'isin': 0.2, 'between': 0.3, 'contains': 0.3, 'startswith': 0.2,
+                     'endswith': 0.2, '<': 0.4, '<=': 0.4, '>': 0.4, '>=': 0.4, '!=': 0.9}
+    # cost of calculation of element comparing to operator, string methods are much slower
+    costs = {'str': 20, 'apply': 100, 'map': 50, TypeOfCommand.FUNCTION_EXECUTABLE: 5}
+    # operands are calculated for selected rows if share of undecided rows is less
+    dense = 0.3
+    # statistics are forgotten when there are more predicates
+    statistics_size = 10_000
+
+    def __init__(self, evaluator):
+        self.evaluator = evaluator
+        self._plans = WeakKeyDictionary()
+        # key of predicate -> [calculated rows, passed rows, time]
+        self.statistics = {}
+
+    def _estimate(self, program) -> tuple:
+        """
+        Returns guessed selectivity and cost of predicate
+        """
+        root = program[-1]
+        name = root if isinstance(root, str) else root[1] if root[0] == TypeOfCommand.METHOD else None
+        cost = 0
+        for element in program:
+            if isinstance(element, str):
+                cost += 1
+            else:
+                cost += self.costs.get(element[0], 0) + (self.costs.get(element[1], 1)
+                                                           if element[0] in (TypeOfCommand.METHOD,
+                                                                             TypeOfCommand.PROPERTY) else 0)
+        return self.selectivities.get(name, 0.5), max(cost, 1)
+
+    def _predicate(self, program, key: str) -> Predicate:
+        calculator = self.evaluator.calculator
+        fusion = self.evaluator.fusion
+        fused = program if fusion is None else fusion.fuse(program)
+        compiled = CompiledExpression(self.evaluator, key, calculator._share(fused))
+        streamer = getattr(calculator, 'streamer', None)
+        row_wise = streamer is not None and streamer.kind(compiled) in (ROWS, SCALAR)
+        return Predicate(compiled, key, row_wise, *self._estimate(program))
+
+    def _build(self, compiled) -> object:
+        """
+        Returns tree of Junction and Predicate of compiled command.
+        Tree is built from operators of kernels, predicates are fused again.
+        """
+        calculator = self.evaluator.calculator
+        program = calculator._unfuse(calculator._unshare(compiled.program))
+        names = {}
+        calculator._source(program, (), names=names)
+        # (start of subtree, Junction or None if the subtree is part of predicate)
+        stack = []
+        for position, element in enumerate(program):
+            arity = calculator._arity(element)
+            children = stack[len(stack) - arity:]
+            del stack[len(stack) - arity:]
+            start = children[0][0] if children else position
+            if isinstance(element, str) and element in ('&', '|', '~'):
+                nodes = []
+                for child_start, child, end in children:
+                    if child is None:
+                        child = self._predicate(program[child_start:end], names[end - 1])
+                    if isinstance(child, Junction) and child.operation == element != '~':
+                        nodes.extend(child.children)
+                    else:
+                        nodes.append(child)
+                stack.append((start, Junction(element, nodes, names[position]), position + 1))
+            else:
+                stack.append((start, None, position + 1))
+        start, node, end = stack.pop()
+        return node if node is not None else self._predicate(program[start:end], names[end - 1])
+
+    def plan(self, compiled):
+        if compiled not in self._plans:
+            self._plans[compiled] = self._build(compiled)
+        return self._plans[compiled]
+
+    def _rank(self, node, operation: str) -> float:
+        """
+        Returns rank of operand of & or |, operands with lower ranks are calculated first
+        """
+        selectivity, cost = self._estimated(node)
+        # share of rows decided by the operand
+        decided = 1 - selectivity if operation == '&' else selectivity
+        return cost / max(decided, 1e-3)
+
+    def _estimated(self, node) -> tuple:
+        if isinstance(node, Predicate):
+            statistics = self.statistics.get(node.key)
+            if statistics is not None and statistics[0]:
+                # measured time is in seconds, guessed cost is in operators of about 10ns per row
+                return statistics[1] / statistics[0], max(statistics[2] / statistics[0] * 1e8, 1e-3)
+            return node.selectivity, node.cost
+        estimates = [self._estimated(child) for child in node.children]
+        if node.operation == '~':
+            return 1 - estimates[0][0], estimates[0][1]
+        cost = sum(cost for _, cost in estimates)
+        if node.operation == '&':
+            return float(np.prod([selectivity for selectivity, _ in estimates])), cost
+        return 1 - float(np.prod([1 - selectivity for selectivity, _ in estimates])), cost
+
+    def _mask(self, value, length: int, predicate: Predicate) -> np.ndarray:
+        if isinstance(value, (bool, np.bool_)):
+            return np.full(length, bool(value))
+        if isinstance(value, pd.Series) and value.dtype == 'boolean':
+            value = value.to_numpy(dtype=bool, na_value=False)
+        elif isinstance(value, pd.Series) and value.dtype == bool:
+            value = value.to_numpy()
+        if not isinstance(value, np.ndarray) or value.dtype != bool or value.shape != (length,):
+            raise Exception(('Filter "{command}" must give boolean value for every row, got {type}')
+                            .format(command=predicate.key, type=getattr(value, 'dtype', type(value).__name__)))
+        return value
+
+    def _calculate(self, predicate: Predicate, df, local, rows: Optional[np.ndarray]) -> np.ndarray:
+        """
+        Returns values of predicate for positions of rows (all rows if rows is None)
+        """
+        start = perf_counter()
+        subset = rows is not None and predicate.row_wise
+        if subset:
+            streamer = self.evaluator.calculator.streamer
+            names = streamer.array_variables(predicate.compiled, local)
+            # variables which are arrays are taken for the same rows, unless pandas aligns them by labels
+            subset = streamer.is_aligned(local, names, df)
+        if subset:
+            # only used columns of undecided rows are copied
+            frame = df if predicate.uses_df else df[[column for column in predicate.columns if column in df.columns]]
+            frame = frame.take(rows)
+            local = streamer.chunk_local(local, names, rows)
+        else:
+            frame = df
+        value = self.evaluator.calculator.execute(predicate.compiled.program, frame, local)
+        mask = self._mask(value, len(frame), predicate)
+        if rows is not None and not subset:
+            mask = mask[rows]
+        statistics = self.statistics.get(predicate.key)
+        if statistics is None:
+            if len(self.statistics) >= self.statistics_size:
+                self.statistics.clear()
+            statistics = self.statistics[predicate.key] = [0, 0, 0.0]
+        statistics[0] += len(mask)
+        statistics[1] += int(np.count_nonzero(mask))
+        statistics[2] += perf_counter() - start
+        return mask
+
+    def _evaluate(self, node, df, local, rows: Optional[np.ndarray], masks: Optional[dict]) -> np.ndarray:
+        """
+        Returns values of node for positions of rows (all rows if rows is None),
+        masks are {key: (values, whether value is known)}
+        """
+        if masks is None:
+            return self._calculate_node(node, df, local, rows, masks)
+        if node.key not in masks:
+            masks[node.key] = (np.zeros(len(df), dtype=bool), np.zeros(len(df), dtype=bool))
+        values, known = masks[node.key]
+        unknown = np.flatnonzero(~known) if rows is None else rows[~known[rows]]
+        if len(unknown) == len(df):
+            values[:] = self._calculate_node(node, df, local, None, masks)
+            known[:] = True
+        elif len(unknown):
+            values[unknown] = self._calculate_node(node, df, local, unknown, masks)
+            known[unknown] = True
+        return values if rows is None else values[rows]
+
+    def _calculate_node(self, node, df, local, rows: Optional[np.ndarray], masks: Optional[dict]) -> np.ndarray:
+        if isinstance(node, Predicate):
+            return self._calculate(node, df, local, rows)
+        if node.operation == '~':
+            return ~self._evaluate(node.children[0], df, local, rows, masks)
+        is_and = node.operation == '&'
+        children = sorted(node.children, key=lambda child: self._rank(child, node.operation))
+        result = self._evaluate(children[0], df, local, rows, masks).copy()
+        for child in children[1:]:
+            # rows which can still become false for & or true for |
+            undecided = result if is_and else ~result
+            count = np.count_nonzero(undecided)
+            if not count:
+                break
+            if count > len(result) * self.dense:
+                # selecting rows costs more than calculating all of them
+                mask = self._evaluate(child, df, local, rows, masks)
+                result = result & mask if is_and else result | mask
+                continue
+            positions = np.flatnonzero(undecided)
+            mask = self._evaluate(child, df, local, positions if rows is None else rows[positions], masks)
+            if is_and:
+                result[positions[~mask]] = False
+            else:
+                result[positions[mask]] = True
+        return result
+
+    def positions(self, compiled, df: pd.DataFrame, local: dict = None, masks: Optional[dict] = None) -> np.ndarray:
+        """
+        Returns positions of rows of df satisfying compiled command
+        """
+        return np.flatnonzero(self._evaluate(self.plan(compiled), df, local, None, masks))
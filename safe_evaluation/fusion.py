@@ -0,0 +1,269 @@
+from numbers import Integral, Real
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from safe_evaluation.constants import TypeOfCommand
+
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
+ARITHMETIC = {'+', '-', '*', '/', '**'}
+COMPARISONS = {'<', '<=', '>', '>=', '==', '!='}
+LOGICAL = {'&', '|', '~'}
+
+
+class Kernel:
+    """
+    Operators of a part of command calculated at once.
+    program is postfix code where (ARGUMENT, slot) are operands taken from the stack
+    and (VALUE, number) are constants.
+    """
+
+    __slots__ = ('program', 'arity', 'parameters', 'expression', 'has_negative_power')
+
+    def __init__(self, program: tuple):
+        self.program = program
+        self.arity = sum(1 for element in program if not isinstance(element, str) and
+                         element[0] == TypeOfCommand.ARGUMENT)
+        self.parameters = tuple(f'_{slot}' for slot in range(self.arity))
+        self.has_negative_power = self._has_negative_power()
+        self.expression = self._expression()
+
+    def _has_negative_power(self) -> bool:
+        """
+        Returns whether exponent of some power isn't non-negative constant
+        """
+        # whether the value on the stack is non-negative constant
+        stack = []
+        for element in self.program:
+            if element == '~':
+                stack[-1] = False
+            elif isinstance(element, str):
+                exponent = stack.pop()
+                if element == '**' and not exponent:
+                    return True
+                stack[-1] = False
+            else:
+                stack.append(element[0] == TypeOfCommand.VALUE and element[1] >= 0)
+        return False
+
+    def _name(self, position: int, element) -> str:
+        if element[0] == TypeOfCommand.ARGUMENT:
+            return f'x{element[1]}'
+        return f'c{position}'
+
+    def _expression(self) -> str:
+        """
+        Returns numexpr expression, operands are named x<slot>, constants c<position>
+        """
+        stack = []
+        for position, element in enumerate(self.program):
+            if element == '~':
+                stack.append(f'(~{stack.pop()})')
+            elif isinstance(element, str):
+                r = stack.pop()
+                stack.append(f'({stack.pop()} {element} {r})')
+            else:
+                stack.append(self._name(position, element))
+        return stack.pop()
+
+    def values(self, operands) -> dict:
+        """
+        Returns operands and constants by their names in expression
+        """
+        values = {}
+        for position, element in enumerate(self.program):
+            if isinstance(element, str):
+                continue
+            if element[0] == TypeOfCommand.ARGUMENT:
+                values[f'x{element[1]}'] = operands[element[1]]
+            else:
+                values[f'c{position}'] = np.int64(element[1]) if isinstance(element[1], int) else np.float64(element[1])
+        return values
+
+    def __eq__(self, other):
+        return isinstance(other, Kernel) and repr(self.program) == repr(other.program)
+
+    def __hash__(self):
+        return hash(repr(self.program))
+
+    def __repr__(self):
+        return f'Kernel({self.program!r})'
+
+
+class Fuser:
+    """
+    Calculates arithmetic, comparisons and logical operators over numeric columns at once.
+    Parts of command consisting only of these operators are replaced by kernels on compilation.
+    Kernel is calculated by numexpr if it is installed (multi-threaded, without full-length temporaries),
+    otherwise by numpy over blocks of rows. Result is wrapped into Series with the index of operands once.
+    Kernel is calculated by pandas operators as usual if operands aren't float64/int64 Series with equal indexes
+    and numbers, or there are less than min_rows rows.
+    """
+
+    block = 64 * 1024
+    int_bound = 2 ** 63
+
+    def __init__(self, evaluator, min_rows: int = 100_000, use_numexpr: bool = True):
+        self.evaluator = evaluator
+        self.min_rows = min_rows
+        self.use_numexpr = use_numexpr and numexpr is not None
+
+    def _is_constant(self, element) -> bool:
+        return not isinstance(element, str) and element[0] == TypeOfCommand.VALUE and \
+            isinstance(element[1], (int, float)) and not isinstance(element[1], bool) and \
+            (not isinstance(element[1], int) or abs(element[1]) < self.int_bound)
+
+    def _is_operand(self, element) -> bool:
+        """
+        Returns whether element can give column, operands which are always scalars aren't worth fusing
+        """
+        return not isinstance(element, str) and element[0] not in (
+            TypeOfCommand.VALUE, TypeOfCommand.VARIABLE, TypeOfCommand.ARGUMENT, TypeOfCommand.FUNCTION)
+
+    def fuse(self, program: tuple) -> tuple:
+        """
+        Returns program where parts of at least two fusible operators are replaced by (KERNEL, kernel)
+        """
+        calculator = self.evaluator.calculator
+        # start of subtree, parent and whether the element is fusible operator giving bool
+        starts, parents, is_bool = [], [None] * len(program), [False] * len(program)
+        fusible = [False] * len(program)
+        stack = []
+        for position, element in enumerate(program):
+            arity = calculator._arity(element)
+            children = stack[len(stack) - arity:]
+            del stack[len(stack) - arity:]
+            for child in children:
+                parents[child] = position
+            starts.append(starts[children[0]] if children else position)
+            if not isinstance(element, str):
+                pass
+            elif element in ARITHMETIC:
+                fusible[position] = True
+            elif element in COMPARISONS:
+                fusible[position] = is_bool[position] = True
+            elif element in LOGICAL:
+                # numexpr supports only logical operators of bools
+                fusible[position] = is_bool[position] = all(is_bool[child] for child in children)
+            stack.append(position)
+
+        # root of region of fusible operators for every its operator
+        roots = [None] * len(program)
+        for position in range(len(program) - 1, -1, -1):
+            if fusible[position]:
+                parent = parents[position]
+                roots[position] = roots[parent] if parent is not None and fusible[parent] else position
+
+        kernels = {}
+        for root in set(root for root in roots if root is not None):
+            operators = [position for position in range(starts[root], root + 1) if roots[position] == root]
+            leaves = [position for position in range(starts[root], root + 1)
+                      if not fusible[position] and parents[position] is not None and roots[parents[position]] == root]
+            if len(operators) < 2 or not any(self._is_operand(program[leaf]) for leaf in leaves):
+                for position in operators:
+                    roots[position] = None
+                continue
+            code = []
+            slot = 0
+            for position in sorted(operators + leaves):
+                if fusible[position]:
+                    code.append(program[position])
+                elif self._is_constant(program[position]):
+                    code.append(program[position])
+                else:
+                    code.append((TypeOfCommand.ARGUMENT, slot))
+                    slot += 1
+            kernels[root] = Kernel(tuple(code))
+
+        output = []
+        for position, element in enumerate(program):
+            parent = parents[position]
+            if position in kernels:
+                output.append((TypeOfCommand.KERNEL, kernels[position]))
+            elif roots[position] is not None:
+                continue
+            elif parent is not None and roots[parent] is not None and self._is_constant(element):
+                continue
+            else:
+                output.append(element)
+        return tuple(output)
+
+    def _prepare(self, operands: list):
+        """
+        Returns (numpy arrays and numbers, index, name) or None if kernel has to be calculated by pandas
+        """
+        index = None
+        names = set()
+        values = []
+        for operand in operands:
+            if isinstance(operand, pd.Series):
+                if operand.dtype not in (np.float64, np.int64):
+                    return None
+                if index is None:
+                    index = operand.index
+                elif operand.index is not index and not operand.index.equals(index):
+                    return None
+                names.add(operand.name)
+                values.append(operand.to_numpy())
+            elif isinstance(operand, (Integral, Real)) and not isinstance(operand, (bool, np.bool_)):
+                if isinstance(operand, Integral) and abs(int(operand)) >= self.int_bound:
+                    return None
+                values.append(np.int64(operand) if isinstance(operand, Integral) else np.float64(operand))
+            else:
+                return None
+        if index is None or len(index) < self.min_rows:
+            return None
+        # pandas keeps name only if it is the same for all operands
+        return values, index, names.pop() if len(names) == 1 else None
+
+    def _calculate(self, program, values):
+        operators = self.evaluator.operators
+        stack = []
+        for element in program:
+            if element == '~':
+                stack.append(operators[element](stack.pop()))
+            elif isinstance(element, str):
+                r = stack.pop()
+                stack.append(operators[element](stack.pop(), r))
+            elif element[0] == TypeOfCommand.ARGUMENT:
+                stack.append(values[element[1]])
+            else:
+                stack.append(element[1])
+        return stack.pop()
+
+    def _calculate_blocks(self, kernel: Kernel, values: list, length: int) -> np.ndarray:
+        """
+        Calculates kernel by numpy over blocks of rows, so temporary arrays stay in cache
+        """
+        output = None
+        with np.errstate(all='ignore'):
+            for start in range(0, length, self.block):
+                stop = min(start + self.block, length)
+                block = [value[start:stop] if isinstance(value, np.ndarray) else value for value in values]
+                result = self._calculate(kernel.program, block)
+                if output is None:
+                    output = np.empty(length, dtype=result.dtype)
+                output[start:stop] = result
+        return output
+
+    def execute(self, kernel: Kernel, operands: list) -> Optional[pd.Series]:
+        """
+        Returns result of kernel or None if it has to be calculated by pandas operators
+        """
+        prepared = self._prepare(operands)
+        if prepared is None:
+            return None
+        values, index, name = prepared
+        if kernel.has_negative_power and any(value.dtype.kind == 'i' for value in values):
+            # negative integer powers of integers raise errors in pandas
+            return None
+        if self.use_numexpr:
+            result = numexpr.evaluate(kernel.expression, local_dict=kernel.values(values))
+        else:
+            result = self._calculate_blocks(kernel, values, len(index))
+        return pd.Series(result, index=index, name=name, copy=False)
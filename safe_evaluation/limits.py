@@ -0,0 +1,164 @@
+import math
+import sys
+import time
+from numbers import Integral
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from safe_evaluation.arrow import ArrowColumn
+
+
+class LimitExceeded(Exception):
+    """
+    Calculation exceeded limits of the call
+    """
+
+
+class Limits:
+    def __init__(
+            self, *,
+            time: Optional[float] = None,
+            operations: Optional[int] = None,
+            lambda_calls: Optional[int] = None,
+            result_size: Optional[int] = None
+    ):
+        """
+        time is wall time of the call in seconds,
+        operations is amount of calculated elements of command including bodies of lambda functions,
+        lambda_calls is amount of calls of lambda functions,
+        result_size is estimated size of any intermediate result in bytes.
+        """
+        self.time = time
+        self.operations = operations
+        self.lambda_calls = lambda_calls
+        self.result_size = result_size
+
+
+class Budget:
+    """
+    Resources left for the current call, they are checked cooperatively during calculation
+    """
+
+    __slots__ = ('limits', 'deadline', 'operations', 'lambda_calls')
+
+    # bytes of element in estimations of python containers
+    item_size = 8
+
+    def __init__(self, limits: Limits):
+        self.limits = limits
+        self.deadline = None if limits.time is None else time.monotonic() + limits.time
+        self.operations = limits.operations
+        self.lambda_calls = limits.lambda_calls
+
+    def remaining(self) -> Limits:
+        """
+        Returns limits of resources left, e.g. for calculation in other process
+        """
+        return Limits(
+            time=None if self.deadline is None else max(self.deadline - time.monotonic(), 0.0),
+            operations=self.operations,
+            lambda_calls=self.lambda_calls,
+            result_size=self.limits.result_size,
+        )
+
+    def spend(self, operations: int = 0, lambda_calls: int = 0):
+        """
+        Takes resources spent by calculation in other process
+        """
+        if self.operations is not None:
+            self.operations -= operations
+            if self.operations < 0:
+                self._raise('Operations', self.limits.operations)
+        if self.lambda_calls is not None:
+            self.lambda_calls -= lambda_calls
+            if self.lambda_calls < 0:
+                self._raise('Lambda calls', self.limits.lambda_calls)
+        self._check_time()
+
+    def _raise(self, limit, value):
+        raise LimitExceeded(('{limit} limit {value} exceeded').format(limit=limit, value=value))
+
+    def _check_time(self):
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            self._raise('Time', f'{self.limits.time}s')
+
+    @staticmethod
+    def size(value) -> int:
+        """
+        Returns estimated size of value in bytes
+        """
+        if isinstance(value, (np.ndarray, pd.Series, pd.Index, ArrowColumn)):
+            return value.nbytes
+        if isinstance(value, pd.DataFrame):
+            return int(value.memory_usage(index=False).sum())
+        if isinstance(value, (list, tuple, dict, set, frozenset, str, bytes, int)):
+            return sys.getsizeof(value)
+        return 0
+
+    def _check_estimation(self, size):
+        if self.limits.result_size is not None and size > self.limits.result_size:
+            self._raise('Result size', f'{self.limits.result_size} bytes')
+
+    def step(self, value):
+        """
+        Called after every calculated element of command with its result
+        """
+        if self.operations is not None:
+            self.operations -= 1
+            if self.operations < 0:
+                self._raise('Operations', self.limits.operations)
+        self._check_time()
+        if self.limits.result_size is not None:
+            self._check_estimation(self.size(value))
+
+    def call_lambda(self):
+        """
+        Called before every call of lambda function
+        """
+        if self.lambda_calls is not None:
+            self.lambda_calls -= 1
+            if self.lambda_calls < 0:
+                self._raise('Lambda calls', self.limits.lambda_calls)
+        self._check_time()
+
+    def _length(self, value):
+        try:
+            return len(value)
+        except Exception:
+            return 0
+
+    def check_operation(self, op, l, r):
+        """
+        Raises LimitExceeded before operation whose result would be too big
+        """
+        if self.limits.result_size is None:
+            return
+        if op == '*' and isinstance(l, Integral) and isinstance(r, (list, tuple, str, bytes)):
+            l, r = r, l
+        if op == '*' and isinstance(l, (list, tuple, str, bytes)) and isinstance(r, Integral):
+            self._check_estimation(len(l) * max(int(r), 0) * self.item_size)
+        elif op == '+' and isinstance(l, (list, tuple, str, bytes)) and isinstance(r, (list, tuple, str, bytes)):
+            self._check_estimation((len(l) + len(r)) * self.item_size)
+        elif op == '**' and isinstance(l, Integral) and isinstance(r, Integral) and abs(l) > 1 and r > 0:
+            # bits of the result
+            self._check_estimation(int(r) * math.log2(abs(int(l))) / 8)
+
+    def check_call(self, function, args, kwargs):
+        """
+        Raises LimitExceeded before function call whose result would be too big
+        """
+        if self.limits.result_size is None:
+            return
+        if function in (list, tuple, set, sorted) and len(args) == 1:
+            self._check_estimation(self._length(args[0]) * self.item_size)
+        elif function in (np.zeros, np.ones, np.empty, np.full) and args:
+            shape = args[0] if isinstance(args[0], (tuple, list)) else (args[0],)
+            if all(isinstance(dimension, Integral) for dimension in shape):
+                self._check_estimation(int(np.prod([max(int(x), 0) for x in shape], dtype=float)) * self.item_size)
+        elif function is np.arange and args and all(isinstance(arg, (int, float)) for arg in args[:3]):
+            start, stop = (0, args[0]) if len(args) == 1 else args[:2]
+            step = args[2] if len(args) > 2 else 1
+            if step:
+                self._check_estimation(max((stop - start) / step, 0) * self.item_size)
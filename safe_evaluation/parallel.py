@@ -0,0 +1,223 @@
+import os
+import pickle
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from safe_evaluation.settings import Settings
+from safe_evaluation.streaming import ROWS, REDUCED
+
+# evaluators and attached shared memory blocks of the worker process
+_evaluators = {}
+_blocks = {}
+
+
+def _get_evaluator(evaluator_class, preprocessor, calculator, settings_key):
+    key = (evaluator_class, preprocessor, calculator, settings_key)
+    if key not in _evaluators:
+        evaluator = evaluator_class(preprocessor, calculator)
+        evaluator.change_settings(Settings(
+            numpy_allowed_funcs=list(settings_key[0]),
+            allowed_funcs=list(settings_key[1]),
+            forbidden_funcs=list(settings_key[2]),
+            df_startswith=settings_key[3],
+            df_regex=settings_key[4],
+            df_name=settings_key[5],
+        ))
+        _evaluators[key] = evaluator
+    return _evaluators[key]
+
+
+def _attach(name):
+    if name not in _blocks:
+        # workers share resource tracker with the process which creates and unlinks the blocks
+        _blocks[name] = shared_memory.SharedMemory(name=name)
+    return _blocks[name]
+
+
+def _release(names):
+    """
+    Closes blocks of previous calls, blocks still used by arrays are closed later
+    """
+    for name in list(_blocks):
+        if name not in names:
+            try:
+                _blocks[name].close()
+            except BufferError:
+                continue
+            del _blocks[name]
+
+
+def _spent(limits, budget) -> tuple:
+    """
+    Returns operations and lambda calls spent from limits
+    """
+    if budget is None:
+        return 0, 0
+    operations = 0 if limits.operations is None else limits.operations - budget.operations
+    lambda_calls = 0 if limits.lambda_calls is None else limits.lambda_calls - budget.lambda_calls
+    return operations, lambda_calls
+
+
+def _evaluate_partition(evaluator_key, command, columns, others, index, start, stop, local, reduce, limits):
+    """
+    Returns result of command or its reductions for rows [start, stop) of DataFrame
+    and operations and lambda calls spent from limits.
+    Numeric columns are read from shared memory, the others are passed as DataFrame.
+    """
+    names = {block for _, block, _ in columns if block is not None}
+    _release(names)
+    data = {}
+    for column, block, dtype in columns:
+        if block is None:
+            data[column] = others[column]
+        else:
+            values = np.ndarray((stop,), dtype=dtype, buffer=_attach(block).buf)
+            data[column] = pd.Series(values[start:stop], index=index, name=column, copy=False)
+    df = pd.DataFrame(data, index=index, copy=False)
+
+    evaluator = _get_evaluator(*evaluator_key)
+    compiled = evaluator.compile(command)
+    with evaluator.snapshot(limits=limits):
+        if reduce:
+            result = evaluator.calculator.streamer.partials(compiled, df, local)
+        else:
+            result = evaluator.calculator.execute(compiled.program, df, local)
+        spent = _spent(limits, evaluator.current_budget())
+    if isinstance(result, (pd.Series, pd.DataFrame)):
+        # result must not refer to shared memory after the call
+        result = result.copy()
+    return result, spent
+
+
+class ParallelExecutor:
+    """
+    Calculates row-wise commands and reductions (sum, mean, min, max, count) over row partitions
+    of DataFrame in worker processes. Workers are started once and keep compiled commands in their caches,
+    numeric columns are passed through shared memory.
+    Commands which need all rows at once (shift, rolling, etc.) are calculated in the current process.
+    """
+
+    def __init__(self, evaluator, workers: Optional[int] = None, min_rows: int = 100_000):
+        self.evaluator = evaluator
+        self.workers = workers or os.cpu_count()
+        self.min_rows = min_rows
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def _kind(self, compiled, df, local):
+        """
+        Returns kind of command if it is worth calculating in parallel, otherwise None
+        """
+        streamer = getattr(self.evaluator.calculator, 'streamer', None)
+        if streamer is None or not isinstance(df, pd.DataFrame) or len(df) < max(self.min_rows, 2):
+            return None
+        if self.evaluator.current_hooks():
+            # hooks are called for every element in the current process
+            return None
+        kind = streamer.kind(compiled)
+        if kind not in (ROWS, REDUCED) or (kind == ROWS and not streamer.keeps_rows(compiled)):
+            return None
+        if not streamer.is_aligned(local, streamer.array_variables(compiled, local), df):
+            # variables with other length or index are aligned with all rows by labels
+            return None
+        try:
+            pickle.dumps(local)
+        except Exception:
+            return None
+        return kind
+
+    def _columns(self, compiled, df):
+        """
+        Returns columns of df used by the command in the order of df
+        """
+        names, uses_df = self.evaluator.calculator.references(compiled.program)
+        if uses_df:
+            return list(df.columns)
+        return [column for column in df.columns if column in names]
+
+    def _share(self, df, columns, blocks):
+        """
+        Copies numeric columns to shared memory.
+        Returns list of (column, name of block or None, dtype)
+        """
+        specs = []
+        for column in columns:
+            series = df[column]
+            if isinstance(series.dtype, np.dtype) and series.dtype.kind in 'biufc':
+                values = series.to_numpy()
+                block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+                blocks.append(block)
+                np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[:] = values
+                specs.append((column, block.name, values.dtype.str))
+            else:
+                specs.append((column, None, None))
+        return specs
+
+    def _concat(self, results):
+        if all(isinstance(result, (pd.Series, pd.DataFrame)) for result in results):
+            return pd.concat(results)
+        if all(isinstance(result, np.ndarray) and result.ndim for result in results):
+            return np.concatenate(results)
+        return None
+
+    def solve(self, compiled, df: Optional[pd.DataFrame] = None, local: dict = None):
+        kind = self._kind(compiled, df, local)
+        if kind is None or not df.columns.is_unique:
+            return compiled.evaluate(df, local)
+
+        evaluator = self.evaluator
+        evaluator_key = (type(evaluator), type(evaluator.preprocessor), type(evaluator.calculator),
+                         evaluator.current_settings().key())
+        columns = self._columns(compiled, df)
+        streamer = evaluator.calculator.streamer
+        # variables which are arrays are split as rows
+        names = streamer.array_variables(compiled, local)
+        budget = evaluator.current_budget()
+        # every partition has resources left for the call, spent ones are taken after
+        limits = None if budget is None else budget.remaining()
+        bounds = np.linspace(0, len(df), min(self.workers, len(df)) + 1).astype(int)
+        blocks = []
+        try:
+            specs = self._share(df, columns, blocks)
+            others = [column for column, block, _ in specs if block is None]
+            futures = [
+                self.pool.submit(_evaluate_partition, evaluator_key, compiled.command, specs,
+                                 df[others].iloc[start:stop], df.index[start:stop], start, stop,
+                                 streamer.chunk_local(local, names, slice(start, stop)), kind == REDUCED, limits)
+                for start, stop in zip(bounds[:-1], bounds[1:])
+            ]
+            results, spent = zip(*[future.result() for future in futures])
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+        if budget is not None:
+            # every partition calculates all elements of the command once, lambda functions are called for its rows
+            budget.spend(max(operations for operations, _ in spent), sum(calls for _, calls in spent))
+        if kind == ROWS:
+            result = self._concat(results)
+            return compiled.evaluate(df, local) if result is None else result
+
+        totals = [None] * len(results[0])
+        for partials in results:
+            totals = streamer.combine(totals, partials)
+        return streamer.finish(compiled, totals, local)
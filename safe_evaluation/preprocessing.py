@@ -11,21 +11,45 @@ class Lambda:
     Class for handling parsed lambda functions
     """
 
-    def __init__(self, expression, df, command, variables, local):
+    def __init__(self, expression, df, command, variables, local, body=None):
         self.expression = expression
         self.df = df
         self.command = command
         self.local = local
         self.variables = variables
+        self._body = body
+
+    @property
+    def body(self):
+        """
+        Body is parsed once on the first call, arguments are passed to it by position
+        """
+        if self._body is None:
+            self._body = self.expression.compile(self.command, tuple(self.variables))
+        return self._body
+
+    def bind(self, df, local):
+        """
+        Returns the same lambda function bound to the input data
+        """
+        return Lambda(self.expression, df, self.command, self.variables, local or {}, self._body)
 
     def __call__(self, *values, **k_values):
         """
-        Recursively solves expression inside of lambda function
+        Solves compiled expression inside of lambda function
         """
-        keys = [x for x in self.variables if x not in k_values]
-        kwargs = dict(zip(keys, values)) | k_values | self.local
-        indices = self.expression.solve(self.command, self.df, kwargs)
-        return indices
+        if k_values:
+            keys = [x for x in self.variables if x not in k_values]
+            named = dict(zip(keys, values)) | k_values
+            values = tuple(named[x] for x in self.variables if x in named)
+        if len(values) != len(self.variables):
+            raise TypeError(('Lambda takes {expected} arguments but {given} were given')
+                            .format(expected=len(self.variables), given=len(values)))
+        budget = self.expression.current_budget()
+        if budget is not None:
+            budget.call_lambda()
+        body = self.body
+        return self.expression.calculator.execute(body.program, self.df, self.local, values, body.parameters)
 
 
 class BasePreprocessor(metaclass=ABCMeta):
@@ -35,178 +59,168 @@ class BasePreprocessor(metaclass=ABCMeta):
 
 
 class Preprocessor(BasePreprocessor):
+    name_pattern = re.compile(r'\w+')
+    # name of function which is called: "np.mean("
+    function_pattern = re.compile(r'[\w.]+\(')
+    # name of function which ends the command: "np.mean"
+    function_name_pattern = re.compile(r'[\w.]+\s*\Z')
+    method_pattern = re.compile(r'\.(\w+)(\()?')
+    number_pattern = re.compile(r'\d+(\.\d+)?')
+    lambda_pattern = re.compile(r'lambda\s([^:]*):')
+    string_patterns = {
+        '\'': re.compile(r"'[^']+'"),
+        '"': re.compile(r'"[^"]+"'),
+    }
+    bracket_patterns = {
+        '(': re.compile(r'[()]'),
+        '[': re.compile(r'[\[\]]'),
+    }
+
     def __init__(self, evaluator):
         self.evaluator = evaluator
 
-    def _add_excess_brackets(self, i, endif, command):
-        counter = 0
-        for j in range(endif.count("(")):
-            i += 1
-            while i < len(command) and command[i] != ')':
-                i += 1
-            counter += 1
-        return counter - endif.count(")"), i
-
-    def if_else_function(self, before, middle, end, df, local):
-        if self.evaluator.solve(command=middle, df=df, local=local):
-            value = self.evaluator.solve(command=before, df=df, local=local)
-        elif end.strip():
-            value = self.evaluator.solve(command=end, df=df, local=local)
-        else:
-            value = None
-        return value
+    def _raise_wrong_expression(self, command, pos):
+        prev_, next_ = self.evaluator.get_prev_and_next(command, pos)
+        raise Exception(('Wrong expression at position {position}: "{expression}"').format(
+            expression=f'{prev_} --> {command[pos]} <-- {next_}', position=str(pos)))
 
-    def _text_inside_parentheses(self, s: str):
+    def _closing_bracket(self, command: str, start: int) -> int:
         """
-        Returns false if parentheses is not valid
-        Returns text inside the outer parentheses
-        s:
-            example: ['(1)((2)3(4))'] -> 1
-            example: ['((2)3(4))'] -> (2)3(4)
+        Returns position of the bracket which closes bracket at start position
+            example: ('f((2)3(4)) + 1', 1) -> 9
         """
 
         # todo: handle "(", ")" as name of column
-        stack = []
-        brackets = {'(': ')'}
-        brackets_possible = {'(', ')'}
-        pos = 0
-        amount = -1
-
-        for element in s:
-            if element in brackets_possible:
-                if element in brackets:
-                    if amount == -1:
-                        amount += 1
-                        start = pos
-                    amount += 1
-                    stack.append((element, pos))
+        opening = command[start]
+        depth = 0
+        for bracket in self.bracket_patterns[opening].finditer(command, start):
+            depth += 1 if bracket.group(0) == opening else -1
+            if depth == 0:
+                return bracket.start()
+        self.evaluator.raise_excess_parentheses(command, start)
+
+    def _get_name(self, command: str, pos: int, stack: list, local: dict) -> int:
+        """
+        Parses keywords, functions and variables.
+        Returns position after the parsed name or None if the name ends the command.
+        """
+        name = self.name_pattern.match(command, pos).group(0)
+
+        if name in ('if', 'else'):
+            # conditional expression "body if condition else orelse"
+            stack.append(name)
+        elif name == 'in':
+            stack.append(name)
+        elif name in ('True', 'False'):
+            stack.append((TypeOfCommand.VALUE, name == 'True'))
+        elif name == 'lambda' and (lambda_pattern := self.lambda_pattern.match(command, pos)):
+            # ex: "lambda v: v ** 2 < 34"
+            #     command = "v ** 2 < 34"
+            #     variables = ["v"]
+            variables = lambda_pattern.group(1).replace(' ', '').split(',')
+            body = command[lambda_pattern.end():]
+            stack.append((TypeOfCommand.FUNCTION, Lambda(self.evaluator, None, body, variables, local)))
+            return None
+        elif function_pattern := self.function_pattern.match(command, pos):
+            end = self._closing_bracket(command, function_pattern.end() - 1)
+            stack.append((TypeOfCommand.FUNCTION_EXECUTABLE, command[function_pattern.end():end],
+                          function_pattern.group(0)[:-1]))
+            return end + 1
+        elif name in local:
+            stack.append((TypeOfCommand.VARIABLE, name))
+        else:
+            function_name_pattern = self.function_name_pattern.match(command, pos)
+            try:
+                if not function_name_pattern:
+                    raise Exception(f"Unsupported function {name}")
+                function = self.evaluator.handle_function(function_name_pattern.group(0).strip())
+            except Exception:
+                # unknown names are resolved from local variables at evaluation time
+                if not name.isidentifier():
+                    self._raise_wrong_expression(command, pos)
+                stack.append((TypeOfCommand.VARIABLE, name))
+            else:
+                if callable(function) and name.isidentifier() and function_name_pattern.group(0).strip() == name:
+                    # local variable with the same name is taken instead of the function at evaluation time
+                    stack.append((TypeOfCommand.FUNCTION, function, name))
+                elif callable(function):
+                    stack.append((TypeOfCommand.FUNCTION, function))
                 else:
-                    amount -= 1
-                    if not stack or brackets[stack.pop()[0]] != element:
-                        self.evaluator.raise_excess_parentheses(s, pos)
-            pos += 1
-            if amount == 0:
-                return s[start + 1:pos - 1]
-
-        if stack:
-            self.evaluator.raise_excess_parentheses(s, stack[-1][1])
+                    stack.append((TypeOfCommand.VALUE, function))
+                return None
+        return pos + len(name)
 
     def _get_stack(self, command: str, local: dict = None, df=None) -> List[str]:
         """
         Returns splitted command.
+        Command is scanned once from left to right.
         """
-        command += ' '
-
         local = local or {}
+        settings = self.evaluator.current_settings()
+        column_pattern = re.compile(settings.df_regex)
+        operators = self.evaluator.operators
 
         stack = []
-        i = 0
-
-        while i < len(command):
-            if if_else_pattern := re.match(r'[^\(\:]*[ ()]if[ ()]((?!if|else).)*(else)?[^)]*', command[i:]):
-                if_else_string = command[i:i + if_else_pattern.regs[0][1]]
-                before_if = re.match(r'((?!if).)*', if_else_string)
-                middle_if = re.match(r'((?!else).)*', if_else_string[2 + before_if.regs[0][1]:])
-                endif = if_else_string[2 + before_if.regs[0][1] + 4 + middle_if.regs[0][1]:]
-                counter, i = self._add_excess_brackets(i + if_else_pattern.regs[0][1] - 1, endif, command)
-                endif += ''.join([')' for i in range(counter)])
-                stack.append(
-                    (TypeOfCommand.VALUE, self.if_else_function(before_if.group(0), middle_if.group(0), endif, df, local)))
-            elif command[i] in {'(', ')'}:
-                stack.append(command[i])
+        pos = 0
+
+        while pos is not None and pos < len(command):
+            char = command[pos]
+            if char.isspace():
+                pos += 1
+            elif char in {'(', ')'}:
+                stack.append(char)
+                pos += 1
             # mathing columns with ${column} format
-            elif command[i] == self.evaluator.settings.df_startswith:
+            elif char == settings.df_startswith:
                 # todo: handle "{", "}" as name of column
-                column_pattern = re.match(self.evaluator.settings.df_regex, command[i:])
-                if column_pattern:
-                    column_name = column_pattern.string[2:column_pattern.regs[0][1] - 1]
-                    if column_name == self.evaluator.settings.df_name:
+                column_pattern_match = column_pattern.match(command, pos)
+                if column_pattern_match:
+                    column_name = column_pattern_match.group(0)[2:-1]
+                    if column_name == settings.df_name:
                         stack.append((TypeOfCommand.DATAFRAME,))
                     else:
                         stack.append((TypeOfCommand.COLUMN, column_name))
-                    i += column_pattern.regs[0][1] - 1
-            elif command[i] == '.':
-                method_pattern = re.match(r'\.[\w]+\(.*\)', command[i:])
-                property_pattern = re.match(r'\.[\w]+', command[i:])
-                if method_pattern:
-                    command_outer = method_pattern.string[:method_pattern.regs[0][1]]
-                    method_name_pattern = re.match(r'\.[\w]+', command_outer)
-                    command_inner = self._text_inside_parentheses(command_outer)
-                    stack.append((TypeOfCommand.METHOD, command_inner,
-                                  method_name_pattern.string[1:method_name_pattern.regs[0][1]]))
-                    i += method_name_pattern.regs[0][1] + len(command_inner) + 1
+                    pos = column_pattern_match.end()
                 else:
-                    stack.append((TypeOfCommand.PROPERTY, property_pattern.string[1:property_pattern.regs[0][1]]))
-                    i += property_pattern.regs[0][1] - 1
-            elif function_pattern := re.match(r'[\w.]+\(.*\)', command[i:]):
-                command_outer = function_pattern.string[:function_pattern.regs[0][1]]
-                function_name_pattern = re.match(r'[\w.]+', command_outer)
-                command_inner = self._text_inside_parentheses(command_outer)
-                stack.append(
-                    (TypeOfCommand.FUNCTION_EXECUTABLE, command_inner,
-                     function_name_pattern.string[:function_name_pattern.regs[0][1]]))
-                i += function_name_pattern.regs[0][1] + len(command_inner) + 1
-            # mathing strings with 'string' format
-            elif command[i] == '\'':
-                string_pattern = re.match(r'\'[^\']+\'', command[i:])
-                stack.append((TypeOfCommand.VALUE, string_pattern.string[1:string_pattern.regs[0][1] - 1]))
-                i += string_pattern.regs[0][1] - 1
-            elif command[i] == '\"':
-                string_pattern = re.match(r'\"[^\"]+\"', command[i:])
-                stack.append((TypeOfCommand.VALUE, string_pattern.string[1:string_pattern.regs[0][1] - 1]))
-                i += string_pattern.regs[0][1] - 1
-            elif list_pattern := re.match(r'\[[^\]]+\]', command[i:]):
-                stack.append((TypeOfCommand.VALUE, literal_eval(list_pattern.string[1:list_pattern.regs[0][1] - 1])))
-                i += list_pattern.regs[0][1]
-            elif len(command) > i + 2 and ((command[i:i + 3] in ('in ', 'in(')) or (
-                    command[i: i + 2] in self.evaluator.operators and command[i: i + 2] != 'in')):
-                stack.append(command[i:i + 2])
-                i += 1
-            elif command[i] in self.evaluator.operators:
-                stack.append(command[i])
-            # mathing floats and ints
-            elif number_pattern := re.match(r'[-+]?\d*\.?\d+', command[i:]):
-                if float_number_pattern := re.match(r'[-+]?\d+\.\d+', command[i:]):
-                    stack.append(
-                        (TypeOfCommand.VALUE, float(float_number_pattern.string[:float_number_pattern.regs[0][1]])))
-                    i += float_number_pattern.regs[0][1] - 1
+                    pos += 1
+            elif char == '.':
+                method_pattern = self.method_pattern.match(command, pos)
+                if not method_pattern:
+                    self._raise_wrong_expression(command, pos)
+                if method_pattern.group(2):
+                    end = self._closing_bracket(command, method_pattern.end() - 1)
+                    stack.append((TypeOfCommand.METHOD, command[method_pattern.end():end], method_pattern.group(1)))
+                    pos = end + 1
                 else:
-                    stack.append((TypeOfCommand.VALUE, int(number_pattern.string[:number_pattern.regs[0][1]])))
-                    i += number_pattern.regs[0][1] - 1
-            elif bool_pattern := re.match('True', command[i:]):
-                stack.append((TypeOfCommand.VALUE, True))
-                i += bool_pattern.regs[0][1] - 1
-            elif bool_pattern := re.match('False', command[i:]):
-                stack.append((TypeOfCommand.VALUE, False))
-                i += bool_pattern.regs[0][1] - 1
-            elif lambda_pattern := re.match(r' *lambda [^:]*:', command[i:]):
-                # ex: "lambda v: v ** 2 < 34"
-                #     command = "v ** 2 < 34"
-                command1 = command[i + lambda_pattern.regs[0][1]:]
-                # ex: "lambda v: v ** 2 < 34"
-                #     local = ["v"]
-                variables = command[i:lambda_pattern.regs[0][1] - 1].split('lambda')[1].replace(' ', '').split(',')
-                stack.append((TypeOfCommand.FUNCTION, Lambda(self.evaluator, df, command1, variables, local)))
-                i += lambda_pattern.regs[0][1] - 1 + len(command1)
-            elif command[i] != ' ':
-                variable_pattern = re.match(r'[\w]*', command[i:])
-                if variable_pattern and variable_pattern.string[:variable_pattern.regs[0][1]] in local:
-                    stack.append((TypeOfCommand.VARIABLE, variable_pattern.string[:variable_pattern.regs[0][1]]))
-                else:
-                    func = command[i:].strip()
-                    try:
-                        function = self.evaluator.handle_function(func)
-                    except Exception:
-                        prev_, next_ = self.evaluator.get_prev_and_next(command, i)
-                        raise Exception(('Wrong expression at position {position}: "{expression}"').format(
-                            expression=f'{prev_} --> {command[i]} <-- {next_}', position=str(i)))
-                    else:
-                        if callable(function):
-                            stack.append((TypeOfCommand.FUNCTION, function))
-                        else:
-                            stack.append((TypeOfCommand.VALUE, function))
-                        break
-            i += 1
+                    stack.append((TypeOfCommand.PROPERTY, method_pattern.group(1)))
+                    pos = method_pattern.end()
+            # mathing strings with 'string' or "string" format
+            elif char in self.string_patterns:
+                string_pattern = self.string_patterns[char].match(command, pos)
+                if not string_pattern:
+                    self._raise_wrong_expression(command, pos)
+                stack.append((TypeOfCommand.VALUE, string_pattern.group(0)[1:-1]))
+                pos = string_pattern.end()
+            elif char == '[':
+                end = self._closing_bracket(command, pos)
+                stack.append((TypeOfCommand.VALUE, literal_eval(command[pos + 1:end])))
+                pos = end + 1
+            elif command[pos:pos + 2] in operators and command[pos:pos + 2] != 'in':
+                stack.append(command[pos:pos + 2])
+                pos += 2
+            elif char in operators:
+                stack.append(char)
+                pos += 1
+            # mathing floats and ints
+            elif char.isdigit():
+                number_pattern = self.number_pattern.match(command, pos)
+                number = number_pattern.group(0)
+                stack.append((TypeOfCommand.VALUE, float(number) if number_pattern.group(1) else int(number)))
+                pos = number_pattern.end()
+            elif char.isalpha() or char == '_':
+                pos = self._get_name(command, pos, stack, local)
+            else:
+                self._raise_wrong_expression(command, pos)
         return stack
 
     def _is_valid_parentheses(self, s: List[str]):
@@ -223,7 +237,7 @@ class Preprocessor(BasePreprocessor):
         pos = 0
 
         for element in s:
-            if element in brackets_possible:
+            if isinstance(element, str) and element in brackets_possible:
                 if element in brackets:
                     stack.append((element, pos))
                 elif not stack or brackets[stack.pop()[0]] != element:
@@ -0,0 +1,173 @@
+from time import perf_counter
+from typing import List, Optional
+
+from safe_evaluation.constants import TypeOfCommand
+from safe_evaluation.limits import Budget
+
+
+class Hook:
+    """
+    Called around every calculated element of compiled program: operator, operand, method or function call.
+    Element is program[position], parameters are names of lambda arguments of the program.
+    Hooks are added by Evaluator.add_hook or passed to Evaluator.snapshot for one call.
+    """
+
+    def before(self, program: tuple, position: int, parameters: tuple):
+        pass
+
+    def after(self, program: tuple, position: int, parameters: tuple, value):
+        pass
+
+    def failed(self, program: tuple, position: int, parameters: tuple, error: Exception):
+        pass
+
+
+class ProfileNode:
+    """
+    Part of command with its calls count, cumulative and self time in seconds,
+    type and shape of the last result and estimated size of all results in bytes
+    """
+
+    __slots__ = ('name', 'calls', 'time', 'self_time', 'output_type', 'shape', 'bytes', 'children')
+
+    def __init__(self, name: str, calls: int = 0, time: float = 0.0, self_time: float = 0.0,
+                 output_type: Optional[str] = None, shape: Optional[tuple] = None, bytes: int = 0,
+                 children: Optional[List['ProfileNode']] = None):
+        self.name = name
+        self.calls = calls
+        self.time = time
+        self.self_time = self_time
+        self.output_type = output_type
+        self.shape = shape
+        self.bytes = bytes
+        self.children = children or []
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'calls': self.calls,
+            'time': self.time,
+            'self_time': self.self_time,
+            'output_type': self.output_type,
+            'shape': self.shape,
+            'bytes': self.bytes,
+            'children': [child.to_dict() for child in self.children],
+        }
+
+    def walk(self):
+        """
+        Yields the node and all its descendants
+        """
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def format(self, depth: int = 0) -> str:
+        """
+        Returns the tree as table, one node per line
+        """
+        shape = '' if self.shape is None else str(self.shape)
+        line = (f'{self.time:10.6f} {self.self_time:10.6f} {self.calls:8} {self.bytes:12}  '
+                f'{"  " * depth}{self.name}  [{self.output_type or ""}{shape}]')
+        if not depth:
+            line = f'{"time":>10} {"self":>10} {"calls":>8} {"bytes":>12}  node\n' + line
+        return '\n'.join([line] + [child.format(depth + 1) for child in self.children])
+
+    def __str__(self):
+        return self.format()
+
+    def __repr__(self):
+        return (f'ProfileNode({self.name!r}, calls={self.calls}, time={self.time:.6f}, '
+                f'self_time={self.self_time:.6f})')
+
+
+class Profiler(Hook):
+    """
+    Collects time and results of every element, elements executed many times (e.g. in lambda body)
+    are accumulated in one node.
+    Tree follows operands of elements, programs executed inside of an element (args, branches,
+    lambda bodies) are children of that element.
+    """
+
+    def __init__(self, calculator):
+        self.calculator = calculator
+        # id of program -> (program, parameters)
+        self.programs = {}
+        # (id of program, position) -> [calls, time, output type, shape, bytes]
+        self.stats = {}
+        # key of element or None for the top level -> ids of programs executed inside of it
+        self.nested = {}
+        # [key, start time] of elements being calculated
+        self.running = []
+
+    def before(self, program, position, parameters):
+        key = (id(program), position)
+        if key[0] not in self.programs:
+            self.programs[key[0]] = (program, parameters)
+        parent = self.running[-1][0] if self.running else None
+        self.nested.setdefault(parent, {})[key[0]] = None
+        self.running.append([key, perf_counter()])
+
+    def after(self, program, position, parameters, value):
+        key, start = self.running.pop()
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = [0, 0.0, None, None, 0]
+        stats[0] += 1
+        stats[1] += perf_counter() - start
+        stats[2] = type(value).__name__
+        stats[3] = getattr(value, 'shape', None)
+        stats[4] += Budget.size(value)
+
+    def failed(self, program, position, parameters, error):
+        key = (id(program), position)
+        # elements of this program which are not finished
+        while self.running and self.running[-1][0][0] == key[0]:
+            self.running.pop()
+
+    def _structure(self, program):
+        """
+        Returns positions of operands of every element and positions of results of program
+        """
+        operands = {}
+        stack = []
+        for position, element in enumerate(program):
+            if not isinstance(element, str) and element[0] == TypeOfCommand.STORE:
+                continue
+            arity = self.calculator._arity(element)
+            operands[position] = stack[len(stack) - arity:]
+            del stack[len(stack) - arity:]
+            stack.append(position)
+        return operands, stack
+
+    def _nodes(self, program_ids) -> List[ProfileNode]:
+        nodes = []
+        for program_id in program_ids:
+            program, parameters = self.programs[program_id]
+            operands, results = self._structure(program)
+            names = {}
+            self.calculator._source(program, parameters, names=names)
+            nodes.extend(node for node in (self._node(program_id, position, operands, names) for position in results)
+                         if node is not None)
+        return nodes
+
+    def _node(self, program_id, position, operands, names) -> Optional[ProfileNode]:
+        key = (program_id, position)
+        if key not in self.stats:
+            return None
+        calls, time, output_type, shape, size = self.stats[key]
+        children = [node for node in (self._node(program_id, operand, operands, names)
+                                      for operand in operands[position]) if node is not None]
+        nested = self._nodes(self.nested.get(key, ()))
+        return ProfileNode(
+            names[position], calls,
+            time=time + sum(child.time for child in children),
+            self_time=max(time - sum(child.time for child in nested), 0.0),
+            output_type=output_type, shape=shape, bytes=size, children=children + nested,
+        )
+
+    def tree(self) -> List[ProfileNode]:
+        """
+        Returns nodes of results of programs executed at the top level
+        """
+        return self._nodes(self.nested.get(None, ()))
@@ -0,0 +1,228 @@
+import json
+import math
+import zlib
+from typing import Iterable, Union
+
+import numpy as np
+import pandas as pd
+
+from safe_evaluation.compilation import CompiledBatch, CompiledExpression
+from safe_evaluation.constants import TypeOfCommand
+from safe_evaluation.fusion import Kernel
+from safe_evaluation.preprocessing import Lambda
+
+# version of the format, it is changed only with incompatible changes of the format
+FORMAT = 1
+# prefix of binary form: zlib compressed JSON
+MAGIC = b'SEV'
+
+COMMANDS = {command.value: command for command in TypeOfCommand}
+
+
+class Serializer:
+    """
+    Converts compiled expressions to JSON or compact binary form and back without parsing of commands.
+    Every distinct element of all expressions of the document is stored once in "elements" table,
+    programs are lists of positions in the table.
+    Element is operator string or list [TypeOfCommand value, *fields], fields of methods and functions args,
+    branches and lambda bodies are nested programs.
+    Values which aren't JSON types are dicts with one key naming their type, e.g. {"tuple": [1, 2]}.
+    Documents store digest of settings, expressions compiled with other settings are compiled again on load.
+    """
+
+    def __init__(self, evaluator):
+        self.evaluator = evaluator
+        self._decoders = {
+            TypeOfCommand.METHOD: self._decode_call,
+            TypeOfCommand.FUNCTION_EXECUTABLE: self._decode_call,
+            TypeOfCommand.CONDITION: self._decode_condition,
+            TypeOfCommand.FUNCTION: self._decode_function,
+            TypeOfCommand.KERNEL: self._decode_kernel,
+        }
+
+    def _raise_not_serializable(self, value):
+        raise Exception(('Value {value!r} of type {type} can\'t be serialized')
+                        .format(value=value, type=type(value).__name__))
+
+    def _encode_value(self, value):
+        if isinstance(value, np.generic):
+            return {'numpy': [value.dtype.str, self._encode_value(value.item())]}
+        if value is None or isinstance(value, (bool, int, str)):
+            return value
+        if isinstance(value, float):
+            return value if math.isfinite(value) else {'float': repr(value)}
+        if isinstance(value, complex):
+            return {'complex': [self._encode_value(value.real), self._encode_value(value.imag)]}
+        if isinstance(value, (list, tuple, set, frozenset)):
+            return {type(value).__name__: [self._encode_value(item) for item in value]}
+        if isinstance(value, dict):
+            return {'dict': [[self._encode_value(key), self._encode_value(item)] for key, item in value.items()]}
+        if isinstance(value, np.ndarray) and value.dtype.kind in 'biufcU':
+            return {'ndarray': [value.dtype.str, list(value.shape),
+                                [self._encode_value(item) for item in value.ravel().tolist()]]}
+        self._raise_not_serializable(value)
+
+    def _decode_value(self, value):
+        if not isinstance(value, dict):
+            return value
+        (kind, data), = value.items()
+        if kind == 'float':
+            return float(data)
+        if kind == 'complex':
+            return complex(*map(self._decode_value, data))
+        if kind in ('list', 'tuple', 'set', 'frozenset'):
+            return {'list': list, 'tuple': tuple, 'set': set, 'frozenset': frozenset}[kind](
+                self._decode_value(item) for item in data)
+        if kind == 'dict':
+            return {self._decode_value(key): self._decode_value(item) for key, item in data}
+        if kind == 'numpy':
+            return np.dtype(data[0]).type(self._decode_value(data[1]))
+        if kind == 'ndarray':
+            return np.array([self._decode_value(item) for item in data[2]], dtype=np.dtype(data[0])).reshape(data[1])
+        raise Exception(f'Unknown type of value {kind}')
+
+    def _function_name(self, function) -> str:
+        """
+        Returns name which gives the function in commands
+        """
+        for name, value in self.evaluator.allowed_funcs.items():
+            if value is function:
+                return name
+        name = getattr(function, '__name__', None)
+        for package, alias in ((np, 'np'), (pd, 'pd')):
+            if name and getattr(package, name, None) is function:
+                return f'{alias}.{name}'
+        self._raise_not_serializable(function)
+
+    def _encode_element(self, element, table: dict):
+        if isinstance(element, str):
+            return element
+        kind = element[0]
+        if kind == TypeOfCommand.VALUE:
+            return [kind.value, self._encode_value(element[1])]
+        if kind in (TypeOfCommand.METHOD, TypeOfCommand.FUNCTION_EXECUTABLE):
+            return [kind.value, element[1], [self._encode_program(arg, table) for arg in element[2]],
+                    [[key, self._encode_program(value, table)] for key, value in element[3]]]
+        if kind == TypeOfCommand.CONDITION:
+            return [kind.value, self._encode_program(element[1], table), self._encode_program(element[2], table)]
+        if kind == TypeOfCommand.FUNCTION and isinstance(element[1], Lambda):
+            function = element[1]
+            return [kind.value, {'lambda': function.command, 'variables': list(function.variables),
+                                 'body': self._encode_program(function.body.program, table)}]
+        if kind == TypeOfCommand.FUNCTION:
+            return [kind.value, self._function_name(element[1]), *element[2:]]
+        if kind == TypeOfCommand.KERNEL:
+            return [kind.value, self._encode_program(element[1].program, table)]
+        return [kind.value, *element[1:]]
+
+    def _encode_program(self, program, table: dict) -> list:
+        """
+        Returns positions of elements of program in the table, equal elements are stored once
+        """
+        output = []
+        for element in program:
+            encoded = self._encode_element(element, table)
+            key = json.dumps(encoded)
+            if key not in table:
+                table[key] = (len(table), encoded)
+            output.append(table[key][0])
+        return output
+
+    def _decode_call(self, kind, element, table):
+        return (kind, element[1], tuple(self._decode_program(arg, table) for arg in element[2]),
+                tuple((key, self._decode_program(value, table)) for key, value in element[3]))
+
+    def _decode_condition(self, kind, element, table):
+        return kind, self._decode_program(element[1], table), self._decode_program(element[2], table)
+
+    def _decode_function(self, kind, element, table):
+        if not isinstance(element[1], dict):
+            return (kind, self.evaluator.handle_function(element[1]), *element[2:])
+        function = element[1]
+        variables = tuple(function['variables'])
+        body = CompiledExpression(self.evaluator, function['lambda'],
+                                  self._decode_program(function['body'], table), variables)
+        return kind, Lambda(self.evaluator, None, function['lambda'], list(variables), None, body)
+
+    def _decode_kernel(self, kind, element, table):
+        return kind, Kernel(self._decode_program(element[1], table))
+
+    def _decode_element(self, element, table: list):
+        if isinstance(element, str):
+            if element not in self.evaluator.operators:
+                raise Exception(f'Unknown operator {element}')
+            return element
+        kind = COMMANDS[element[0]]
+        decoder = self._decoders.get(kind)
+        if decoder is not None:
+            return decoder(kind, element, table)
+        if len(element) == 2:
+            return kind, element[1] if kind != TypeOfCommand.VALUE else self._decode_value(element[1])
+        return (kind, *element[1:])
+
+    def _decode_program(self, program: list, table: list) -> tuple:
+        return tuple(map(table.__getitem__, program))
+
+    def _encode(self, compiled: CompiledExpression, table: dict) -> dict:
+        if isinstance(compiled, CompiledBatch):
+            return {'commands': list(compiled.command), 'program': self._encode_program(compiled.program, table)}
+        return {'command': compiled.command, 'parameters': list(compiled.parameters),
+                'program': self._encode_program(compiled.program, table)}
+
+    def _decode(self, data: dict, settings, table: list) -> CompiledExpression:
+        evaluator = self.evaluator
+        if 'commands' in data:
+            commands = tuple(data['commands'])
+            if settings is None:
+                return evaluator.compile_many(commands)
+            compiled = CompiledBatch(evaluator, commands, self._decode_program(data['program'], table))
+            evaluator.cache.put((commands, None, settings.key()), compiled)
+            return compiled
+        command, parameters = data['command'], tuple(data['parameters'])
+        if settings is None:
+            return evaluator.compile(command, parameters)
+        compiled = CompiledExpression(evaluator, command, self._decode_program(data['program'], table), parameters)
+        evaluator.cache.put((command, parameters, settings.key()), compiled)
+        return compiled
+
+    def dumps(self, compiled: Union[CompiledExpression, Iterable[CompiledExpression]],
+              binary: bool = False) -> Union[str, bytes]:
+        """
+        Returns JSON document of one compiled expression or list of them, compressed bytes if binary
+        """
+        table = {}
+        document = {'format': FORMAT, 'settings': self.evaluator.current_settings().digest()}
+        if isinstance(compiled, CompiledExpression):
+            document['expression'] = self._encode(compiled, table)
+        else:
+            document['expressions'] = [self._encode(expression, table) for expression in compiled]
+        document['elements'] = [encoded for _, encoded in table.values()]
+        text = json.dumps(document, separators=(',', ':'), ensure_ascii=False)
+        if binary:
+            return MAGIC + bytes([FORMAT]) + zlib.compress(text.encode())
+        return text
+
+    def loads(self, data: Union[str, bytes]) -> Union[CompiledExpression, list]:
+        """
+        Returns compiled expression or list of them from document made by dumps.
+        Loaded expressions are put to the cache of evaluator, so solve doesn't parse their commands.
+        """
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            data = bytes(data)
+            if data[:len(MAGIC)] != MAGIC or data[len(MAGIC)] != FORMAT:
+                raise Exception('Unknown format of compiled expressions')
+            data = zlib.decompress(data[len(MAGIC) + 1:]).decode()
+        document = json.loads(data)
+        if document.get('format') != FORMAT:
+            raise Exception(('Unknown format {format} of compiled expressions').format(format=document.get('format')))
+        with self.evaluator.snapshot() as settings:
+            # commands are parsed again if they were compiled with other settings
+            settings = settings if document['settings'] == settings.digest() else None
+            table = []
+            if settings is not None:
+                # nested programs refer only to the previous elements
+                for element in document['elements']:
+                    table.append(self._decode_element(element, table))
+            if 'expression' in document:
+                return self._decode(document['expression'], settings, table)
+            return [self._decode(expression, settings, table) for expression in document['expressions']]
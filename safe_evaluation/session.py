@@ -0,0 +1,199 @@
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from safe_evaluation.compilation import CompiledExpression
+from safe_evaluation.streaming import REDUCED, ROWS, SCALAR, is_array
+
+
+class Formula:
+    """
+    Command of session with its last result.
+    Commands with reductions keep combined reductions (totals), every reduction depends on its own columns.
+    """
+
+    __slots__ = ('name', 'compiled', 'kind', 'columns', 'uses_df', 'variables', 'reductions', 'totals', 'result')
+
+    def __init__(self, name, compiled: CompiledExpression, kind, reductions: list):
+        self.name = name
+        self.compiled = compiled
+        self.kind = kind
+        self.columns = set(compiled.columns)
+        self.uses_df = compiled.uses_df
+        calculator = compiled.evaluator.calculator
+        self.variables = calculator.variables(compiled.program) if hasattr(calculator, 'variables') else None
+        # (name, program, columns, whether ${__df} is used) of reductions
+        self.reductions = [(reduction, program, *calculator.references(program)) for reduction, program in reductions]
+        self.totals = None
+        self.result = None
+
+    def depends_on(self, columns: set) -> bool:
+        return self.uses_df or bool(self.columns & columns)
+
+    def changed(self, previous: Optional[dict], local: Optional[dict]) -> bool:
+        """
+        Returns whether variables of formula which aren't arrays are changed
+        """
+        if previous is local:
+            return False
+        if self.variables is None:
+            return True
+        previous, local = previous or {}, local or {}
+        return any(not is_array(local.get(name)) and local.get(name) is not previous.get(name)
+                   for name in self.variables)
+
+
+class Session:
+    """
+    Results of commands for DataFrame which changes over time, only results depending on changes are calculated.
+    Row-wise commands are calculated for appended rows only, reductions (sum, mean, min, max, count)
+    of appended rows are combined with previous ones, after change of columns only commands and reductions
+    using them are calculated again.
+    """
+
+    def __init__(self, evaluator, df: pd.DataFrame, commands: Union[Iterable[str], dict] = (), local: dict = None):
+        self.evaluator = evaluator
+        self.df = df
+        self.local = local
+        self.formulas: Dict[str, Formula] = {}
+        for name, command in (commands.items() if isinstance(commands, dict) else ((c, c) for c in commands)):
+            self.add(command, name)
+
+    @property
+    def streamer(self):
+        return getattr(self.evaluator.calculator, 'streamer', None)
+
+    def add(self, command: Union[str, CompiledExpression], name=None):
+        """
+        Adds command to the session and returns its result
+        """
+        with self.evaluator.snapshot():
+            compiled = self.evaluator.compile(command) if isinstance(command, str) else command
+            # commands which can't be calculated by chunks (kind is None) are always calculated again
+            kind = self.streamer.kind(compiled) if self.streamer is not None else None
+            reductions = self.streamer.programs(compiled) if kind == REDUCED else []
+        formula = Formula(compiled.command if name is None else name, compiled, kind, reductions)
+        self.formulas[formula.name] = formula
+        self._calculate(formula)
+        return formula.result
+
+    def remove(self, name):
+        del self.formulas[name]
+
+    def __getitem__(self, name):
+        return self.formulas[name].result
+
+    @property
+    def results(self) -> dict:
+        return {name: formula.result for name, formula in self.formulas.items()}
+
+    def _calculate(self, formula: Formula):
+        """
+        Calculates result of formula for the whole DataFrame
+        """
+        with self.evaluator.snapshot():
+            if formula.kind == REDUCED:
+                formula.totals = [None] * len(formula.reductions)
+                if len(self.df):
+                    formula.totals = self.streamer.partials(formula.compiled, self.df, self.local)
+                formula.result = self.streamer.finish(formula.compiled, formula.totals, self.local)
+            elif formula.kind == SCALAR:
+                formula.result = formula.compiled.evaluate(None, self.local)
+            else:
+                formula.result = self.evaluator.calculator.execute(formula.compiled.program, self.df, self.local)
+
+    def _concat(self, result, rows):
+        if isinstance(result, (pd.Series, pd.DataFrame)) and isinstance(rows, type(result)):
+            return pd.concat([result, rows])
+        if isinstance(result, np.ndarray) and isinstance(rows, np.ndarray) and result.ndim and rows.ndim:
+            return np.concatenate([result, rows])
+        return None
+
+    def _append(self, formula: Formula, rows: pd.DataFrame, start: int):
+        """
+        Calculates formula for rows appended at position start
+        """
+        local = self.local
+        if formula.kind in (ROWS, REDUCED):
+            names = self.streamer.array_variables(formula.compiled, local)
+            if not self.streamer.is_aligned(local, names, self.df):
+                # variables which are arrays without value for every row are aligned with all rows by labels
+                self._calculate(formula)
+                return
+            local = self.streamer.chunk_local(local, names, slice(start, None))
+        with self.evaluator.snapshot():
+            if formula.kind == ROWS:
+                result = self._concat(formula.result,
+                                      self.evaluator.calculator.execute(formula.compiled.program, rows, local))
+                if result is not None:
+                    formula.result = result
+                    return
+            elif formula.kind == REDUCED:
+                partials = self.streamer.partials(formula.compiled, rows, local)
+                formula.totals = self.streamer.combine(formula.totals, partials)
+                formula.result = self.streamer.finish(formula.compiled, formula.totals, self.local)
+                return
+        self._calculate(formula)
+
+    def append(self, rows: pd.DataFrame, local: Optional[dict] = None) -> List[str]:
+        """
+        Appends rows to DataFrame of the session, returns names of changed results.
+        local replaces variables: variables which are arrays (Series, ndarray) have value for all rows
+        including appended ones, results using other changed variables are calculated again.
+        """
+        previous_local = self.local
+        if local is not None:
+            self.local = local
+        previous = self.df
+        if len(rows):
+            self.df = pd.concat([self.df, rows])
+        changed = []
+        for formula in self.formulas.values():
+            if formula.changed(previous_local, self.local):
+                self._calculate(formula)
+            elif formula.kind == SCALAR or not len(rows):
+                continue
+            elif not len(previous):
+                self._calculate(formula)
+            else:
+                self._append(formula, rows, len(previous))
+            changed.append(formula.name)
+        return changed
+
+    def _update_reductions(self, formula: Formula, columns: set):
+        """
+        Calculates again reductions using columns
+        """
+        with self.evaluator.snapshot():
+            for position, (name, program, used, uses_df) in enumerate(formula.reductions):
+                if uses_df or set(used) & columns:
+                    formula.totals[position] = self.streamer.partial(name, program, self.df, self.local) \
+                        if len(self.df) else None
+            formula.result = self.streamer.finish(formula.compiled, formula.totals, self.local)
+
+    def update(self, columns: Iterable[str] = (), df: Optional[pd.DataFrame] = None,
+               local: Optional[dict] = None) -> List[str]:
+        """
+        Calculates results depending on changed columns, returns names of changed results.
+        df replaces DataFrame of the session if it was changed by copy, local replaces variables,
+        then all results are calculated again.
+        """
+        if df is not None:
+            self.df = df
+        if local is not None:
+            self.local = local
+            for formula in self.formulas.values():
+                self._calculate(formula)
+            return list(self.formulas)
+        columns = set(columns)
+        changed = []
+        for formula in self.formulas.values():
+            if not formula.depends_on(columns):
+                continue
+            if formula.kind == REDUCED:
+                self._update_reductions(formula, columns)
+            else:
+                self._calculate(formula)
+            changed.append(formula.name)
+        return changed
@@ -1,9 +1,18 @@
+import hashlib
 from typing import Union
 
 from safe_evaluation.constants import ALLOWED_FUNCS, NUMPY_ALLOWED_FUNCS
 
 
 class Settings:
+    """
+    Settings can be changed, but every call of Evaluator uses their immutable snapshot
+    """
+
+    _frozen = False
+    _key = None
+    _digest = None
+
     def __init__(
             self, *,
             allowed_funcs: Union[list, None] = None,
@@ -20,6 +29,56 @@ class Settings:
         self.df_regex = df_regex
         self.df_name = df_name
 
+    def __setattr__(self, key, value):
+        if self._frozen:
+            raise AttributeError('Settings snapshot is immutable')
+        super().__setattr__(key, value)
+
+    def snapshot(self) -> 'Settings':
+        """
+        Returns immutable copy of settings
+        """
+        if self._frozen:
+            return self
+        key = self.key()
+        settings = Settings(
+            numpy_allowed_funcs=key[0],
+            allowed_funcs=key[1],
+            forbidden_funcs=key[2],
+            df_startswith=key[3],
+            df_regex=key[4],
+            df_name=key[5],
+        )
+        settings._key = key
+        settings._frozen = True
+        return settings
+
+    def key(self) -> tuple:
+        """
+        Returns hashable representation of the fields affecting parsing
+        """
+        if self._key is not None:
+            return self._key
+        return (
+            tuple(self.numpy_allowed_funcs),
+            tuple(self.allowed_funcs),
+            tuple(self.forbidden_funcs),
+            self.df_startswith,
+            self.df_regex,
+            self.df_name,
+        )
+
+    def digest(self) -> str:
+        """
+        Returns hash of key which is the same in every process
+        """
+        if self._digest is not None:
+            return self._digest
+        digest = hashlib.sha256(repr(self.key()).encode()).hexdigest()
+        if self._frozen:
+            object.__setattr__(self, '_digest', digest)
+        return digest
+
     def _check_allowed_func(self, func_name: str):
         is_numpy_pandas = func_name.startswith(tuple(self.numpy_allowed_funcs))
         return func_name in self.allowed_funcs or is_numpy_pandas
@@ -0,0 +1,140 @@
+import os
+from abc import ABCMeta, abstractmethod
+from typing import Iterable, List, Optional
+
+import pandas as pd
+
+try:
+    import pyarrow
+    import pyarrow.feather
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+PARQUET = ('.parquet', '.pq')
+ARROW = ('.feather', '.arrow', '.ipc')
+
+
+def _require_pyarrow(path):
+    if pyarrow is None:
+        raise Exception(('pyarrow is required to read columns of {path}').format(path=path))
+
+
+class ColumnSource(metaclass=ABCMeta):
+    """
+    Table whose columns are read on demand, so only columns used by commands are loaded
+    """
+
+    @abstractmethod
+    def column_names(self) -> List[str]:
+        pass
+
+    @abstractmethod
+    def read(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Returns DataFrame of columns, all columns if columns is None
+        """
+        pass
+
+    def _existing(self, columns: Optional[Iterable[str]]) -> Optional[List[str]]:
+        """
+        Returns columns which are in the table, absent ones are reported by calculation as usual
+        """
+        if columns is None:
+            return None
+        names = set(columns)
+        return [name for name in self.column_names() if name in names]
+
+
+class ParquetSource(ColumnSource):
+    """
+    Parquet file or directory of files, only column chunks of requested columns are read
+    """
+
+    def __init__(self, path: str, memory_map: bool = True):
+        _require_pyarrow(path)
+        self.path = path
+        self.memory_map = memory_map
+        self._schema = None
+
+    def column_names(self) -> List[str]:
+        if self._schema is None:
+            self._schema = pyarrow.parquet.ParquetDataset(self.path, memory_map=self.memory_map).schema
+        index = set(self._index_columns())
+        return [name for name in self._schema.names if name not in index]
+
+    def _index_columns(self) -> List[str]:
+        metadata = self._schema.pandas_metadata if self._schema is not None else None
+        if not metadata:
+            return []
+        return [column for column in metadata.get('index_columns', []) if isinstance(column, str)]
+
+    def read(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        table = pyarrow.parquet.read_table(self.path, columns=self._existing(columns), memory_map=self.memory_map,
+                                           use_pandas_metadata=True)
+        return table.to_pandas(split_blocks=True)
+
+
+class ArrowSource(ColumnSource):
+    """
+    Feather (Arrow IPC) file or pyarrow Table, only requested columns are read and decompressed.
+    Uncompressed files are memory-mapped, so their columns are not copied on reading.
+    """
+
+    def __init__(self, source, memory_map: bool = True):
+        _require_pyarrow(source)
+        self.source = source
+        self.memory_map = memory_map
+
+    def column_names(self) -> List[str]:
+        if isinstance(self.source, pyarrow.Table):
+            return list(self.source.column_names)
+        with pyarrow.memory_map(self.source) as file:
+            return list(pyarrow.ipc.open_file(file).schema.names)
+
+    def read(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        columns = self._existing(columns)
+        if isinstance(self.source, pyarrow.Table):
+            table = self.source if columns is None else self.source.select(columns)
+        else:
+            table = pyarrow.feather.read_table(self.source, columns=columns, memory_map=self.memory_map)
+        return table.to_pandas(split_blocks=True)
+
+
+class DataFrameSource(ColumnSource):
+    """
+    DataFrame which is already in memory, read returns view of requested columns
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+
+    def column_names(self) -> List[str]:
+        return list(self.df.columns)
+
+    def read(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        if columns is None:
+            return self.df
+        return self.df[self._existing(columns)]
+
+
+def open_source(source) -> ColumnSource:
+    """
+    Returns ColumnSource for path of Parquet or Feather/Arrow file, pyarrow Table, DataFrame or ColumnSource
+    """
+    if isinstance(source, ColumnSource):
+        return source
+    if isinstance(source, pd.DataFrame):
+        return DataFrameSource(source)
+    if pyarrow is not None and isinstance(source, pyarrow.Table):
+        return ArrowSource(source)
+    if isinstance(source, (str, os.PathLike)):
+        path = os.fspath(source)
+        suffix = os.path.splitext(path)[1].lower()
+        if suffix in PARQUET or os.path.isdir(path):
+            return ParquetSource(path)
+        if suffix in ARROW:
+            return ArrowSource(path)
+        raise Exception(('Unknown format of {path}, expected one of {suffixes}')
+                        .format(path=path, suffixes=', '.join(PARQUET + ARROW)))
+    raise Exception(('Unsupported source of columns {type}').format(type=type(source).__name__))
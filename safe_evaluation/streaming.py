@@ -0,0 +1,353 @@
+from typing import Iterable
+from weakref import WeakKeyDictionary
+
+import numpy as np
+import pandas as pd
+
+from safe_evaluation.constants import TypeOfCommand, ROW_WISE_METHODS, ROW_WISE_FUNCS
+from safe_evaluation.preprocessing import Lambda
+
+# kinds of values in command
+SCALAR = 0  # doesn't depend on DataFrame
+ROWS = 1  # calculated row by row
+REDUCED = 2  # calculated from reductions of whole columns
+
+
+def is_array(value) -> bool:
+    """
+    Returns whether value of variable has value for every row, e.g. column calculated before
+    """
+    return isinstance(value, (pd.Series, pd.DataFrame)) or (isinstance(value, np.ndarray) and value.ndim > 0)
+
+
+class Streamer:
+    """
+    Calculates command over chunks of DataFrame.
+    Row-wise commands give result for every chunk, reductions (sum, mean, min, max, count)
+    are calculated for every chunk and combined, so only one chunk is kept in memory.
+    Variables which are arrays are split as rows of chunks.
+    """
+
+    reductions = {'sum', 'mean', 'min', 'max', 'count'}
+    function_reductions = {'np.sum': 'sum', 'np.mean': 'mean', 'np.min': 'min', 'np.max': 'max'}
+    row_wise_methods = ROW_WISE_METHODS
+    row_wise_properties = {'str', 'dt'}
+    row_wise_funcs = ROW_WISE_FUNCS
+    # functions converting the whole value into one object
+    scalar_funcs = {'bool', 'int', 'float', 'complex', 'str'}
+
+    def __init__(self, evaluator):
+        self.evaluator = evaluator
+        self._plans = WeakKeyDictionary()
+
+    def _raise_not_streamable(self, command):
+        raise Exception(('Command "{command}" can\'t be calculated by chunks').format(command=command))
+
+    def _function_name(self, name):
+        for package, alias in (('numpy.', 'np.'), ('pandas.', 'pd.')):
+            if name.startswith(package):
+                return alias + name[len(package):]
+        return name
+
+    def _combine_kinds(self, kinds, command):
+        kinds = set(kinds)
+        if ROWS in kinds and REDUCED in kinds:
+            self._raise_not_streamable(command)
+        return max(kinds, default=SCALAR)
+
+    def _lambda_kind(self, program, command):
+        if len(program) == 1 and program[0][0] == TypeOfCommand.FUNCTION and isinstance(program[0][1], Lambda):
+            # lambda is applied to elements, it can't use columns of the chunk
+            body = program[0][1].body
+            if self._analyse(body.program, [], command)[0] != SCALAR:
+                self._raise_not_streamable(command)
+            return SCALAR
+        return None
+
+    def _analyse_params(self, args, kwargs, reductions, command):
+        """
+        Returns kinds of args and kwargs with reductions replaced by slots
+        """
+        kinds = []
+        new_args = []
+        for arg in args:
+            kind = self._lambda_kind(arg, command)
+            if kind is None:
+                kind, arg = self._analyse(arg, reductions, command)
+            kinds.append(kind)
+            new_args.append(arg)
+        new_kwargs = []
+        for keyword, value in kwargs:
+            kind, value = self._analyse(value, reductions, command)
+            kinds.append(kind)
+            new_kwargs.append((keyword, value))
+        return kinds, tuple(new_args), tuple(new_kwargs)
+
+    def _reduce(self, name, program, output, start, reductions):
+        reductions.append((name, tuple(program)))
+        output[start:] = [(TypeOfCommand.ARGUMENT, len(reductions) - 1)]
+        return REDUCED
+
+    def _analyse(self, program, reductions, command):
+        """
+        Returns kind of program and program where reductions of row-wise values
+        are replaced with slots of arguments, reductions are added to the list as (name, program)
+        """
+        calculator = self.evaluator.calculator
+        output = []
+        # (kind, start position) of operands on the stack
+        stack = []
+        for element in calculator._unshare(program):
+            arity = calculator._arity(element)
+            operands = stack[len(stack) - arity:]
+            del stack[len(stack) - arity:]
+            start = operands[0][1] if operands else len(output)
+            kinds = [kind for kind, _ in operands]
+            if isinstance(element, str) or element[0] == TypeOfCommand.KERNEL:
+                kind = self._combine_kinds(kinds, command)
+                output.append(element)
+            elif element[0] in (TypeOfCommand.COLUMN, TypeOfCommand.DATAFRAME):
+                kind = ROWS
+                output.append(element)
+            elif element[0] in (TypeOfCommand.VALUE, TypeOfCommand.VARIABLE, TypeOfCommand.ARGUMENT):
+                kind = SCALAR
+                output.append(element)
+            elif element[0] == TypeOfCommand.PROPERTY:
+                kind = kinds[0]
+                if kind == ROWS and element[1] not in self.row_wise_properties:
+                    self._raise_not_streamable(command)
+                output.append(element)
+            elif element[0] == TypeOfCommand.METHOD:
+                params, args, kwargs = self._analyse_params(*element[2:], reductions, command)
+                name, kind = element[1], kinds[0]
+                if kind == ROWS and name in self.reductions and not args and not kwargs:
+                    kind = self._reduce(name, output[start:], output, start, reductions)
+                else:
+                    if kind == ROWS and (name not in self.row_wise_methods or
+                                         (name == 'apply' and output[start:] == [(TypeOfCommand.DATAFRAME,)])):
+                        self._raise_not_streamable(command)
+                    kind = self._combine_kinds(kinds + params, command)
+                    output.append((TypeOfCommand.METHOD, name, args, kwargs))
+            elif element[0] == TypeOfCommand.FUNCTION_EXECUTABLE:
+                params, args, kwargs = self._analyse_params(*element[2:], reductions, command)
+                name = self._function_name(element[1])
+                if name in self.function_reductions and params == [ROWS] and not kwargs:
+                    # forbidden functions are never calculated
+                    self.evaluator.handle_function(element[1])
+                    kind = self._reduce(self.function_reductions[name], args[0], output, len(output), reductions)
+                else:
+                    kind = self._combine_kinds(params, command)
+                    if kind == ROWS and name not in self.row_wise_funcs and \
+                            not isinstance(self.evaluator.handle_function(element[1]), np.ufunc):
+                        self._raise_not_streamable(command)
+                    output.append((TypeOfCommand.FUNCTION_EXECUTABLE, element[1], args, kwargs))
+            elif element[0] == TypeOfCommand.CONDITION:
+                branches = [self._analyse(branch, [], command)[0] for branch in element[1:]]
+                if REDUCED in branches or (kinds[0] == REDUCED and ROWS in branches):
+                    self._raise_not_streamable(command)
+                kind = self._combine_kinds(kinds + branches, command)
+                output.append(element)
+            else:
+                self._raise_not_streamable(command)
+            stack.append((kind, start))
+        return stack[-1][0], tuple(output)
+
+    def _plan(self, compiled):
+        """
+        Returns (kind, program calculating result from reductions, (names, batch and programs of reductions),
+        variables used by parts calculated for every chunk)
+        """
+        if compiled not in self._plans:
+            reductions = []
+            kind, program = self._analyse(compiled.program, reductions, compiled.command)
+            names = [name for name, _ in reductions]
+            calculator = self.evaluator.calculator
+            variables = calculator.variables(compiled.program) if kind == ROWS else ()
+            if reductions:
+                programs = [program for _, program in reductions]
+                variables = tuple(dict.fromkeys(name for program in programs
+                                                for name in calculator.variables(program)))
+                reductions = (names, calculator.compile_many(programs), programs)
+            self._plans[compiled] = (kind, program, reductions, variables)
+        return self._plans[compiled]
+
+    def kind(self, compiled):
+        """
+        Returns SCALAR, ROWS or REDUCED kind of compiled command, None if it can't be calculated by chunks
+        """
+        try:
+            return self._plan(compiled)[0]
+        except Exception:
+            return None
+
+    def _partial(self, name, value):
+        """
+        Returns reduction of the chunk and name of numpy function combining it with other chunks
+        """
+        is_pandas = isinstance(value, (pd.Series, pd.DataFrame))
+        if name == 'mean':
+            return (value.sum(), value.count() if is_pandas else np.size(value)), 'mean'
+        if name == 'count' and not is_pandas:
+            return np.size(value), 'add'
+        if name in ('min', 'max'):
+            # pandas skips nan values
+            how = {('min', True): 'fmin', ('max', True): 'fmax', ('min', False): 'minimum', ('max', False): 'maximum'}
+            return getattr(value, name)(), how[name, is_pandas]
+        return getattr(value, name)(), 'add'
+
+    def _combine(self, total, partial):
+        if total is None:
+            return partial
+        (total, how), (value, _) = total, partial
+        if how == 'mean':
+            return (total[0] + value[0], total[1] + value[1]), how
+        return getattr(np, how)(total, value), how
+
+    def _total(self, name, total):
+        if total is None:
+            return {'sum': 0, 'count': 0}.get(name, np.nan)
+        total = total[0]
+        if name == 'mean':
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return total[0] / total[1]
+        return total
+
+    def partials(self, compiled, chunk: pd.DataFrame, local: dict = None) -> list:
+        """
+        Returns reductions of the chunk for command of REDUCED kind
+        """
+        _, _, (names, batch, _), _ = self._plan(compiled)
+        values = self.evaluator.calculator.execute_many(batch, chunk, local)
+        return [self._partial(name, value) for name, value in zip(names, values)]
+
+    def programs(self, compiled) -> list:
+        """
+        Returns (name, program) of every reduction of command of REDUCED kind
+        """
+        _, _, (names, _, programs), _ = self._plan(compiled)
+        return list(zip(names, programs))
+
+    def partial(self, name: str, program, chunk: pd.DataFrame, local: dict = None):
+        """
+        Returns one reduction of the chunk, see programs
+        """
+        return self._partial(name, self.evaluator.calculator.execute(program, chunk, local))
+
+    def combine(self, totals: list, partials: list) -> list:
+        """
+        Returns reductions of previous chunks combined with reductions of the next chunk
+        """
+        return [self._combine(total, partial) for total, partial in zip(totals, partials)]
+
+    def finish(self, compiled, totals: list, local: dict = None):
+        """
+        Returns result of command of REDUCED kind calculated from combined reductions
+        """
+        _, program, (names, _, _), _ = self._plan(compiled)
+        arguments = tuple(self._total(name, total) for name, total in zip(names, totals))
+        return self.evaluator.calculator.execute(program, None, local, arguments)
+
+    def array_variables(self, compiled, local: dict = None) -> list:
+        """
+        Returns names of variables which are arrays (Series, DataFrame, ndarray) used by parts of command
+        calculated for every chunk, their values are given for all rows, so they are split as rows
+        """
+        if not local:
+            return []
+        return [name for name in self._plan(compiled)[3] if name in local and is_array(local[name])]
+
+    def is_aligned(self, local: dict, names: list, df: pd.DataFrame) -> bool:
+        """
+        Returns whether variables of names have value for every row of df in the same order
+        """
+        for name in names:
+            value = local[name]
+            if len(value) != len(df) or (isinstance(value, (pd.Series, pd.DataFrame)) and
+                                         not value.index.equals(df.index)):
+                return False
+        return True
+
+    def chunk_local(self, local: dict, names: list, positions) -> dict:
+        """
+        Returns local for rows at positions (slice or array) where variables of names are taken at these positions
+        """
+        if not names:
+            return local
+        local = dict(local)
+        for name in names:
+            value = local[name]
+            if isinstance(value, (pd.Series, pd.DataFrame)):
+                local[name] = value.iloc[positions]
+            else:
+                local[name] = value[positions]
+        return local
+
+    def keeps_rows(self, compiled) -> bool:
+        """
+        Returns whether result of row-wise command has value for every row, so results of chunks can be concatenated.
+        E.g. .str accessor or str(${a}) are calculated from rows, but give one object.
+        """
+        root = self.evaluator.calculator._unshare(compiled.program)[-1]
+        if isinstance(root, str):
+            return True
+        if root[0] == TypeOfCommand.PROPERTY:
+            return False
+        return root[0] != TypeOfCommand.FUNCTION_EXECUTABLE or self._function_name(root[1]) not in self.scalar_funcs
+
+    def _raise_not_aligned(self, names):
+        raise Exception(('Variables {names} must have value for every row of chunks in the same order')
+                        .format(names=', '.join(names)))
+
+    def _chunks(self, compiled, chunks, local):
+        """
+        Yields chunks with local where array variables are taken for rows of the chunk
+        """
+        names = self.array_variables(compiled, local)
+        start = 0
+        for chunk in chunks:
+            stop = start + len(chunk)
+            chunk_local = self.chunk_local(local, names, slice(start, stop))
+            if not self.is_aligned(chunk_local, names, chunk):
+                self._raise_not_aligned(names)
+            yield chunk, chunk_local
+            start = stop
+        if any(len(local[name]) != start for name in names):
+            self._raise_not_aligned(names)
+
+    def _rows(self, compiled, chunks, local):
+        for chunk, chunk_local in self._chunks(compiled, chunks, local):
+            yield self.evaluator.calculator.execute(compiled.program, chunk, chunk_local)
+
+    def _repeat(self, value, chunks):
+        for _ in chunks:
+            yield value
+
+    def stream(self, compiled, chunks: Iterable[pd.DataFrame], local: dict = None):
+        """
+        Returns generator of results for every chunk of row-wise command, command which doesn't depend
+        on DataFrame gives the same value for every chunk
+        """
+        kind = self._plan(compiled)[0]
+        if kind == REDUCED:
+            raise Exception(('Command "{command}" has reductions, its chunks are combined by reduce_stream')
+                            .format(command=compiled.command))
+        if kind == SCALAR:
+            return self._repeat(compiled.evaluate(None, local), chunks)
+        return self._rows(compiled, chunks, local)
+
+    def reduce(self, compiled, chunks: Iterable[pd.DataFrame], local: dict = None):
+        """
+        Returns result of command with reductions combined from every chunk
+        """
+        kind, _, reductions, _ = self._plan(compiled)
+        if kind == ROWS:
+            raise Exception(('Command "{command}" gives value for every row, its chunks are calculated by solve_stream')
+                            .format(command=compiled.command))
+        if kind == SCALAR:
+            return compiled.evaluate(None, local)
+
+        totals = [None] * len(reductions[0])
+        for chunk, chunk_local in self._chunks(compiled, chunks, local):
+            if len(chunk):
+                totals = self.combine(totals, self.partials(compiled, chunk, chunk_local))
+        return self.finish(compiled, totals, local)
@@ -0,0 +1,203 @@
+from numbers import Number
+from weakref import WeakKeyDictionary
+
+import numpy as np
+import pandas as pd
+
+from safe_evaluation.constants import TypeOfCommand
+from safe_evaluation.preprocessing import Lambda
+
+
+class Vectorizer:
+    """
+    Runs element-wise lambda functions over the whole column at once.
+    Body of lambda is vectorized if it contains only operators, numbers, local variables,
+    numpy universal functions and if/else, otherwise None is returned and lambda is applied row by row.
+    """
+
+    # operations where numpy semantics differ from python for bool or big int operands
+    arithmetic = {'+', '-', '*', '/', '//', '%', '**'}
+    # float64 represents integers exactly only up to this bound
+    exact_bound = 2 ** 53
+    int_bound = 2 ** 63
+
+    def __init__(self, evaluator):
+        self.evaluator = evaluator
+        self._plans = WeakKeyDictionary()
+
+    def _plan(self, body):
+        """
+        Returns program of lambda body with vectorizable elements or None
+        """
+        if body not in self._plans:
+            self._plans[body] = self._plan_program(body.program, body.parameters)
+        return self._plans[body]
+
+    def _plan_program(self, program, parameters):
+        plan = []
+        for element in program:
+            if isinstance(element, str):
+                if element in ('~', 'in'):
+                    return None
+                plan.append(element)
+            elif element[0] in (TypeOfCommand.ARGUMENT, TypeOfCommand.STORE, TypeOfCommand.LOAD):
+                plan.append(element)
+            elif element[0] == TypeOfCommand.VALUE and isinstance(element[1], Number):
+                plan.append(element)
+            elif element[0] == TypeOfCommand.VARIABLE:
+                plan.append(element)
+            elif element[0] == TypeOfCommand.FUNCTION_EXECUTABLE:
+                try:
+                    function = self.evaluator.handle_function(element[1])
+                except Exception:
+                    return None
+                if not isinstance(function, np.ufunc) or element[3]:
+                    return None
+                args = [self._plan_program(arg, parameters) for arg in element[2]]
+                if None in args:
+                    return None
+                plan.append((TypeOfCommand.FUNCTION_EXECUTABLE, function, args))
+            elif element[0] == TypeOfCommand.CONDITION and element[2]:
+                body, orelse = self._plan_program(element[1], parameters), self._plan_program(element[2], parameters)
+                if body is None or orelse is None:
+                    return None
+                plan.append((TypeOfCommand.CONDITION, body, orelse))
+            else:
+                return None
+        return plan
+
+    def _as_number(self, value):
+        if isinstance(value, np.ndarray) and value.dtype.kind == 'b':
+            return value.astype(np.int64)
+        return value
+
+    def _magnitude(self, value):
+        if isinstance(value, np.ndarray):
+            return max(abs(int(value.max())), abs(int(value.min()))) if value.size else 0
+        return abs(value)
+
+    def _check_exact(self, op, l, r):
+        """
+        Raises OverflowError if integer operation can give different result than python
+        """
+        if op == '/':
+            if self._magnitude(l) >= self.exact_bound or self._magnitude(r) >= self.exact_bound:
+                raise OverflowError(op)
+        elif op in ('+', '-'):
+            if self._magnitude(l) + self._magnitude(r) >= self.int_bound:
+                raise OverflowError(op)
+        elif op == '*':
+            if self._magnitude(l) * self._magnitude(r) >= self.int_bound:
+                raise OverflowError(op)
+        elif op == '**':
+            if float(self._magnitude(l)) ** self._magnitude(r) >= self.int_bound:
+                raise OverflowError(op)
+
+    def _is_integer(self, value):
+        if isinstance(value, np.ndarray):
+            return value.dtype.kind in 'iu'
+        return isinstance(value, (int, np.integer)) and not isinstance(value, bool)
+
+    def _operate(self, op, l, r):
+        if op in self.arithmetic:
+            l, r = self._as_number(l), self._as_number(r)
+            if self._is_integer(l) and self._is_integer(r):
+                self._check_exact(op, l, r)
+        return self.evaluator.operators[op](l, r)
+
+    def _where(self, test, body, orelse, values, local):
+        """
+        Vectorized version of "body if condition else orelse"
+        """
+        if not isinstance(test, np.ndarray):
+            return self._execute(body if test else orelse, values, local)
+        test = test.astype(bool)
+        if test.all():
+            return self._execute(body, values, local)
+        if not test.any():
+            return self._execute(orelse, values, local)
+        value, other = self._execute(body, values, local), self._execute(orelse, values, local)
+        # python keeps bools and numbers in one column as objects
+        if (np.asarray(value).dtype.kind == 'b') != (np.asarray(other).dtype.kind == 'b'):
+            raise TypeError('Bool and number branches')
+        return np.where(test, value, other)
+
+    def _execute(self, plan, values, local):
+        stack = []
+        registers = {}
+        for element in plan:
+            if isinstance(element, str):
+                r = stack.pop()
+                stack.append(self._operate(element, stack.pop(), r))
+            elif element[0] == TypeOfCommand.ARGUMENT:
+                stack.append(values)
+            elif element[0] == TypeOfCommand.STORE:
+                registers[element[1]] = stack[-1]
+            elif element[0] == TypeOfCommand.LOAD:
+                stack.append(registers[element[1]])
+            elif element[0] == TypeOfCommand.VALUE:
+                stack.append(element[1])
+            elif element[0] == TypeOfCommand.VARIABLE:
+                variable = local[element[1]]
+                if not isinstance(variable, Number):
+                    raise TypeError('Only numbers can be used in vectorized lambda')
+                stack.append(variable)
+            elif element[0] == TypeOfCommand.FUNCTION_EXECUTABLE:
+                stack.append(element[1](*[self._execute(arg, values, local) for arg in element[2]]))
+            else:
+                stack.append(self._where(stack.pop(), element[1], element[2], values, local))
+        return stack.pop()
+
+    def _prepare(self, series: pd.Series):
+        """
+        Returns values of series converted to the types python uses for its elements
+        """
+        if not isinstance(series.dtype, np.dtype) or not len(series):
+            return None
+        if series.dtype.kind == 'i' or (series.dtype.kind == 'u' and series.dtype.itemsize < 8):
+            return series.to_numpy(dtype=np.int64)
+        if series.dtype.kind == 'f':
+            return series.to_numpy(dtype=np.float64)
+        return None
+
+    def _apply_series(self, series: pd.Series, plan, local):
+        values = self._prepare(series)
+        if values is None:
+            return None
+        try:
+            with np.errstate(all='raise'):
+                result = self._execute(plan, values, local)
+        except Exception:
+            # row by row calculation raises the error or gives python result
+            return None
+        if isinstance(result, np.ndarray) and result.shape != values.shape:
+            return None
+        return pd.Series(result, index=series.index, name=series.name)
+
+    def apply(self, obj, method: str, args: list, kwargs: dict):
+        """
+        Returns result of obj.method(function) calculated for the whole columns or None
+        """
+        if kwargs or len(args) != 1 or not isinstance(args[0], Lambda) or len(args[0].variables) != 1:
+            return None
+        function = args[0]
+        if isinstance(obj, pd.Series) and method in ('apply', 'map'):
+            series = [obj]
+        elif isinstance(obj, pd.DataFrame) and method == 'map' and obj.columns.is_unique:
+            series = [obj.iloc[:, i] for i in range(obj.shape[1])]
+        else:
+            return None
+
+        plan = self._plan(function.body)
+        if plan is None:
+            return None
+        local = function.local or {}
+        results = []
+        for column in series:
+            result = self._apply_series(column, plan, local)
+            if result is None:
+                return None
+            results.append(result)
+        if isinstance(obj, pd.Series):
+            return results[0]
+        return pd.concat(results, axis=1)
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from safe_evaluation.arrow import ArrowColumn
+
+from tests.base import BaseTestCase
+
+
+class TestArrow(BaseTestCase):
+
+    def _create_table(self):
+        df = pd.DataFrame(data={'a': [1., 5, 3, 4, 7], 'b': [2, 1, 0, 4, 4], 's': list('abcde')})
+        return df, pa.Table.from_pandas(df, preserve_index=False)
+
+    def test_same_results(self):
+        df, table = self._create_table()
+        commands = ["${a} + ${b} * 2", "${b} / 2", "${b} // 2 + ${b} % 3", "(${a} > 2) & (${b} < 3)",
+                    "np.log(${a}) + np.sqrt(${b})", "${a} if ${b} > 1 else ${a} * 10", "${a}.abs() - ${b}",
+                    "${s}.str.upper()", "${b} ** 2", "~(${b} > 1) | (${a} == 7)", "${s} + 'x'", "${b} & 6",
+                    "${a}.apply(lambda v: v * 2)", "np.where(${b} > 1, 1, 0)", "${a}.isna()"]
+        for command in commands:
+            result = self.expression.solve_arrow(command, table)
+            self.assertIsInstance(result, pa.ChunkedArray, command)
+            self.assertEqual(result.to_pylist(), self.expression.solve(command, df).tolist(), command)
+
+    def test_reductions(self):
+        df, table = self._create_table()
+        for command in ["${a}.sum()", "${b}.mean()", "${b}.max() - ${b}.min()", "${b}.count()", "(${b} > 3).any()",
+                        "${a}.std()"]:
+            result = self.expression.solve_arrow(command, table)
+            self.assertNotIsInstance(result, pa.Scalar)
+            self.assertAlmostEqual(result, self.expression.solve(command, df))
+
+    def test_record_batch(self):
+        df, table = self._create_table()
+        result = self.expression.solve_arrow("${a} * x + ${b}", table.to_batches()[0], {'x': 2})
+        self.assertIsInstance(result, pa.Array)
+        self.assertEqual(result.to_pylist(), [4.0, 11.0, 6.0, 12.0, 18.0])
+
+    def test_local_arrays(self):
+        _, table = self._create_table()
+        result = self.expression.solve_arrow("${a} + w", table, {'w': pa.array([1., 1, 1, 1, 2])})
+        self.assertEqual(result.to_pylist(), [2.0, 6.0, 4.0, 5.0, 9.0])
+
+    def test_nulls(self):
+        table = pa.table({'a': pa.array([1.0, None, 3.0]), 'b': pa.array([True, False, None])})
+        self.assertEqual(self.expression.solve_arrow("${a} * 2", table).to_pylist(), [2.0, None, 6.0])
+        self.assertEqual(self.expression.solve_arrow("(${a} > 2) | ${b}", table).to_pylist(), [True, None, True])
+        self.assertEqual(self.expression.solve_arrow("${a}.isna()", table).to_pylist(), [False, True, False])
+
+    def test_division_by_zero(self):
+        df, table = self._create_table()
+        for command in ["${b} // ${b}", "${b} % ${b}", "${a} // ${b}", "7 // ${b}", "${b} // 0", "${b} % 0"]:
+            with np.errstate(all='raise'):
+                result = self.expression.solve_arrow(command, table)
+            self.assertTrue(np.array_equal(result.to_numpy(), self.expression.solve(command, df).to_numpy(),
+                                           equal_nan=True), command)
+
+    def test_contains_and_iteration(self):
+        df, table = self._create_table()
+        for command in ["${b} in x", "${b} in y", "list(${b})", "list(map(lambda v: v * 2, ${a}))"]:
+            self.assertEqual(self.expression.solve_arrow(command, table, {'x': 1, 'y': 10}),
+                             self.expression.solve(command, df, {'x': 1, 'y': 10}), command)
+
+    def test_zero_copy(self):
+        values = np.arange(10.0)
+        column = ArrowColumn(pa.chunked_array([pa.array(values)]))
+        self.assertTrue(np.shares_memory(column.to_numpy(), np.asarray(column.data.chunk(0))))
+
+    def test_errors(self):
+        df, table = self._create_table()
+        with self.assertRaises(Exception):
+            self.expression.solve_arrow("${a} + 1", df)
+        with self.assertRaises(KeyError):
+            self.expression.solve_arrow("${missing} + 1", table)
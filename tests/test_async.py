@@ -0,0 +1,161 @@
+import asyncio
+import threading
+import time
+
+import pandas as pd
+
+from safe_evaluation import AsyncEvaluator, Evaluator
+from safe_evaluation.settings import Settings
+
+from tests.base import BaseTestCase
+
+
+class Slow:
+    """
+    Variable which calculation takes time
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    @property
+    def value(self):
+        time.sleep(self.seconds)
+        return 1
+
+
+class Tracked(Slow):
+    """
+    Slow variable counting calculations running at once
+    """
+
+    lock = threading.Lock()
+    active = 0
+    most = 0
+
+    @property
+    def value(self):
+        with Tracked.lock:
+            Tracked.active += 1
+            Tracked.most = max(Tracked.most, Tracked.active)
+        try:
+            return super().value
+        finally:
+            with Tracked.lock:
+                Tracked.active -= 1
+
+
+class TestAsync(BaseTestCase):
+
+    def _run(self, coroutine):
+        return asyncio.run(coroutine)
+
+    def test_solve(self):
+        async def main():
+            async with AsyncEvaluator() as evaluator:
+                df, _ = self._create_df()
+                result = await evaluator.solve("${col1} * x", df, local={'x': 2})
+                self.assertTrue(result.equals(df['col1'] * 2))
+                results = await asyncio.gather(*[evaluator.solve("x ** 2", local={'x': i}) for i in range(20)])
+                self.assertEqual(results, [i ** 2 for i in range(20)])
+        self._run(main())
+
+    def test_solve_many(self):
+        async def main():
+            async with AsyncEvaluator() as evaluator:
+                df = pd.DataFrame(data={'a': [1, 2]})
+                result = await evaluator.solve_many({'s': "${a} + 1", 'm': "${a}.mean()"}, df, as_frame=True)
+                self.assertTrue(result.equals(pd.DataFrame(data={'s': [2, 3], 'm': [1.5, 1.5]})))
+        self._run(main())
+
+    def test_shared_cache(self):
+        sync = Evaluator()
+        sync.solve("x + 1", local={'x': 1})
+
+        async def main():
+            async with AsyncEvaluator(sync) as evaluator:
+                self.assertEqual(await evaluator.solve("x + 1", local={'x': 2}), 3)
+        self._run(main())
+        self.assertEqual(sync.cache_info().currsize, 1)
+
+    def test_timeout(self):
+        async def main():
+            async with AsyncEvaluator(timeout=0.05) as evaluator:
+                with self.assertRaises(asyncio.TimeoutError):
+                    await evaluator.solve("slow.value", local={'slow': Slow(0.5)})
+                self.assertEqual(await evaluator.solve("slow.value", local={'slow': Slow(0)}, timeout=1), 1)
+        self._run(main())
+
+    def test_concurrency(self):
+        async def main():
+            async with AsyncEvaluator(max_workers=4, concurrency=1) as evaluator:
+                start = time.perf_counter()
+                await asyncio.gather(*[evaluator.solve("slow.value", local={'slow': Slow(0.05)}) for _ in range(3)])
+                self.assertGreaterEqual(time.perf_counter() - start, 0.15)
+        self._run(main())
+
+    def test_concurrency_after_timeout(self):
+        async def main():
+            async with AsyncEvaluator(max_workers=4, concurrency=1, timeout=0.02) as evaluator:
+                results = await asyncio.gather(*[evaluator.solve("slow.value", local={'slow': Tracked(0.1)})
+                                                 for _ in range(3)], return_exceptions=True)
+                self.assertTrue(all(isinstance(result, asyncio.TimeoutError) for result in results))
+                self.assertEqual(await evaluator.solve("slow.value", local={'slow': Tracked(0)}, timeout=1), 1)
+                self.assertEqual(Tracked.most, 1)
+        self._run(main())
+
+    def test_timeout_stops_calculation(self):
+        df = pd.DataFrame(data={'a': range(200_000)})
+
+        async def main():
+            async with AsyncEvaluator(max_workers=1, concurrency=1) as evaluator:
+                start = time.perf_counter()
+                with self.assertRaises(asyncio.TimeoutError):
+                    await evaluator.solve("${a}.apply(lambda v: str(v) + str(v))", df, timeout=0.05)
+                # the slot is free once the started calculation has stopped by limit of time
+                self.assertEqual(await evaluator.solve("1 + 1", timeout=5), 2)
+                self.assertLess(time.perf_counter() - start, 0.5)
+        self._run(main())
+
+    def test_cancel(self):
+        async def main():
+            async with AsyncEvaluator(max_workers=1) as evaluator:
+                first = asyncio.ensure_future(evaluator.solve("slow.value", local={'slow': Slow(0.1)}))
+                second = asyncio.ensure_future(evaluator.solve("slow.value", local={'slow': Slow(0.1)}))
+                await asyncio.sleep(0.01)
+                second.cancel()
+                self.assertEqual(await first, 1)
+                with self.assertRaises(asyncio.CancelledError):
+                    await second
+        self._run(main())
+
+    def test_settings(self):
+        sync = Evaluator()
+        sync.change_settings(Settings(forbidden_funcs=['np.abs']))
+
+        async def main():
+            async with AsyncEvaluator(sync) as evaluator:
+                with self.assertRaises(Exception):
+                    await evaluator.solve("np.abs(x)", local={'x': 1})
+        self._run(main())
+
+    def test_syntax_error(self):
+        async def main():
+            async with AsyncEvaluator() as evaluator:
+                with self.assertRaises(Exception):
+                    await evaluator.solve("(1 + 2")
+        self._run(main())
+
+    def test_process_executor(self):
+        async def main():
+            async with AsyncEvaluator(executor='process', max_workers=1) as evaluator:
+                df = pd.DataFrame(data={'a': [1, 4]})
+                result = await evaluator.solve("np.sqrt(${a})", df)
+                self.assertEqual(result.tolist(), [1., 2.])
+                self.assertEqual(await evaluator.solve_many(["x + 1", "x * 2"], local={'x': 3}),
+                                 {"x + 1": 4, "x * 2": 6})
+        self._run(main())
+
+    def test_unknown_executor(self):
+        with self.assertRaises(ValueError):
+            AsyncEvaluator(executor='fiber')
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+import polars as pl
+
+from safe_evaluation import BaseBackend, Evaluator
+
+from tests.base import BaseTestCase
+
+
+class TestPolarsBackend(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.fallbacks = []
+        self.polars = Evaluator()
+        self.polars.enable_backend('polars', min_rows=0,
+                                   on_fallback=lambda compiled, error: self.fallbacks.append(error))
+
+    def _create_frame(self):
+        return pd.DataFrame(data={
+            'a': [1., 5, 3, np.nan, 7], 'b': [2, 1, 0, 4, 4], 's': [' ab', 'Cd ', 'ef', 'gh', 'ij'],
+            't': pd.date_range('2024-01-01', periods=5, freq='37h'),
+        }, index=[10, 11, 12, 13, 14])
+
+    def test_same_results(self):
+        df = self._create_frame()
+        commands = ["${a} + ${b} * 2", "${b} / 2", "${b} // 2 + ${b} % 3", "(${a} > 2) & (${b} < 3)",
+                    "np.log(${a}) + np.sqrt(${b})", "${a} if ${b} > 1 else ${a} * 10", "${a}.abs() - ${b}",
+                    "${s}.str.strip().str.upper()", "${s}.str.len()", "${a}.fillna(0)", "${b} ** 2",
+                    "~(${b} > 1)", "${a} != 3", "${b}.isin([1, 4])", "${a}.round(1) * x", "${b}.between(1, 3)",
+                    "${a}.cumsum()", "${t}.dt.year * 10 + ${t}.dt.weekday", "${t}.dt.strftime('%Y-%m')",
+                    "${a} - ${a}.mean()"]
+        for command in commands:
+            pd.testing.assert_series_equal(self.polars.solve(command, df, {'x': 2}),
+                                           self.expression.solve(command, df, {'x': 2}), check_names=False)
+        self.assertEqual(self.fallbacks, [])
+
+    def test_nan(self):
+        df = self._create_frame()
+        for command in ["np.isnan(${a})", "np.isnan(${a} / ${b})", "np.isnan(${b} / ${b} - 1)", "~np.isnan(${a})"]:
+            result = self.polars.solve(command, df)
+            self.assertEqual(result.dtype, bool, command)
+            pd.testing.assert_series_equal(result, self.expression.solve(command, df), check_names=False)
+        self.assertEqual(self.fallbacks, [])
+
+    def test_nulls_and_conditions(self):
+        df = self._create_frame()
+        df['s'] = pd.Series([' ab', None, 'ef', np.nan, 'bj'], index=df.index, dtype='str')
+        for command in ["${s}.str.contains('b')", "${s}.str.startswith('e')", "~${s}.str.endswith('j')",
+                        "${a} if ${b} > 1 else 0", "0 if ${b} > 1 else ${a}", "${a} * 2 if ${b} > 1 else ${a}",
+                        "${b} if ${b} > 1 else ${b} * 2", "1 if ${b} > 1 else 0", "${s}.str.upper()"]:
+            pd.testing.assert_series_equal(self.polars.solve(command, df), self.expression.solve(command, df),
+                                           obj=command)
+        self.assertEqual(self.fallbacks, [])
+
+    def test_reductions(self):
+        df = self._create_frame()
+        for command in ["${a}.sum()", "${b}.mean()", "${b}.max() - ${b}.min()", "${a}.count()", "${a}.std()",
+                        "np.sum(${b} * 2)"]:
+            self.assertAlmostEqual(self.polars.solve(command, df), self.expression.solve(command, df))
+        self.assertEqual(self.fallbacks, [])
+
+    def test_fallback(self):
+        df = self._create_frame()
+        for command, node in [("${a}.apply(lambda v: v * 2) + 1", 'lambda v:  v * 2'),
+                              ("${b} ** y", '(${b} ** y)'),
+                              ("${__df}.count()", '${__df}'),
+                              ("${b}.rolling(2).sum()", '${b}.rolling(2)')]:
+            result = self.polars.solve(command, df, {'y': -1.0})
+            expected = self.expression.solve(command, df, {'y': -1.0})
+            self.assertTrue(result.equals(expected))
+            self.assertEqual(self.fallbacks[-1].node, node)
+            self.assertIs(self.polars.backend.fallbacks[self.polars.compile(command)], self.fallbacks[-1])
+        self.assertIsNone(self.polars.backend.explain(self.polars.compile("${a} * 2")))
+        self.assertIn('Lambda', str(self.polars.backend.explain(self.polars.compile("${a}.apply(lambda v: v)"))))
+
+    def test_polars_frames(self):
+        df = self._create_frame()
+        frame = pl.from_pandas(df)
+        result = self.polars.solve("${a} * 2 if ${b} > 1 else 0", frame.lazy())
+        self.assertIsInstance(result, pl.Series)
+        self.assertEqual(result.to_list(), [2.0, 0.0, 0.0, None, 14.0])
+        self.assertEqual(self.polars.solve("${b}.sum()", frame), 11)
+        # fallback converts frame to pandas
+        self.assertEqual(self.polars.solve("${b}.apply(lambda v: v + 1).sum()", frame), 16)
+
+    def test_expression(self):
+        frame = pl.from_pandas(self._create_frame()).lazy()
+        expression = self.polars.backend.expression(self.polars.compile("${b} > x"), {'x': 1})
+        self.assertEqual(frame.filter(expression).collect()['b'].to_list(), [2, 4, 4])
+
+    def test_small_frames(self):
+        evaluator = Evaluator()
+        evaluator.enable_backend(min_rows=100)
+        self.assertFalse(evaluator.backend.accepts(self._create_frame()))
+        self.assertTrue(evaluator.solve("${b} + 1", self._create_frame()).equals(self._create_frame()['b'] + 1))
+
+    def test_custom_backend(self):
+        class Doubling(BaseBackend):
+            def translate(self, compiled, local=None):
+                return compiled
+
+            def run(self, plan, compiled, df):
+                return self.evaluator.calculator.execute(plan.program, df, None) * 2
+
+        evaluator = Evaluator()
+        evaluator.enable_backend(Doubling(evaluator, min_rows=0))
+        self.assertEqual(evaluator.solve("${b}.sum()", self._create_frame()), 22)
+        with self.assertRaises(Exception):
+            evaluator.enable_backend('unknown')
@@ -0,0 +1,66 @@
+from safe_evaluation import Evaluator
+from safe_evaluation.cache import ExpressionCache
+from safe_evaluation.settings import Settings
+
+from tests.base import BaseTestCase
+
+
+class TestCache(BaseTestCase):
+
+    def test_hit(self):
+        evaluator = Evaluator()
+        evaluator.solve("2 + 2")
+        evaluator.solve("2 + 2")
+        info = evaluator.cache_info()
+        self.assertEqual((info.hits, info.misses, info.currsize), (1, 1, 1))
+
+    def test_same_compiled_expression(self):
+        evaluator = Evaluator()
+        self.assertIs(evaluator.compile("x + 1"), evaluator.compile("x + 1"))
+
+    def test_data_independent(self):
+        evaluator = Evaluator()
+        df, columns = self._create_df()
+        command = "${col1}.apply(lambda v: 1 if v < 3 else 2)"
+        self.assertEqual(evaluator.solve(command, df).values.tolist(), [1, 1, 1, 1, 2, 2, 2])
+        self.assertEqual(evaluator.solve(command, df.tail(2)).values.tolist(), [2, 2])
+        self.assertEqual(evaluator.solve("0 if v < 9 else 10", local={'v': 5}), 0)
+        self.assertEqual(evaluator.solve("0 if v < 9 else 10", local={'v': 10}), 10)
+
+    def test_eviction(self):
+        evaluator = Evaluator(cache_size=2)
+        for command in ("1 + 1", "1 + 2", "1 + 3"):
+            evaluator.solve(command)
+        info = evaluator.cache_info()
+        self.assertEqual((info.evictions, info.currsize), (1, 2))
+
+    def test_least_recently_used_evicted(self):
+        cache = ExpressionCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+
+    def test_disabled(self):
+        evaluator = Evaluator(cache_size=0)
+        evaluator.solve("2 + 2")
+        evaluator.solve("2 + 2")
+        info = evaluator.cache_info()
+        self.assertEqual((info.hits, info.currsize), (0, 0))
+
+    def test_change_settings_invalidates(self):
+        evaluator = Evaluator()
+        evaluator.solve("list(filter(lambda x: x < 0, [-1,0,1]))")
+        evaluator.change_settings(Settings(allowed_funcs=['list']))
+        self.assertEqual(evaluator.cache_info().currsize, 0)
+        with self.assertRaises(Exception):
+            evaluator.solve("list(filter(lambda x: x < 0, [-1,0,1]))")
+
+    def test_settings_in_key(self):
+        evaluator = Evaluator()
+        evaluator.solve("np.mean")
+        evaluator.settings.forbidden_funcs = ['np.mean']
+        with self.assertRaises(Exception):
+            evaluator.solve("np.mean")
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+from safe_evaluation.constants import TypeOfCommand
+
+from tests.base import BaseTestCase
+
+
+class TestCommonSubexpressions(BaseTestCase):
+
+    def _count(self, compiled, type_of_command):
+        return sum(1 for element in compiled.program if isinstance(element, tuple) and element[0] == type_of_command)
+
+    def test_shared_subtree(self):
+        compiled = self.expression.compile("(${col1} - ${col2}).abs() / (${col1} - ${col2}).std() + "
+                                           "(${col1} - ${col2}) ** 2")
+        self.assertEqual(compiled.program.count('-'), 1)
+        self.assertEqual(compiled.shared_nodes(), [('(${col1} - ${col2})', 3)])
+        df, _ = self._create_df()
+        diff = df['col1'] - df['col2']
+        self.assertTrue(compiled.evaluate(df).equals(diff.abs() / diff.std() + diff ** 2))
+
+    def test_biggest_subtree_is_shared(self):
+        compiled = self.expression.compile("(x * 2 + 1) + (x * 2 + 1) ** 2")
+        self.assertEqual(compiled.shared_nodes(), [('((x * 2) + 1)', 2)])
+        self.assertEqual(compiled.evaluate(local={'x': 1}), 12)
+
+    def test_different_types_are_not_shared(self):
+        compiled = self.expression.compile("(x + 1) * (x + 1.0) * (x + True)")
+        self.assertEqual(compiled.shared_nodes(), [])
+        self.assertEqual(compiled.evaluate(local={'x': 1}), 8.0)
+
+    def test_impure_methods_are_not_shared(self):
+        compiled = self.expression.compile("${col1}.sample(3) + ${col1}.sample(3)")
+        self.assertEqual(compiled.shared_nodes(), [('${col1}', 2)])
+
+    def test_branches_are_lazy(self):
+        compiled = self.expression.compile("x / y + 1 if y else x / y")
+        self.assertEqual(self._count(compiled, TypeOfCommand.LOAD), 0)
+        self.assertEqual(compiled.evaluate(local={'x': 4, 'y': 2}), 3)
+        with self.assertRaises(ZeroDivisionError):
+            compiled.evaluate(local={'x': 4, 'y': 0})
+
+    def test_shared_inside_branch(self):
+        compiled = self.expression.compile("(x - 1) * (x - 1) if x else 0")
+        self.assertEqual(compiled.shared_nodes(), [])
+        self.assertEqual(compiled.program[-1][1].count('-'), 1)
+        self.assertEqual(compiled.evaluate(local={'x': 3}), 4)
+
+    def test_shared_in_lambda(self):
+        df = pd.DataFrame(data={'a': [1, 2, 3]})
+        result = self.expression.solve("${a}.apply(lambda v: (v + 1) * (v + 1))", df)
+        self.assertEqual(result.tolist(), [4, 9, 16])
+        result = self.expression.solve("${a}.apply(lambda v: str(v + 1) + str(v + 1))", df)
+        self.assertEqual(result.tolist(), ['22', '33', '44'])
+
+    def test_long_arrays(self):
+        # folded arrays longer than 1000 elements have equal shortened repr
+        ones = [1] * 1500
+        other = ones[:700] + [0] + ones[701:]
+        df = pd.DataFrame(data={'v': np.ones(1500)})
+        first, second = f"(np.equal({ones}, 1) * ${{v}}).sum()", f"(np.equal({other}, 1) * ${{v}}).sum()"
+        self.assertEqual(self.expression.solve(f"{first} - {second}", df), 1)
+        self.assertEqual(list(self.expression.solve_many([first, second], df).values()), [1500, 1499])
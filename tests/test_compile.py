@@ -0,0 +1,68 @@
+import pandas as pd
+
+from safe_evaluation import CompiledExpression
+
+from tests.base import BaseTestCase
+
+
+class TestCompile(BaseTestCase):
+
+    def test_compile_returns_expression(self):
+        compiled = self.expression.compile("2 + 2")
+        self.assertIsInstance(compiled, CompiledExpression)
+        self.assertEqual(compiled.evaluate(), 4)
+
+    def test_compile_different_dfs(self):
+        compiled = self.expression.compile("${col1} + ${col2}")
+        df1 = pd.DataFrame(data={'col1': [1, 2], 'col2': [3, 4]})
+        df2 = pd.DataFrame(data={'col1': [10], 'col2': [20]})
+        self.assertEqual(compiled.evaluate(df1).values.tolist(), [4, 6])
+        self.assertEqual(compiled.evaluate(df2).values.tolist(), [30])
+
+    def test_compile_different_locals(self):
+        compiled = self.expression.compile("2 * x - y")
+        self.assertEqual(compiled.evaluate(local={'x': 2, 'y': 3}), 1)
+        self.assertEqual(compiled.evaluate(local={'x': 5, 'y': 1}), 9)
+
+    def test_compile_long_variable_names(self):
+        compiled = self.expression.compile("price * amount")
+        self.assertEqual(compiled.evaluate(local={'price': 2, 'amount': 3}), 6)
+
+    def test_compile_variables_named_as_functions(self):
+        self.assertEqual(self.expression.solve("x + list", local={'x': 1, 'list': 2}), 3)
+        self.assertEqual(self.expression.solve("str", local={'str': 2}), 2)
+        self.assertIs(self.expression.solve("str"), str)
+        self.assertEqual(self.expression.solve("x * float", local={'x': 2, 'float': 1.5}), 3)
+
+    def test_compile_missing_variable(self):
+        compiled = self.expression.compile("x + 1")
+        with self.assertRaises(Exception):
+            compiled.evaluate(local={'y': 1})
+
+    def test_compile_if_else(self):
+        compiled = self.expression.compile("0 if v < 9 else 10")
+        self.assertEqual(compiled.evaluate(local={'v': 5}), 0)
+        self.assertEqual(compiled.evaluate(local={'v': 15}), 10)
+
+    def test_compile_apply(self):
+        df, columns = self._create_df()
+        compiled = self.expression.compile("${col1}.apply(lambda v: v ** 2 > 4)")
+        self.assertEqual(compiled.evaluate(df).values.tolist(), [False, False, False, False, True, True, True])
+        self.assertEqual(compiled.evaluate(df.head(2)).values.tolist(), [False, False])
+
+    def test_compile_lambda(self):
+        function = self.expression.compile("lambda x: x + y").evaluate(local={'y': 10})
+        self.assertEqual(list(map(function, [0, 1])), [10, 11])
+
+    def test_compile_wrong_parentheses(self):
+        with self.assertRaises(Exception):
+            self.expression.compile("(2 + 2")
+
+    def test_compile_wrong_operation(self):
+        with self.assertRaises(Exception):
+            self.expression.compile("2 +")
+
+    def test_compile_immutable(self):
+        compiled = self.expression.compile("2 + 2")
+        with self.assertRaises(AttributeError):
+            compiled.program = ()
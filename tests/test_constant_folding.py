@@ -0,0 +1,62 @@
+import numpy as np
+
+from safe_evaluation import Evaluator
+from safe_evaluation.constants import TypeOfCommand
+from safe_evaluation.settings import Settings
+
+from tests.base import BaseTestCase
+
+
+class TestConstantFolding(BaseTestCase):
+
+    def test_fold_operators(self):
+        compiled = self.expression.compile("${col1} * (1 + 0.2) / 100")
+        self.assertEqual(compiled.program, ((TypeOfCommand.COLUMN, 'col1'), (TypeOfCommand.VALUE, 1.2), '*',
+                                            (TypeOfCommand.VALUE, 100), '/'))
+        df, _ = self._create_df()
+        self.assertTrue(compiled.evaluate(df).equals(df['col1'] * 1.2 / 100))
+
+    def test_fold_whole_expression(self):
+        compiled = self.expression.compile("2 ** 10 - int('24')")
+        self.assertEqual(compiled.program, ((TypeOfCommand.VALUE, 1000),))
+
+    def test_fold_numpy_function(self):
+        compiled = self.expression.compile("np.log(10) * x")
+        self.assertEqual(compiled.program, ((TypeOfCommand.VALUE, np.log(10)), (TypeOfCommand.VARIABLE, 'x'), '*'))
+        self.assertEqual(compiled.evaluate(local={'x': 2}), np.log(10) * 2)
+
+    def test_mutable_values_are_not_folded(self):
+        compiled = self.expression.compile("np.sqrt([1, 4, 9])")
+        self.assertEqual(compiled.program[0][0], TypeOfCommand.FUNCTION_EXECUTABLE)
+        result = self.expression.solve("np.sqrt([1, 4, 9])")
+        result[0] = 100
+        self.assertEqual(self.expression.solve("np.sqrt([1, 4, 9])").tolist(), [1., 2., 3.])
+
+    def test_not_pure_function(self):
+        compiled = self.expression.compile("list(range(3))")
+        self.assertEqual(compiled.program[0][0], TypeOfCommand.FUNCTION_EXECUTABLE)
+        self.assertIsNot(compiled.evaluate(), compiled.evaluate())
+
+    def test_forbidden_function(self):
+        evaluator = Evaluator()
+        evaluator.change_settings(Settings(forbidden_funcs=['np.log']))
+        compiled = evaluator.compile("np.log(10)")
+        self.assertEqual(compiled.program[0][0], TypeOfCommand.FUNCTION_EXECUTABLE)
+        with self.assertRaises(Exception):
+            compiled.evaluate()
+
+    def test_errors_are_raised_on_evaluation(self):
+        compiled = self.expression.compile("1 if x > 0 else 1 / 0")
+        self.assertEqual(compiled.evaluate(local={'x': 1}), 1)
+        with self.assertRaises(ZeroDivisionError):
+            compiled.evaluate(local={'x': 0})
+
+    def test_fold_condition(self):
+        self.assertEqual(self.expression.compile("2 if 1 > 0 else ${col1}").program, ((TypeOfCommand.VALUE, 2),))
+        self.assertEqual(self.expression.compile("2 if 1 < 0 else 3 * 2").program, ((TypeOfCommand.VALUE, 6),))
+        self.assertEqual(self.expression.compile("2 if 1 < 0").program, ((TypeOfCommand.VALUE, None),))
+
+    def test_big_values_are_not_folded(self):
+        compiled = self.expression.compile("[1, 2] * 10 ** 4")
+        self.assertEqual(compiled.program, ((TypeOfCommand.VALUE, (1, 2)), (TypeOfCommand.VALUE, 10000), '*'))
+        self.assertEqual(self.expression.compile("10 ** 10 ** 10").program[-1], '**')
@@ -0,0 +1,179 @@
+import gc
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from safe_evaluation import Evaluator
+from safe_evaluation.constants import TypeOfCommand
+from safe_evaluation.disk_cache import DiskCache, SUFFIX
+from safe_evaluation.preprocessing import Preprocessor
+from safe_evaluation.settings import Settings
+
+from tests.base import BaseTestCase
+
+
+class CountingPreprocessor(Preprocessor):
+    """
+    Counts parsed commands
+    """
+
+    def __init__(self, evaluator):
+        super().__init__(evaluator)
+        self.parsed = []
+
+    def prepare(self, command, df, local):
+        self.parsed.append(command)
+        return super().prepare(command, df, local)
+
+
+def _compile_and_flush(path, start, count):
+    """
+    Compiles commands in other process, every one is written to the file at once
+    """
+    evaluator = Evaluator()
+    evaluator.enable_disk_cache(path, flush_every=1)
+    for number in range(start, start + count):
+        evaluator.compile(f"x + {number}")
+    evaluator.disable_disk_cache()
+
+
+class TestDiskCache(BaseTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = self.directory.name
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _evaluator(self, settings=None):
+        evaluator = Evaluator(preprocessor=CountingPreprocessor)
+        if settings is not None:
+            evaluator.change_settings(settings)
+        evaluator.enable_disk_cache(self.path)
+        return evaluator
+
+    def test_commands_are_not_parsed_again(self):
+        df, _ = self._create_df()
+        commands = ["${col1} * 2 + ${col2}.mean()", "${col1}.apply(lambda v: v + 1 if v > 1 else v)"]
+        first = self._evaluator()
+        results = [first.solve(command, df) for command in commands]
+        first.disable_disk_cache()
+
+        second = self._evaluator()
+        for command, result in zip(commands, results):
+            self.assertTrue(second.solve(command, df).equals(result))
+        self.assertEqual(second.preprocessor.parsed, [])
+        second.disable_disk_cache()
+
+    def test_pending_expressions(self):
+        evaluator = self._evaluator()
+        evaluator.compile("x + 1")
+        self.assertEqual(os.listdir(self.path), [])
+        evaluator.cache.clear()
+        evaluator.compile("x + 1")
+        self.assertEqual(evaluator.preprocessor.parsed, ["x + 1"])
+        evaluator.disable_disk_cache()
+        self.assertEqual(len(os.listdir(self.path)), 1)
+
+    def test_flush_every(self):
+        evaluator = Evaluator()
+        evaluator.enable_disk_cache(self.path, flush_every=2)
+        evaluator.compile("x + 1")
+        self.assertEqual(os.listdir(self.path), [])
+        evaluator.compile("x + 2")
+        self.assertEqual(len(os.listdir(self.path)), 1)
+        evaluator.disable_disk_cache()
+
+    def test_files_are_merged(self):
+        first, second = self._evaluator(), self._evaluator()
+        first.compile("x + 1")
+        second.compile("x + 2")
+        first.disable_disk_cache()
+        second.disable_disk_cache()
+
+        third = self._evaluator()
+        third.compile("x + 1")
+        third.compile("x + 2")
+        self.assertEqual(third.preprocessor.parsed, [])
+        third.disable_disk_cache()
+
+    def test_flush_of_processes(self):
+        with ProcessPoolExecutor(max_workers=4) as executor:
+            for future in [executor.submit(_compile_and_flush, self.path, start, 25) for start in range(0, 100, 25)]:
+                future.result()
+        evaluator = self._evaluator()
+        for number in range(100):
+            evaluator.compile(f"x + {number}")
+        self.assertEqual(evaluator.preprocessor.parsed, [])
+        evaluator.disable_disk_cache()
+
+    def test_flush_on_collection(self):
+        evaluator = self._evaluator()
+        evaluator.compile("x + 5")
+        del evaluator
+        gc.collect()
+        self.assertEqual(len(os.listdir(self.path)), 1)
+        other = self._evaluator()
+        other.compile("x + 5")
+        self.assertEqual(other.preprocessor.parsed, [])
+        other.disable_disk_cache()
+
+    def test_file_written_by_other_process(self):
+        reader = self._evaluator()
+        reader.compile("x + 3")
+        writer = self._evaluator()
+        writer.compile("x + 4")
+        writer.disable_disk_cache()
+        # the file mapped by reader is replaced
+        reader.compile("x + 4")
+        self.assertEqual(reader.preprocessor.parsed, ["x + 3"])
+        reader.disable_disk_cache()
+
+    def test_settings(self):
+        first = self._evaluator()
+        first.compile("${__df}")
+        first.disable_disk_cache()
+
+        second = self._evaluator(Settings(df_name='frame'))
+        second.compile("${__df}")
+        self.assertEqual(second.preprocessor.parsed, ["${__df}"])
+        second.disable_disk_cache()
+        self.assertEqual(len(os.listdir(self.path)), 2)
+
+    def test_fusion(self):
+        df, _ = self._create_df()
+        command = "${col1} * 2 + ${col2} > 3"
+        first = self._evaluator()
+        first.enable_fusion(min_rows=0)
+        fused = first.solve(command, df)
+        first.disable_disk_cache()
+
+        second = self._evaluator()
+        self.assertTrue(second.solve(command, df).equals(fused))
+        self.assertEqual(second.preprocessor.parsed, [command])
+        self.assertNotIn(TypeOfCommand.KERNEL, [element[0] for element in second.compile(command).program
+                                                if isinstance(element, tuple)])
+        second.disable_disk_cache()
+        self.assertEqual(len(os.listdir(self.path)), 2)
+
+    def test_other_versions(self):
+        stale = os.path.join(self.path, f'0000000000000000-0000000000000000{SUFFIX}')
+        with open(stale, 'wb') as file:
+            file.write(b'old format')
+        evaluator = self._evaluator()
+        evaluator.compile("x + 1")
+        self.assertEqual(evaluator.preprocessor.parsed, ["x + 1"])
+        evaluator.disk_cache.prune()
+        self.assertFalse(os.path.exists(stale))
+        evaluator.disable_disk_cache()
+
+    def test_clear(self):
+        cache = DiskCache(Evaluator(), self.path)
+        cache.put(self.expression.compile("x + 1"), self.expression.current_settings())
+        cache.flush()
+        self.assertEqual(len(os.listdir(self.path)), 1)
+        cache.clear()
+        self.assertEqual(os.listdir(self.path), [])
+        self.assertIsNone(cache.get("x + 1", (), self.expression.current_settings()))
+        cache.close()
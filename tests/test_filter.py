@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+
+from safe_evaluation import Evaluator
+
+from tests.base import BaseTestCase
+
+
+class TestFilter(BaseTestCase):
+
+    def _create_people(self, rows=1000):
+        generator = np.random.default_rng(0)
+        return pd.DataFrame({
+            'age': generator.integers(0, 90, rows),
+            'country': generator.choice(['DE', 'FR', 'US', 'GB', 'PL'], rows),
+            'income': generator.random(rows) * 1e5,
+            'name': generator.choice(['anna', 'bob', 'carl'], rows),
+        }, index=np.arange(rows) * 3)
+
+    def test_same_rows(self):
+        df = self._create_people()
+        df.loc[df.index[::7], 'income'] = np.nan
+        commands = ["(${age} > 30) & (${country} == 'DE')",
+                    "(${name}.str.upper() == 'BOB') & (${income} > 90000)",
+                    "(${age} < 5) | ((${income} > 95000) & ~(${country} == 'US'))",
+                    "(${age} > 30) & (${income} > ${income}.mean())",
+                    "(${age} > x) & ${country}.isin(['DE', 'FR']) & (${income}.fillna(0) < 50000)",
+                    "${age} == 40",
+                    "(${age} > 100) & (${country} == 'DE')",
+                    "(x > 1) | (${age} == 3)",
+                    "(${age} * 2 if ${country} == 'DE' else ${age}) > 100"]
+        for command in commands:
+            expected = df[self.expression.solve(command, df, {'x': 20})]
+            self.assertTrue(self.expression.filter(command, df, {'x': 20}).equals(expected), command)
+            self.assertTrue(self.expression.filter(command, df, {'x': 20}, as_index=True).equals(expected.index))
+
+    def test_array_variables(self):
+        df = self._create_people()
+        for limit in (pd.Series(df['income'].to_numpy()[::-1], index=df.index), df['income'].to_numpy()[::-1]):
+            for command in ["(${age} == 5) & (${income} <= s)", "(${age} < 50) | (${income} > s * 2)"]:
+                expected = df[self.expression.solve(command, df, {'s': limit})]
+                self.assertTrue(self.expression.filter(command, df, {'s': limit}).equals(expected), command)
+        # Series with other index is compared with all rows as in solve
+        with self.assertRaises(ValueError):
+            self.expression.filter("(${age} == 5) & (${income} <= s)", df, {'s': pd.Series(np.arange(len(df)))})
+
+    def test_plan(self):
+        plan = self.expression.filtering.plan(self.expression.compile(
+            "(${a} > 1) & ((${b} < 2) & ~(${c} == 3)) | (${d}.sum() > 0)"))
+        self.assertEqual(plan.operation, '|')
+        conjunction, total = plan.children
+        self.assertEqual([getattr(child, 'operation', child.key) for child in conjunction.children],
+                         ['(${a} > 1)', '(${b} < 2)', '~'])
+        self.assertFalse(total.row_wise)
+        self.assertTrue(conjunction.children[0].row_wise)
+
+    def test_short_circuit(self):
+        df = self._create_people()
+        command = "(${name}.str.upper() == 'BOB') & (${age} == 40)"
+        evaluator = Evaluator()
+        evaluator.filter(command, df)
+        statistics = evaluator.filtering.statistics
+        # cheap and selective comparison goes first, the string method is calculated for its rows only
+        self.assertEqual(statistics['(${age} == 40)'][0], len(df))
+        self.assertEqual(statistics["(${name}.str.upper() == 'BOB')"][0], (df['age'] == 40).sum())
+
+    def test_fusion(self):
+        df = self._create_people()
+        command = "(${income} * 2 > 150000) & (${age} == 40) & (${age} + 1 > 10)"
+        evaluator = Evaluator()
+        evaluator.enable_fusion(min_rows=0)
+        plan = evaluator.filtering.plan(evaluator.compile(command))
+        self.assertEqual([child.key for child in plan.children],
+                         ['((${income} * 2) > 150000)', '(${age} == 40)', '((${age} + 1) > 10)'])
+        result = evaluator.filter(command, df)
+        self.assertTrue(result.equals(df[self.expression.solve(command, df)]))
+        statistics = evaluator.filtering.statistics
+        self.assertEqual(statistics['(${age} == 40)'][0], len(df))
+        self.assertEqual(statistics['((${income} * 2) > 150000)'][0], (df['age'] == 40).sum())
+
+    def test_masks(self):
+        df = self._create_people()
+        evaluator = Evaluator()
+        results = evaluator.filter_many({'de': "(${country} == 'DE') & (${age} > 30)",
+                                               'young_de': "(${country} == 'DE') & (${age} < 20)"}, df)
+        self.assertTrue(results['de'].equals(df[(df['country'] == 'DE') & (df['age'] > 30)]))
+        self.assertTrue(results['young_de'].equals(df[(df['country'] == 'DE') & (df['age'] < 20)]))
+        self.assertEqual(evaluator.filtering.statistics["(${country} == 'DE')"][0], len(df))
+
+        masks = {}
+        self.expression.filter("${age} > 30", df, masks=masks)
+        values, known = masks['(${age} > 30)']
+        self.assertTrue(known.all())
+        self.assertTrue((values == (df['age'] > 30).to_numpy()).all())
+
+    def test_nullable(self):
+        df = pd.DataFrame({'a': pd.array([True, None, False, True], dtype='boolean'), 'b': [1, 2, 3, 4]})
+        self.assertEqual(list(self.expression.filter("${a} & (${b} > 1)", df, as_index=True)), [3])
+
+    def test_not_boolean(self):
+        df = self._create_people(10)
+        with self.assertRaises(Exception):
+            self.expression.filter("${age} + 1", df)
+        with self.assertRaises(Exception):
+            self.expression.filter("(${age} > 1) & ${income}.sum()", df)
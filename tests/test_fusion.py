@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+
+from safe_evaluation import Evaluator
+from safe_evaluation.constants import TypeOfCommand
+from safe_evaluation.fusion import Fuser
+
+from tests.base import BaseTestCase
+
+
+class TestFusion(BaseTestCase):
+
+    commands = [
+        "(${a} + ${b}) * ${c} - ${d} ** 2 > 5",
+        "${a} * 2 + ${b} / 3 - ${a} * ${b}",
+        "np.log(${a} + 1) * 2 + ${a}.mean()",
+        "((${a} > 0.5) & (${b} < 0.2)) | ~(${c} > ${a})",
+        "${d} / 3 + ${d} - 1",
+        "${d} ** 2 + ${d} * ${d}",
+        "${a} ** ${d} + ${a}",
+        "${a} * x - ${b} / y",
+    ]
+
+    def _df(self, rows=1000):
+        generator = np.random.default_rng(0)
+        return pd.DataFrame({
+            'a': generator.random(rows), 'b': generator.random(rows) - 0.5,
+            'c': generator.random(rows), 'd': generator.integers(-5, 5, rows),
+        })
+
+    def _fused(self, use_numexpr=True, min_rows=0):
+        expression = Evaluator()
+        expression.enable_fusion(min_rows=min_rows, use_numexpr=use_numexpr)
+        return expression
+
+    def test_same_results(self):
+        df = self._df()
+        local = {'x': 2, 'y': 0.5}
+        for use_numexpr in (True, False):
+            fused = self._fused(use_numexpr)
+            for command in self.commands:
+                pd.testing.assert_series_equal(fused.solve(command, df, local), self.expression.solve(command, df, local))
+
+    def test_blocks(self):
+        df = self._df(10_000)
+        fused = self._fused(use_numexpr=False)
+        fused.fusion.block = 1024
+        pd.testing.assert_series_equal(fused.solve(self.commands[0], df), self.expression.solve(self.commands[0], df))
+
+    def test_kernel(self):
+        program = self._fused().compile("(${a} + ${b}) * 2 - np.abs(${c})").program
+        self.assertEqual(program[-1][0], TypeOfCommand.KERNEL)
+        kernel = program[-1][1]
+        self.assertEqual(kernel.arity, 3)
+        self.assertEqual(kernel.expression, '(((x0 + x1) * c3) - x2)')
+        self.assertEqual([element[0] for element in program[:-1]],
+                         [TypeOfCommand.COLUMN, TypeOfCommand.COLUMN, TypeOfCommand.FUNCTION_EXECUTABLE])
+
+    def test_not_fused(self):
+        fused = self._fused()
+        for command in ["${a} + 1", "x * 2 + y", "${a} // 2 + ${b} % 3", "(${a} & 1) | 2"]:
+            program = fused.compile(command).program
+            self.assertNotIn(TypeOfCommand.KERNEL, [element[0] for element in program if isinstance(element, tuple)])
+        # lambda bodies are calculated for scalars
+        body = fused.compile("v * 2 + 1", ('v',)).program
+        self.assertEqual(body[-1], '+')
+
+    def test_pandas_fallback(self):
+        fuser = Fuser(self.expression, min_rows=0)
+        kernel = self._fused().compile("${a} * 2 + ${b}").program[-1][1]
+        index = pd.RangeIndex(3)
+        a, b = pd.Series([1.0, 2.0, 3.0], index=index), pd.Series([1.0, 2.0, 3.0], index=index)
+        self.assertIsNotNone(fuser.execute(kernel, [a, b]))
+        # alignment, extension dtypes and objects are left to pandas
+        self.assertIsNone(fuser.execute(kernel, [a, pd.Series([1.0, 2.0, 3.0], index=[2, 1, 0])]))
+        self.assertIsNone(fuser.execute(kernel, [a, b.astype('Float64')]))
+        self.assertIsNone(fuser.execute(kernel, [a, pd.DataFrame({'b': b})]))
+        self.assertIsNone(fuser.execute(kernel, [1, 2]))
+        self.assertIsNone(Fuser(self.expression, min_rows=10).execute(kernel, [a, b]))
+
+    def test_alignment(self):
+        df = self._df(10)
+        local = {'s': pd.Series(np.arange(10.0), index=range(9, -1, -1))}
+        pd.testing.assert_series_equal(self._fused().solve("${a} * 2 + s", df, local),
+                                       self.expression.solve("${a} * 2 + s", df, local))
+
+    def test_names(self):
+        df = self._df(10)
+        fused = self._fused()
+        self.assertEqual(fused.solve("${a} * 2 + ${a}", df).name, 'a')
+        self.assertIsNone(fused.solve("${a} * 2 + ${b}", df).name)
+
+    def test_serialization(self):
+        fused = self._fused()
+        df = self._df(10)
+        loaded = Evaluator().loads(fused.dumps(fused.compile(self.commands[0])))
+        pd.testing.assert_series_equal(loaded.evaluate(df), self.expression.solve(self.commands[0], df))
+
+    def test_stream(self):
+        df = self._df(100)
+        fused = self._fused()
+        result = fused.solve_stream("(${a} + ${b}) * 2", [df.iloc[:50], df.iloc[50:]])
+        pd.testing.assert_series_equal(pd.concat(result), self.expression.solve("(${a} + ${b}) * 2", df))
+        self.assertAlmostEqual(fused.reduce_stream("((${a} + ${b}) * 2).sum()", [df.iloc[:50], df.iloc[50:]]),
+                               self.expression.solve("((${a} + ${b}) * 2).sum()", df))
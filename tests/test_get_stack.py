@@ -90,3 +90,46 @@ class TestStack(BaseTestCase):
         expression = 'v ** 2 > 5'
         result = [(TypeOfCommand.VARIABLE, 'v'), '**', (TypeOfCommand.VALUE, 2), '>', (TypeOfCommand.VALUE, 5)]
         self.assertEqual(_get_stack(expression, {'v': 2}), result)
+
+    def test_if_else(self):
+        expression = '0 if v < 9 else 10'
+        result = [(TypeOfCommand.VALUE, 0), 'if', (TypeOfCommand.VARIABLE, 'v'), '<', (TypeOfCommand.VALUE, 9),
+                  'else', (TypeOfCommand.VALUE, 10)]
+        self.assertEqual(_get_stack(expression), result)
+
+    def test_nested_list(self):
+        expression = '[[1, 2], [3]]'
+        result = [(TypeOfCommand.VALUE, ([1, 2], [3]))]
+        self.assertEqual(_get_stack(expression), result)
+
+    def test_solve_nested_list(self):
+        self.assertEqual(self.expression.solve("[[1, 2], [3]]"), ([1, 2], [3]))
+        self.assertEqual(self.expression.solve("[1, [2]]"), (1, [2]))
+        self.assertEqual(self.expression.solve("[{'a': 1}]"), {'a': 1})
+        self.assertEqual(self.expression.solve("np.array([[1, 2], [3, 4]])").tolist(), [[1, 2], [3, 4]])
+        # parsed value is kept in compiled command, so changes of the result don't change next results
+        result = self.expression.solve("[[1, 2], [3]]")
+        result[0].append(5)
+        self.assertEqual(self.expression.solve("[[1, 2], [3]]"), ([1, 2], [3]))
+
+    def test_function_inside_method(self):
+        expression = '${col1}.fillna(np.mean(${col1})) * 2'
+        result = [(TypeOfCommand.COLUMN, 'col1'), (TypeOfCommand.METHOD, 'np.mean(${col1})', 'fillna'), '*',
+                  (TypeOfCommand.VALUE, 2)]
+        self.assertEqual(_get_stack(expression), result)
+
+    def test_keyword_prefix(self):
+        expression = 'index + iffy'
+        result = [(TypeOfCommand.VARIABLE, 'index'), '+', (TypeOfCommand.VARIABLE, 'iffy')]
+        self.assertEqual(_get_stack(expression), result)
+
+    def test_long_formula(self):
+        expression = ' + '.join(f'${{col_{k}}} * w_{k}' for k in range(2000))
+        stack = _get_stack(expression)
+        self.assertEqual(len(stack), 2000 * 4 - 1)
+        self.assertEqual(stack[-3:], [(TypeOfCommand.COLUMN, 'col_1999'), '*', (TypeOfCommand.VARIABLE, 'w_1999')])
+
+    def test_not_closed_method(self):
+        expression = '${col1}.max(1'
+        with self.assertRaises(Exception):
+            _get_stack(expression)
@@ -56,3 +56,52 @@ class TestIfElse(BaseTestCase):
         command = "0 if v < 2 else (1 if v < 3 else 2)"
         expression = self.expression.solve(command=command, df=df, local={'v': 1})
         self.assertEqual(expression, 0)
+
+    def test_lazy_branch(self):
+        expression = self.expression.solve("1 if v > 0 else 1 / 0", local={'v': 1})
+        self.assertEqual(expression, 1)
+
+    def test_nested_else(self):
+        command = "0 if v < 2 else 1 if v < 3 else 2"
+        expression = [self.expression.solve(command, local={'v': v}) for v in (1, 2, 3)]
+        self.assertEqual(expression, [0, 1, 2])
+
+    def test_lowest_priority(self):
+        expression = self.expression.solve("1 + 1 if v else 2 + 2", local={'v': False})
+        self.assertEqual(expression, 4)
+
+    def test_without_else(self):
+        expression = self.expression.solve("1 if v > 0", local={'v': 0})
+        self.assertIsNone(expression)
+
+    def test_series_condition(self):
+        df, columns = self._create_df()
+        command = "${col1} * 2 if ${col2} > 1 else ${target}"
+        expression = self.expression.solve(command, df).values.tolist()
+        self.assertEqual(expression, [1, 2, 3, 4, 6, 6, 8])
+
+    def test_series_condition_scalars(self):
+        df, columns = self._create_df()
+        expression = self.expression.solve("1 if ${col1} < 3 else 2", df)
+        self.assertEqual(expression.values.tolist(), [1, 1, 1, 1, 2, 2, 2])
+        self.assertEqual(expression.index.tolist(), df.index.tolist())
+
+    def test_method_of_condition(self):
+        df, columns = self._create_df()
+        expression = self.expression.solve("(${col1} if ${col1} > 2 else 0 - ${col2}).abs()", df)
+        self.assertEqual(expression.values.tolist(), [1, 1, 1, 2, 3, 3, 4])
+
+    def test_dataframe_apply(self):
+        df, columns = self._create_df()
+        command = "${__df}.apply(lambda c: c if c > 2 else 0)"
+        expression = self.expression.solve(command, df[['col1', 'col2']])
+        self.assertEqual(expression['col1'].values.tolist(), [0, 0, 0, 0, 3, 3, 4])
+        self.assertEqual(expression['col2'].values.tolist(), [0, 0, 0, 0, 0, 0, 3])
+
+    def test_else_without_if(self):
+        with self.assertRaises(Exception):
+            self.expression.compile("1 else 2")
+
+    def test_empty_body(self):
+        with self.assertRaises(Exception):
+            self.expression.compile("if v else 2")
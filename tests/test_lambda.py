@@ -0,0 +1,48 @@
+from safe_evaluation import Evaluator
+from safe_evaluation.constants import TypeOfCommand
+
+from tests.base import BaseTestCase
+
+
+class TestLambda(BaseTestCase):
+
+    def test_body_compiled_once(self):
+        evaluator = Evaluator()
+        function = evaluator.solve("lambda v: v ** 2 > 34")
+        self.assertFalse(function(4))
+        misses = evaluator.cache_info().misses
+        self.assertEqual([function(v) for v in range(5, 8)], [False, True, True])
+        self.assertEqual(evaluator.cache_info().misses, misses)
+
+    def test_arguments_in_slots(self):
+        function = self.expression.solve("lambda a, b: a - b")
+        self.assertEqual(function.body.program,
+                         ((TypeOfCommand.ARGUMENT, 0), (TypeOfCommand.ARGUMENT, 1), '-'))
+        self.assertEqual(function(5, 3), 2)
+
+    def test_kwargs(self):
+        function = self.expression.solve("lambda a, b: a - b")
+        self.assertEqual(function(5, b=3), 2)
+        self.assertEqual(function(b=5, a=3), -2)
+
+    def test_wrong_amount_of_arguments(self):
+        function = self.expression.solve("lambda a, b: a - b")
+        with self.assertRaises(TypeError):
+            function(1)
+
+    def test_local_variables(self):
+        function = self.expression.solve("lambda x: x * k", local={'k': 3})
+        self.assertEqual(function(2), 6)
+
+    def test_arguments_shadow_local(self):
+        function = self.expression.solve("lambda x: x * 2", local={'x': 100})
+        self.assertEqual(function(2), 4)
+
+    def test_nested_lambda(self):
+        expression = self.expression.solve("list(map(lambda x: list(map(lambda y: x + y, [1, 2])), [10, 20]))")
+        self.assertEqual(expression, [[11, 12], [21, 22]])
+
+    def test_apply(self):
+        df, columns = self._create_df()
+        expression = self.expression.solve("${col1}.apply(lambda v: v * 2 + ${col2}.max())", df).values.tolist()
+        self.assertEqual(expression, [5, 5, 7, 7, 9, 9, 11])
@@ -0,0 +1,84 @@
+import asyncio
+
+import numpy as np
+import pandas as pd
+
+from safe_evaluation import AsyncEvaluator, Evaluator, Limits, LimitExceeded
+
+from tests.base import BaseTestCase
+
+
+class Slow:
+    """
+    Variable which calculation takes time
+    """
+
+    @property
+    def value(self):
+        import time
+        time.sleep(0.02)
+        return 1
+
+
+class TestLimits(BaseTestCase):
+
+    def test_result_size_before_calculation(self):
+        limits = Limits(result_size=10 ** 6)
+        for command in ["list(range(10 ** 9))", "[1, 2] * 10 ** 9", "10 ** 10 ** 10", "np.zeros(10 ** 9)",
+                        "np.arange(10 ** 9)", "'ab' * (10 ** 9)"]:
+            with self.assertRaises(LimitExceeded, msg=command):
+                self.expression.solve(command, limits=limits)
+        self.assertEqual(len(self.expression.solve("list(range(1000))", limits=limits)), 1000)
+
+    def test_result_size_after_calculation(self):
+        df = pd.DataFrame(data={'a': np.arange(1000)})
+        with self.assertRaises(LimitExceeded):
+            self.expression.solve("${a} * 2", df, limits=Limits(result_size=1000))
+        self.assertEqual(len(self.expression.solve("${a} * 2", df, limits=Limits(result_size=10 ** 4))), 1000)
+
+    def test_operations(self):
+        self.assertEqual(self.expression.solve("1 + x * 2", local={'x': 1}, limits=Limits(operations=5)), 3)
+        with self.assertRaises(LimitExceeded):
+            self.expression.solve("1 + x * 2 - x", local={'x': 1}, limits=Limits(operations=5))
+
+    def test_operations_in_lambda(self):
+        with self.assertRaises(LimitExceeded):
+            self.expression.solve("list(map(lambda v: v + 1, range(100)))", limits=Limits(operations=100))
+
+    def test_lambda_calls(self):
+        df = pd.DataFrame(data={'a': ['x'] * 10})
+        command = "${a}.apply(lambda v: v + 'y')"
+        self.assertEqual(len(self.expression.solve(command, df, limits=Limits(lambda_calls=10))), 10)
+        with self.assertRaises(LimitExceeded):
+            self.expression.solve(command, df, limits=Limits(lambda_calls=9))
+
+    def test_time(self):
+        df = pd.DataFrame(data={'a': list(range(100))})
+        with self.assertRaises(LimitExceeded):
+            self.expression.solve("${a}.apply(lambda v: slow.value)", df, local={'slow': Slow()},
+                                  limits=Limits(time=0.1))
+
+    def test_default_limits(self):
+        evaluator = Evaluator(limits=Limits(operations=3))
+        self.assertEqual(evaluator.solve("1 + x", local={'x': 1}), 2)
+        with self.assertRaises(LimitExceeded):
+            evaluator.solve("1 + x + x", local={'x': 1})
+        self.assertEqual(evaluator.solve("1 + x + x", local={'x': 1}, limits=Limits(operations=5)), 3)
+        with self.assertRaises(LimitExceeded):
+            evaluator.compile("1 + x + x").evaluate(local={'x': 1})
+
+    def test_solve_many(self):
+        with self.assertRaises(LimitExceeded):
+            self.expression.solve_many(["x + 1", "x * 2"], local={'x': 1}, limits=Limits(operations=5))
+
+    def test_limits_are_per_call(self):
+        limits = Limits(operations=3)
+        for _ in range(3):
+            self.assertEqual(self.expression.solve("x + 1", local={'x': 1}, limits=limits), 2)
+
+    def test_async(self):
+        async def main():
+            async with AsyncEvaluator() as evaluator:
+                with self.assertRaises(LimitExceeded):
+                    await evaluator.solve("list(range(10 ** 9))", limits=Limits(result_size=10 ** 6))
+        asyncio.run(main())
@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+
+from safe_evaluation import Evaluator, Hook, LimitExceeded, Limits
+from safe_evaluation.streaming import ROWS, REDUCED
+
+from tests.base import BaseTestCase
+
+
+class TestParallel(BaseTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.parallel = Evaluator()
+        cls.parallel.enable_parallel(workers=2, min_rows=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.parallel.disable_parallel()
+
+    def _create_numbers(self):
+        return pd.DataFrame(data={'a': [1., 5, 3, np.nan, 7, 2, 9], 'b': [2, 1, 0, 4, 4, 4, 1],
+                                  's': ['q', 'w', 'e', 'r', 't', 'y', 'u']}, index=list('abcdefg'))
+
+    def _assert_same(self, command, df, local=None):
+        result, expected = self.parallel.solve(command, df, local), self.expression.solve(command, df, local)
+        if isinstance(expected, (pd.Series, pd.DataFrame)):
+            self.assertTrue(result.equals(expected), command)
+        elif isinstance(expected, np.ndarray):
+            self.assertTrue(np.array_equal(result, expected, equal_nan=True), command)
+        else:
+            self.assertAlmostEqual(result, expected, msg=command)
+
+    def test_row_wise(self):
+        df = self._create_numbers()
+        for command in ["${a} * 2 + ${b}", "${s}.str.upper()", "np.where(${b} > 1, ${a}, 0)",
+                        "${a}.apply(lambda v: v * x)", "${a} if ${b} > 1 else ${b}"]:
+            self._assert_same(command, df, {'x': 2})
+
+    def test_reductions(self):
+        df = self._create_numbers()
+        for command in ["${a}.sum() / ${b}.count()", "${a}.mean()", "${a}.min() + ${b}.max()", "np.mean(${a} * x)"]:
+            self._assert_same(command, df, {'x': 2})
+
+    def test_dataframe(self):
+        df = self._create_numbers()
+        self._assert_same("${__df}.max()", df.drop(columns='s'))
+        self._assert_same("${__df}", df)
+
+    def test_not_partitionable(self):
+        df = self._create_numbers()
+        for command in ["${a}.shift(1)", "${a} - ${a}.mean()", "${a}.rolling(2).sum()", "2 + 2"]:
+            self._assert_same(command, df)
+            self.assertIsNone(self.parallel.parallel._kind(self.parallel.compile(command), df, None))
+
+    def test_kind(self):
+        df = self._create_numbers()
+        executor = self.parallel.parallel
+        self.assertEqual(executor._kind(self.parallel.compile("${a} * 2"), df, None), ROWS)
+        self.assertEqual(executor._kind(self.parallel.compile("${a}.sum()"), df, None), REDUCED)
+        self.assertIsNone(executor._kind(self.parallel.compile("${a} * 2"), df, {'f': lambda v: v}))
+        self.assertIsNone(executor._kind(self.parallel.compile("${a} * 2"), df.iloc[:1], None))
+
+    def test_array_variables(self):
+        df = self._create_numbers()
+        for local in ({'v': pd.Series(np.arange(7.), index=df.index)}, {'v': np.arange(7.)}):
+            self._assert_same("${a} + v", df, local)
+            self._assert_same("(${b} * v).sum() + np.max(v)", df, local)
+        # Series with other index is aligned by labels with all rows
+        local = {'v': pd.Series(np.arange(10.))}
+        self.assertIsNone(self.parallel.parallel._kind(self.parallel.compile("${a} + v"), df, local))
+        self._assert_same("${a} + v", df, local)
+
+    def test_not_rows(self):
+        df = self._create_numbers()
+        for command in ["str(${a})", "${s}.str"]:
+            self.assertIsNone(self.parallel.parallel._kind(self.parallel.compile(command), df, None), command)
+        self.assertEqual(self.parallel.solve("str(${b})", df), str(df['b']))
+
+    def test_limits(self):
+        df = self._create_numbers()
+        with self.assertRaises(LimitExceeded):
+            self.parallel.solve("${b}.apply(lambda v: str(v))", df, limits=Limits(lambda_calls=5))
+        with self.assertRaises(LimitExceeded):
+            self.parallel.solve("(${a} * 2 + ${b}) * 3", df, limits=Limits(operations=3))
+        self.assertTrue(self.parallel.solve("${b}.apply(lambda v: str(v))", df, limits=Limits(lambda_calls=7, time=10))
+                        .equals(df['b'].astype(str)))
+
+    def test_hooks(self):
+        class Counter(Hook):
+            calls = 0
+
+            def after(self, program, position, parameters, value):
+                Counter.calls += 1
+
+        df = self._create_numbers()
+        with self.parallel.snapshot(hooks=(Counter(),)):
+            self.assertIsNone(self.parallel.parallel._kind(self.parallel.compile("${a} * 2"), df, None))
+            self._assert_same("${a} * 2", df)
+        self.assertGreater(Counter.calls, 0)
+
+    def test_settings(self):
+        evaluator = Evaluator()
+        evaluator.enable_parallel(workers=2, min_rows=0)
+        evaluator.change_settings(evaluator.settings.__class__(forbidden_funcs=['np.abs']))
+        try:
+            with self.assertRaises(Exception):
+                evaluator.solve("np.abs(${a})", self._create_numbers())
+        finally:
+            evaluator.disable_parallel()
+
+    def test_error(self):
+        with self.assertRaises(ZeroDivisionError):
+            self.parallel.solve("${b}.apply(lambda v: 1 / v)", self._create_numbers())
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+from safe_evaluation import Evaluator, Hook, LimitExceeded, Limits
+from safe_evaluation.constants import TypeOfCommand
+
+from tests.base import BaseTestCase
+
+
+class Recorder(Hook):
+
+    def __init__(self):
+        self.calls = []
+
+    def before(self, program, position, parameters):
+        self.calls.append(('before', program[position]))
+
+    def after(self, program, position, parameters, value):
+        self.calls.append(('after', program[position], value))
+
+    def failed(self, program, position, parameters, error):
+        self.calls.append(('failed', program[position], type(error)))
+
+
+class TestProfile(BaseTestCase):
+
+    def _find(self, tree, name):
+        return next(node for node in tree.walk() if node.name == name)
+
+    def test_tree(self):
+        df = pd.DataFrame(data={'a': np.arange(10.0)})
+        tree = self.expression.profile("np.log(${a} + 1) * 2", df)
+        self.assertEqual([node.name for node in tree.children], ['tokenize', 'compile', 'evaluate'])
+        root, = tree.children[2].children
+        self.assertEqual(root.name, '(np.log((${a} + 1)) * 2)')
+        self.assertEqual([node.name for node in root.children], ['np.log((${a} + 1))', '2'])
+        self.assertEqual(root.output_type, 'Series')
+        self.assertEqual(root.shape, (10,))
+        self.assertEqual(root.bytes, 80)
+        log = root.children[0]
+        self.assertEqual([node.name for node in log.children], ['(${a} + 1)'])
+        for node in tree.walk():
+            self.assertGreaterEqual(node.time, node.self_time)
+            self.assertGreaterEqual(node.time, sum(child.time for child in node.children) - 1e-9)
+
+    def test_lambda_calls(self):
+        df = pd.DataFrame(data={'s': ['a', 'bc', 'd']})
+        tree = self.expression.profile("${s}.apply(lambda v: v + 'x' if v > 'b' else v)", df)
+        self.assertEqual(self._find(tree, "((v + 'x') if (v > 'b') else v)").calls, 3)
+        self.assertEqual(self._find(tree, "(v > 'b')").calls, 3)
+        self.assertEqual(self._find(tree, "(v + 'x')").calls, 2)
+        apply = self._find(tree, "${s}.apply(lambda v:  v + 'x' if v > 'b' else v)")
+        self.assertIn(self._find(tree, "((v + 'x') if (v > 'b') else v)"), apply.children)
+
+    def test_condition(self):
+        tree = self.expression.profile("x * 2 if x > 0 else y", local={'x': 1, 'y': 2})
+        names = [node.name for node in tree.walk()]
+        self.assertIn('(x * 2)', names)
+        self.assertNotIn('y', names)
+        self.assertEqual(tree.output_type, 'int')
+
+    def test_format(self):
+        tree = self.expression.profile("1 + x", local={'x': 1})
+        text = tree.format()
+        self.assertIn('tokenize', text)
+        self.assertIn('(1 + x)', text)
+        self.assertEqual(tree.to_dict()['children'][2]['children'][0]['name'], '(1 + x)')
+
+    def test_hooks(self):
+        expression = Evaluator()
+        recorder = Recorder()
+        expression.add_hook(recorder)
+        self.assertEqual(expression.solve("1 + x", local={'x': 2}), 3)
+        self.assertEqual(recorder.calls, [
+            ('before', (TypeOfCommand.VALUE, 1)), ('after', (TypeOfCommand.VALUE, 1), 1),
+            ('before', (TypeOfCommand.VARIABLE, 'x')), ('after', (TypeOfCommand.VARIABLE, 'x'), 2),
+            ('before', '+'), ('after', '+', 3),
+        ])
+        expression.remove_hook(recorder)
+        expression.solve("1 + x", local={'x': 2})
+        self.assertEqual(len(recorder.calls), 6)
+
+    def test_hooks_of_call(self):
+        recorder = Recorder()
+        with self.expression.snapshot(hooks=(recorder,)):
+            self.expression.solve("x", local={'x': 2})
+        self.expression.solve("x", local={'x': 2})
+        self.assertEqual(recorder.calls, [('before', (TypeOfCommand.VARIABLE, 'x')), ('after', (TypeOfCommand.VARIABLE, 'x'), 2)])
+
+    def test_failed(self):
+        recorder = Recorder()
+        with self.assertRaises(LimitExceeded):
+            with self.expression.snapshot(hooks=(recorder,)):
+                self.expression.solve("x + 1", local={'x': 2}, limits=Limits(operations=1))
+        self.assertEqual(recorder.calls[-1], ('failed', (TypeOfCommand.VALUE, 1), LimitExceeded))
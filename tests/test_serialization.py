@@ -0,0 +1,78 @@
+import json
+
+import pandas as pd
+
+from safe_evaluation import CompiledBatch, Evaluator
+from safe_evaluation.constants import TypeOfCommand
+from safe_evaluation.settings import Settings
+
+from tests.base import BaseTestCase
+
+
+class TestSerialization(BaseTestCase):
+
+    def _assert_same(self, first, second):
+        if isinstance(first, (pd.Series, pd.DataFrame)):
+            self.assertTrue(first.equals(second))
+        else:
+            self.assertEqual(first, second)
+
+    def _round_trip(self, command, df=None, local=None, binary=False):
+        compiled = self.expression.compile(command)
+        loaded = Evaluator().loads(self.expression.dumps(compiled, binary))
+        self.assertEqual(loaded.command, command)
+        self._assert_same(compiled.evaluate(df, local), loaded.evaluate(df, local))
+
+    def test_round_trip(self):
+        df, _ = self._create_df()
+        for command in ["${col1} * 2 + ${col2}.mean() if ${col1}.sum() > 0 else 0",
+                        "np.log(${col1} + 1) + ${col2}.clip(lower=0) * x",
+                        "${col1}.apply(lambda v: v * 2 if v > x else v)",
+                        "${col1}.apply(np.abs) + ${col1} * ${col2} + ${col1} * ${col2}",
+                        "${__df}.count().sum() + x"]:
+            self._round_trip(command, df, {'x': 1})
+            self._round_trip(command, df, {'x': 1}, binary=True)
+
+    def test_values(self):
+        for command in ["[1, 2.5, (3, 'a')]", "complex(1, 2)", "np.sqrt(2)", "np.pi",
+                        "float('nan') if True else 1", "True & False"]:
+            compiled = self.expression.compile(command)
+            loaded = Evaluator().loads(self.expression.dumps(compiled))
+            self.assertEqual(repr(compiled.program), repr(loaded.program))
+
+    def test_elements_stored_once(self):
+        commands = [f"${{col1}} * {i} + np.log(${{col2}})" for i in range(100)]
+        document = json.loads(self.expression.dumps([self.expression.compile(command) for command in commands]))
+        self.assertEqual(len(document['expressions']), 100)
+        self.assertLess(len(document['elements']), 110)
+
+    def test_loaded_expressions_are_cached(self):
+        df, _ = self._create_df()
+        commands = ["${col1} + 1", "${col2} * 2"]
+        data = self.expression.dumps([self.expression.compile(command) for command in commands], binary=True)
+        evaluator = Evaluator()
+        loaded = evaluator.loads(data)
+        self.assertEqual([expression.command for expression in loaded], commands)
+        self.assertIs(evaluator.compile("${col1} + 1"), loaded[0])
+        self.assertTrue(evaluator.solve("${col2} * 2", df).equals(df['col2'] * 2))
+
+    def test_batch(self):
+        df, _ = self._create_df()
+        batch = self.expression.compile_many(["${col1} + ${col2}", "(${col1} + ${col2}) * 2"])
+        loaded = Evaluator().loads(self.expression.dumps(batch))
+        self.assertIsInstance(loaded, CompiledBatch)
+        for first, second in zip(batch.evaluate(df), loaded.evaluate(df)):
+            self.assertTrue(first.equals(second))
+
+    def test_other_settings(self):
+        data = self.expression.dumps(self.expression.compile("${__df}.count()"))
+        evaluator = Evaluator()
+        evaluator.change_settings(Settings(df_name='frame'))
+        # the command is parsed again with settings of evaluator
+        self.assertEqual(evaluator.loads(data).program, ((TypeOfCommand.COLUMN, '__df'), (TypeOfCommand.METHOD, 'count', (), ())))
+
+    def test_wrong_data(self):
+        with self.assertRaises(Exception):
+            self.expression.loads(b'PNG....')
+        with self.assertRaises(Exception):
+            self.expression.loads('{"format": 1000}')
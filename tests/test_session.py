@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+from tests.base import BaseTestCase
+
+
+class TestSession(BaseTestCase):
+
+    commands = {
+        'rows': '${a} * 2 + ${b}',
+        'reduced': '${a}.mean() + ${b}.max() - ${c}.sum() + ${a}.count()',
+        'mixed': '${a} - ${a}.min()',
+        'scalar': 'x + 1',
+        'other': '${a}.rank()',
+    }
+
+    def _create_df(self, rows, start=0, seed=0):
+        generator = np.random.default_rng(seed)
+        return pd.DataFrame({'a': generator.random(rows), 'b': generator.integers(0, 5, rows),
+                             'c': generator.random(rows)}, index=np.arange(start, start + rows))
+
+    def _assert_results(self, session, df, local):
+        for name, command in self.commands.items():
+            expected = self.expression.solve(command, df, local)
+            if isinstance(expected, pd.Series):
+                self.assertTrue(np.allclose(session[name], expected), name)
+                self.assertTrue(session[name].index.equals(expected.index), name)
+            else:
+                self.assertAlmostEqual(session[name], expected, msg=name)
+
+    def test_append(self):
+        df = self._create_df(10)
+        session = self.expression.session(df, self.commands, {'x': 1})
+        self._assert_results(session, df, {'x': 1})
+        for step in range(1, 4):
+            rows = self._create_df(5, start=5 + step * 5, seed=step)
+            changed = session.append(rows)
+            df = pd.concat([df, rows])
+            self.assertEqual(changed, ['rows', 'reduced', 'mixed', 'other'])
+            self._assert_results(session, df, {'x': 1})
+        self.assertEqual(session.append(df.iloc[:0]), [])
+
+    def test_empty_start(self):
+        df = self._create_df(0)
+        session = self.expression.session(df, self.commands, {'x': 1})
+        self.assertTrue(np.isnan(session['reduced']))
+        rows = self._create_df(5)
+        session.append(rows)
+        self._assert_results(session, rows, {'x': 1})
+
+    def test_update_columns(self):
+        df = self._create_df(20)
+        session = self.expression.session(df, self.commands, {'x': 1})
+        df['c'] = df['c'] * 10
+        self.assertEqual(session.update(['c']), ['reduced'])
+        self._assert_results(session, df, {'x': 1})
+        df['a'] = 1 - df['a']
+        self.assertEqual(session.update(['a']), ['rows', 'reduced', 'mixed', 'other'])
+        self._assert_results(session, df, {'x': 1})
+        self.assertEqual(session.update(['d']), [])
+
+    def test_update_reductions(self):
+        df = self._create_df(20)
+        session = self.expression.session(df, self.commands, {'x': 1})
+        calculated = []
+        partial = self.expression.calculator.streamer.partial
+        self.expression.calculator.streamer.partial = lambda name, *args: calculated.append(name) or partial(name, *args)
+        try:
+            df['c'] = 0.5
+            session.update(['c'])
+        finally:
+            del self.expression.calculator.streamer.partial
+        self.assertEqual(calculated, ['sum'])
+        self._assert_results(session, df, {'x': 1})
+
+    def test_update_df_and_local(self):
+        df = self._create_df(20)
+        session = self.expression.session(df, self.commands, {'x': 1})
+        df = df.assign(b=df['b'] + 1)
+        self.assertEqual(session.update(['b'], df=df), ['rows', 'reduced'])
+        self._assert_results(session, df, {'x': 1})
+        self.assertEqual(session.update(local={'x': 5}), list(self.commands))
+        self._assert_results(session, df, {'x': 5})
+
+    def test_array_variables(self):
+        commands = {'rows': '${a} + s', 'reduced': '(${b} * s).sum() + np.max(s)', 'scalar': 'x * 2'}
+        rows = self._create_df(5, start=10, seed=1)
+        df = pd.concat([self._create_df(10), rows])
+        for s in (np.arange(15.), pd.Series(np.arange(15.), index=df.index)):
+            session = self.expression.session(df.iloc[:10], commands, {'s': s[:10], 'x': 1})
+            self.assertEqual(session.append(rows, local={'s': s, 'x': 1}), ['rows', 'reduced'])
+            for name, command in commands.items():
+                expected = self.expression.solve(command, df, {'s': s, 'x': 1})
+                if isinstance(expected, pd.Series):
+                    self.assertTrue(session[name].equals(expected), name)
+                else:
+                    self.assertAlmostEqual(session[name], expected, msg=name)
+        self.assertEqual(session.append(rows.iloc[:0], local={'s': s, 'x': 2}), ['scalar'])
+        self.assertEqual(session['scalar'], 4)
+        # variables without value for every row are aligned by labels with all rows as in solve
+        session.append(self._create_df(2, start=15), local={'s': s, 'x': 2})
+        self.assertTrue(session['rows'].equals(self.expression.solve(commands['rows'], session.df, {'s': s})))
+
+    def test_add_remove(self):
+        df = self._create_df(10)
+        session = self.expression.session(df, ['${a}.sum()'])
+        self.assertAlmostEqual(session['${a}.sum()'], df['a'].sum())
+        self.assertAlmostEqual(session.add('${b}.max() * 2', 'double'), df['b'].max() * 2)
+        session.remove('${a}.sum()')
+        self.assertEqual(list(session.results), ['double'])
+        session.append(self._create_df(5, start=10, seed=1))
+        self.assertAlmostEqual(session['double'], session.df['b'].max() * 2)
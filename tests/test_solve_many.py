@@ -0,0 +1,51 @@
+import pandas as pd
+
+from safe_evaluation import CompiledBatch
+
+from tests.base import BaseTestCase
+
+
+class TestSolveMany(BaseTestCase):
+
+    def test_solve_many(self):
+        df, _ = self._create_df()
+        commands = ["${col1} + ${col2}", "(${col1} + ${col2}) * 2", "${col1}.max()", "2 * x"]
+        result = self.expression.solve_many(commands, df, local={'x': 3})
+        self.assertEqual(list(result.keys()), commands)
+        for command in commands:
+            expected = self.expression.solve(command, df, local={'x': 3})
+            if isinstance(expected, pd.Series):
+                self.assertTrue(result[command].equals(expected))
+            else:
+                self.assertEqual(result[command], expected)
+
+    def test_named_commands_as_frame(self):
+        df = pd.DataFrame(data={'a': [1, 2], 'b': [3, 4]}, index=[5, 6])
+        result = self.expression.solve_many({'sum': "${a} + ${b}", 'mean': "${a}.mean()"}, df, as_frame=True)
+        expected = pd.DataFrame(data={'sum': [4, 6], 'mean': [1.5, 1.5]}, index=[5, 6])
+        self.assertTrue(result.equals(expected))
+
+    def test_shared_between_commands(self):
+        compiled = self.expression.compile_many(["${col1} + ${col2}", "(${col1} + ${col2}) * 2", "${col1}.max()"])
+        self.assertIsInstance(compiled, CompiledBatch)
+        self.assertEqual(compiled.program.count('+'), 1)
+        self.assertEqual(compiled.shared_nodes(), [('${col1}', 2), ('(${col1} + ${col2})', 2)])
+
+    def test_shared_inside_commands(self):
+        commands = ["(x - 1) * (x - 1)", "(x - 1) * 2", "(x - 1) + 1 if x else 0"]
+        result = self.expression.solve_many(commands, local={'x': 3})
+        self.assertEqual(list(result.values()), [4, 4, 3])
+
+    def test_lambda_command(self):
+        result = self.expression.solve_many(["lambda v: v + x", "x"], local={'x': 3})
+        self.assertEqual(result["lambda v: v + x"](1), 4)
+        self.assertEqual(result["x"], 3)
+
+    def test_compile_many_is_cached(self):
+        commands = ["${col1} * 3", "${col1} * 4"]
+        self.assertIs(self.expression.compile_many(commands), self.expression.compile_many(commands))
+
+    def test_error(self):
+        df, _ = self._create_df()
+        with self.assertRaises(KeyError):
+            self.expression.solve_many(["${col1}", "${unknown}"], df)
@@ -0,0 +1,87 @@
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow
+
+from safe_evaluation import ColumnSource
+from safe_evaluation.sources import open_source
+
+from tests.base import BaseTestCase
+
+
+class CountingSource(ColumnSource):
+
+    def __init__(self, df):
+        self.df = df
+        self.requested = []
+
+    def column_names(self):
+        return list(self.df.columns)
+
+    def read(self, columns=None):
+        self.requested.append(columns)
+        return self.df if columns is None else self.df[self._existing(columns)]
+
+
+class TestSources(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.df = pd.DataFrame({f'c{i}': np.arange(5.0) * i for i in range(20)})
+        self.df['s'] = list('abcde')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def test_references(self):
+        compiled = self.expression.compile("${c2} * 2 + ${c1}.apply(lambda v: v + 1) + np.abs(${c3} - ${c2})")
+        self.assertEqual(compiled.columns, ('c2', 'c1', 'c3'))
+        self.assertFalse(compiled.uses_df)
+        compiled = self.expression.compile("${__df}.sort_values('c1').count() if ${c4}.sum() > 0 else ${c5}")
+        self.assertEqual(compiled.columns, ('c4', 'c5'))
+        self.assertTrue(compiled.uses_df)
+        self.assertEqual(self.expression.compile("x + 1").columns, ())
+
+    def test_read(self):
+        source = CountingSource(self.df)
+        df = self.expression.read(source, ["${c3} + ${c1}", "${s}.str.upper()", "${c1} * 2"])
+        self.assertEqual(list(df.columns), ['c1', 'c3', 's'])
+        self.assertEqual(self.expression.read(source, "${__df}.sum()").shape, self.df.shape)
+        self.assertEqual(source.requested[-1], None)
+
+    def test_parquet(self):
+        path = self._path('table.parquet')
+        self.df.set_index(pd.Index(range(10, 15))).to_parquet(path)
+        df = self.expression.read(path, "${c1} + ${c19}")
+        self.assertEqual(list(df.columns), ['c1', 'c19'])
+        self.assertEqual(list(df.index), list(range(10, 15)))
+        result = self.expression.solve_source("${c1} + ${c19}", path)
+        self.assertTrue(result.equals(self.df['c1'].set_axis(range(10, 15)) + self.df['c19'].set_axis(range(10, 15))))
+
+    def test_feather(self):
+        path = self._path('table.feather')
+        self.df.to_feather(path)
+        command = "${c2} * 2 if ${s} != 'c' else ${c3}"
+        self.assertEqual(list(self.expression.read(path, command).columns), ['c2', 'c3', 's'])
+        self.assertTrue(self.expression.solve_source(command, path).equals(self.expression.solve(command, self.df)))
+        self.assertEqual(list(open_source(path).read(['c0', 'missing']).columns), ['c0'])
+
+    def test_arrow_table(self):
+        table = pyarrow.Table.from_pandas(self.df)
+        self.assertEqual(self.expression.solve_source("${c5}.sum()", table), self.df['c5'].sum())
+        results = self.expression.solve_source(self.expression.compile_many(["${c1}.max()", "${c2}.min()"]), table)
+        self.assertEqual(results, [4.0, 0.0])
+
+    def test_errors(self):
+        with self.assertRaises(KeyError):
+            self.expression.solve_source("${missing} + 1", self.df)
+        with self.assertRaises(Exception):
+            open_source(self._path('table.csv'))
+        with self.assertRaises(Exception):
+            open_source(5)
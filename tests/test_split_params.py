@@ -0,0 +1,60 @@
+from safe_evaluation import Calculator, Evaluator
+from safe_evaluation.constants import TypeOfCommand
+
+from tests.base import BaseTestCase
+
+
+evaluator = Evaluator()
+calculator = Calculator(evaluator)
+_split_params = calculator._split_params
+_compile_params = calculator._compile_params
+
+
+class TestSplitParams(BaseTestCase):
+
+    def test_split(self):
+        self.assertEqual(_split_params("1, 'a', b=2"), ['1', "'a'", 'b=2'])
+
+    def test_brackets(self):
+        self.assertEqual(_split_params("[1, 2], (3, 4), {5: 6}"), ['[1, 2]', '(3, 4)', '{5: 6}'])
+
+    def test_strings(self):
+        self.assertEqual(_split_params("'a, b', \"(\""), ["'a, b'", '"("'])
+
+    def test_lambda_params(self):
+        self.assertEqual(_split_params("lambda x, y: x + y, [1, 2], [3, 4]"),
+                         ['lambda x, y: x + y', '[1, 2]', '[3, 4]'])
+
+    def test_lambda_kwarg(self):
+        self.assertEqual(_split_params("func=lambda x, y: x + y, axis=1"), ['func=lambda x, y: x + y', 'axis=1'])
+
+    def test_excess_parentheses(self):
+        with self.assertRaises(Exception):
+            _split_params("(1, 2")
+
+    def test_compile(self):
+        args, kwargs = _compile_params("${col1}, q = 0.5", ())
+        self.assertEqual(args, (((TypeOfCommand.COLUMN, 'col1'),),))
+        self.assertEqual(kwargs, (('q', ((TypeOfCommand.VALUE, 0.5),)),))
+
+    def test_compile_parameters(self):
+        args, kwargs = _compile_params("v, 2", ('v',))
+        self.assertEqual(args, (((TypeOfCommand.ARGUMENT, 0),), ((TypeOfCommand.VALUE, 2),)))
+
+    def test_comparison_is_arg(self):
+        self.assertTrue(calculator._is_arg("a == b"))
+        self.assertFalse(calculator._is_arg("a = b"))
+
+    def test_positional_after_keyword(self):
+        with self.assertRaises(SyntaxError):
+            _compile_params("a=1, 2", ())
+
+    def test_method_compiled_once(self):
+        compiled = evaluator.compile("${col1}.clip(lower=2)")
+        self.assertEqual(compiled.program[-1], (TypeOfCommand.METHOD, 'clip', (), (('lower', ((TypeOfCommand.VALUE, 2),)),)))
+
+    def test_long_list(self):
+        df, columns = self._create_df()
+        values = list(range(0, 2000, 2))
+        expression = evaluator.solve(f"np.isin(${{col1}}, {values}, invert=False)", df)
+        self.assertEqual(expression.tolist(), [False, False, True, True, False, False, True])
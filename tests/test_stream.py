@@ -0,0 +1,76 @@
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+
+from tests.base import BaseTestCase
+
+
+class TestStream(BaseTestCase):
+
+    def _chunks(self, df, size=3):
+        return (df.iloc[i:i + size] for i in range(0, len(df), size))
+
+    def _create_numbers(self):
+        return pd.DataFrame(data={'a': [1., 5, 3, np.nan, 7, 2, 9], 'b': [2, 1, 0, 4, 4, 4, 1]})
+
+    def test_row_wise(self):
+        df = self._create_numbers()
+        results = list(self.expression.solve_stream("${a} * 2 if ${b} > 1 else ${a}.abs()", self._chunks(df)))
+        self.assertEqual(len(results), 3)
+        self.assertTrue(pd.concat(results).equals(self.expression.solve("${a} * 2 if ${b} > 1 else ${a}.abs()", df)))
+
+    def test_reductions(self):
+        df = self._create_numbers()
+        commands = ["${a}.sum()", "${a}.mean() - ${b}.mean()", "np.mean(${a} * 2)", "${a}.count()",
+                    "${a}.min() + ${b}.max()", "np.round(${a}.mean(), 2)", "(${a} * ${b}).sum() / ${b}.sum()",
+                    "${a}.fillna(0).apply(lambda v: v % 2).sum()"]
+        for command in commands:
+            self.assertAlmostEqual(self.expression.reduce_stream(command, self._chunks(df)),
+                                   self.expression.solve(command, df))
+
+    def test_dataframe_reduction(self):
+        df = self._create_numbers()
+        result = self.expression.reduce_stream("${__df}.max()", self._chunks(df))
+        self.assertTrue(result.equals(df.max()))
+
+    def test_read_csv(self):
+        csv = StringIO('a,b\n' + '\n'.join(f'{i},{i % 3}' for i in range(100)))
+        result = self.expression.reduce_stream("(${a} * ${b}).mean()", pd.read_csv(csv, chunksize=7))
+        self.assertAlmostEqual(result, np.mean([i * (i % 3) for i in range(100)]))
+
+    def test_scalar(self):
+        self.assertEqual(self.expression.reduce_stream("x * 2", iter([]), local={'x': 2}), 4)
+
+    def test_empty(self):
+        self.assertEqual(self.expression.reduce_stream("${a}.sum()", iter([])), 0)
+        self.assertTrue(np.isnan(self.expression.reduce_stream("${a}.mean()", iter([]))))
+
+    def test_compiled_expression(self):
+        compiled = self.expression.compile("${a}.max()")
+        self.assertEqual(self.expression.reduce_stream(compiled, self._chunks(self._create_numbers())), 9)
+
+    def test_not_streamable(self):
+        df = self._create_numbers()
+        for command in ["${a} - ${a}.mean()", "${a}.shift(1)", "${a}.rolling(2).mean()",
+                        "1 if ${a}.sum() > 0 else ${a}", "${a}.std()", "${__df}.apply(lambda c: c.sum())"]:
+            with self.assertRaises(Exception):
+                self.expression.reduce_stream(command, self._chunks(df))
+
+    def test_wrong_method(self):
+        df = self._create_numbers()
+        with self.assertRaises(Exception):
+            self.expression.solve_stream("${a}.sum()", self._chunks(df))
+        with self.assertRaises(Exception):
+            self.expression.reduce_stream("${a} * 2", self._chunks(df))
+        self.assertEqual(list(self.expression.solve_stream("x * 2", self._chunks(df), local={'x': 2})), [4, 4, 4])
+
+    def test_array_variables(self):
+        df = self._create_numbers()
+        for s in (pd.Series(np.arange(7.)), np.arange(7.)):
+            result = pd.concat(self.expression.solve_stream("${a} + s", self._chunks(df), local={'s': s}))
+            self.assertTrue(result.equals(self.expression.solve("${a} + s", df, {'s': s})))
+            self.assertAlmostEqual(self.expression.reduce_stream("(${b} * s).sum() + np.max(s)", self._chunks(df),
+                                                                 local={'s': s}), 61)
+        with self.assertRaises(Exception):
+            list(self.expression.solve_stream("${a} + s", self._chunks(df), local={'s': np.arange(5.)}))
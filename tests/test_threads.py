@@ -0,0 +1,78 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from safe_evaluation import Evaluator
+from safe_evaluation.settings import Settings
+
+from tests.base import BaseTestCase
+
+
+class ChangeSettings:
+    """
+    Changes settings of evaluator in the middle of calculation
+    """
+
+    def __init__(self, evaluator, settings):
+        self.evaluator = evaluator
+        self.settings = settings
+
+    @property
+    def change(self):
+        self.evaluator.change_settings(self.settings)
+        return 1
+
+
+class TestThreads(BaseTestCase):
+
+    def test_shared_evaluator(self):
+        evaluator = Evaluator()
+        commands = ["${a} * x + np.sqrt(${b})", "${a}.apply(lambda v: v * x if v > 2 else 0)",
+                    "(${a} + x).mean()", "np.log1p(${b}) / x if x > 3 else ${a}"]
+
+        def solve(i):
+            df = pd.DataFrame(data={'a': np.arange(100) + i, 'b': np.arange(100) * i})
+            command = commands[i % len(commands)]
+            result = evaluator.solve(command, df, local={'x': i})
+            return serial.solve(command, df, local={'x': i}), result
+
+        serial = Evaluator()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for expected, result in executor.map(solve, range(200)):
+                if isinstance(expected, pd.Series):
+                    self.assertTrue(result.equals(expected))
+                else:
+                    self.assertEqual(result, expected)
+        self.assertEqual(evaluator.cache_info().currsize, serial.cache_info().currsize)
+
+    def test_shared_compiled_expression(self):
+        compiled = self.expression.compile("x ** 2 + y")
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda i: compiled.evaluate(local={'x': i, 'y': 1}), range(1000)))
+        self.assertEqual(results, [i ** 2 + 1 for i in range(1000)])
+
+    def test_settings_snapshot_per_call(self):
+        evaluator = Evaluator()
+        changer = ChangeSettings(evaluator, Settings(forbidden_funcs=['np.abs']))
+        self.assertEqual(evaluator.solve("changer.change + np.abs(0 - 1)", local={'changer': changer}), 2)
+        with self.assertRaises(Exception):
+            evaluator.solve("np.abs(0 - 1)")
+
+    def test_change_settings_from_other_thread(self):
+        evaluator = Evaluator()
+        with evaluator.snapshot():
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                executor.submit(evaluator.change_settings, Settings(forbidden_funcs=['np.abs'])).result()
+            self.assertEqual(evaluator.solve("np.abs(0 - 1)"), 1)
+        with self.assertRaises(Exception):
+            evaluator.solve("np.abs(0 - 1)")
+
+    def test_snapshot_is_immutable(self):
+        evaluator = Evaluator()
+        snapshot = evaluator.current_settings()
+        with self.assertRaises(AttributeError):
+            snapshot.forbidden_funcs = ['np.abs']
+        evaluator.settings.forbidden_funcs = ['np.abs']
+        self.assertEqual(snapshot.forbidden_funcs, ())
+        self.assertEqual(evaluator.current_settings().forbidden_funcs, ('np.abs',))
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+
+from safe_evaluation import Evaluator
+
+from tests.base import BaseTestCase
+
+
+class TestVectorization(BaseTestCase):
+
+    def _row_by_row(self, body, series, local=None):
+        function = self.expression.solve(f"lambda v: {body}", local=local)
+        return series.apply(lambda v: function(v))
+
+    def _assert_same(self, body, df, local=None):
+        expression = self.expression.solve(f"${{col1}}.apply(lambda v: {body})", df, local)
+        expected = self._row_by_row(body, df['col1'], local)
+        self.assertEqual(expression.dtype, expected.dtype)
+        self.assertTrue(expression.equals(expected))
+
+    def test_plan(self):
+        evaluator = Evaluator()
+        vectorizer = evaluator.calculator.vectorizer
+        self.assertIsNotNone(vectorizer._plan(evaluator.solve("lambda v: v ** 2 > 0").body))
+        self.assertIsNotNone(vectorizer._plan(evaluator.solve("lambda v: 1 if v < 3 else 2").body))
+        self.assertIsNone(vectorizer._plan(evaluator.solve("lambda v: v.is_integer()").body))
+        self.assertIsNone(vectorizer._plan(evaluator.solve("lambda v: np.mean(v)").body))
+
+    def test_operators(self):
+        df, columns = self._create_df()
+        for body in ("v ** 2 > 4", "v / 2", "v // 3", "v % 3", "v * 2.5 - 1", "(v > 2) + (v > 3)", "v & 3"):
+            self._assert_same(body, df)
+
+    def test_if_else(self):
+        df, columns = self._create_df()
+        self._assert_same("1 if v < 3 else 2", df)
+        self._assert_same("0 if v < 2 else (1 if v < 3 else 2)", df)
+        self._assert_same("0 if v < 100 else 1.5", df)
+
+    def test_ufunc(self):
+        df = pd.DataFrame({'col1': [1.5, np.nan, -2.0, 4.0]})
+        self._assert_same("0 if np.isnan(v) else v", df)
+        self._assert_same("np.abs(v) + 1", df)
+
+    def test_local_variable(self):
+        df, columns = self._create_df()
+        self._assert_same("v * k", df, {'k': 3})
+
+    def test_index_and_name(self):
+        df = pd.DataFrame({'col1': [1, 2, 3]}, index=[10, 20, 30])
+        expression = self.expression.solve("${col1}.apply(lambda v: v * 2)", df)
+        self.assertEqual(expression.index.tolist(), [10, 20, 30])
+        self.assertEqual(expression.name, 'col1')
+
+    def test_division_by_zero(self):
+        df = pd.DataFrame({'col1': [0, 1]})
+        with self.assertRaises(ZeroDivisionError):
+            self.expression.solve("${col1}.apply(lambda v: 1 / v)", df)
+
+    def test_overflow_as_python(self):
+        df = pd.DataFrame({'col1': [2 ** 40, 3]})
+        self._assert_same("v ** 2", df)
+
+    def test_strings_row_by_row(self):
+        df, columns = self._create_df()
+        expression = self.expression.solve("${col4}.apply(lambda v: v + '!')", df).tolist()
+        self.assertEqual(expression, ['dq!', 'QW!', 'Gh!', 'Jh!', '67!', '-=!', '.,!'])
+
+    def test_dataframe_map(self):
+        df = pd.DataFrame({'a': [1, 2], 'b': [3.5, 4.0]})
+        expression = self.expression.solve("${__df}.map(lambda v: v * 2)", df)
+        self.assertTrue(expression.equals(df.map(lambda v: v * 2)))